@@ -0,0 +1,47 @@
+import os
+import stat
+import tempfile
+
+# ============================================================================================================
+# Atomic file writes shared by the editor and the batch tools, no Qt here so every process can import it
+# ============================================================================================================
+
+
+def current_umask():
+    # /proc reads it without touching the process, os.umask can only be read by setting it
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+def keep_file_mode(tmp_path, path):
+    # mkstemp files are 0600, the replaced file keeps its own mode, a new one gets the umask default
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~current_umask()
+    os.chmod(tmp_path, mode)
+
+
+def write_atomic(path, data):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        keep_file_mode(tmp_path, path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
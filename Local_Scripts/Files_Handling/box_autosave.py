@@ -0,0 +1,384 @@
+from PyQt6.QtCore import pyqtSignal, QCoreApplication, QObject, QRunnable, QTimer
+from Local_Scripts.Files_Handling.atomic_write import write_atomic
+from Local_Scripts.Files_Handling.box_page_index import BoxPageIndex
+from Local_Scripts.Files_Handling.box_store import BoxStore
+from Local_Scripts.tracer import TRACER
+import hashlib
+import json
+import numpy as np
+import os
+
+# ============================================================================================================
+# Write ahead journal of the edits made to one page of a box file, next to it as <name>.box.journal
+# (<name>.box.p<page>.journal for a page of a multi-page file). One json list per line:
+#   header     {"page": page, "base": fingerprint of the rows the edits apply to}
+#   edits      ["insert", row, char, x, y, w, h, page]  ["delete", row]  ["move", row, x, y, w, h]
+#              ["relabel", row, char]  ["append", chars, x, y, w, h, page]  ["move_rows", rows, x, y, w, h]
+# While a compaction writes the box file the journal is renamed to .compacting and a new one takes the
+# edits made meanwhile, with "after_compaction" as base until the write is done. Whatever point a crash
+# happens at, replaying the files whose base matches the rows on disk gives back the last edit.
+# ============================================================================================================
+
+AFTER_COMPACTION = 'after_compaction'
+
+
+def journal_path(box_path, page=None):
+    return box_path + '.journal' if page is None else f'{box_path}.p{page}.journal'
+
+
+def box_fingerprint(chars, left, bottom, right, top):
+    # the page column is left out, a page of a multi-page file is loaded with page numbers of its own
+    digest = hashlib.sha1()
+    for column in (left, bottom, right, top):
+        digest.update(np.ascontiguousarray(column, dtype=np.int32).tobytes())
+    digest.update('\n'.join(chars).encode('utf-8', errors='replace'))
+    return f'{len(chars)}:{digest.hexdigest()}'
+
+
+def store_fingerprint(box_store, img_height):
+    left, bottom, right, top = BoxStore.scene_to_tesseract(box_store.x, box_store.y, box_store.w, box_store.h,
+                                                           img_height)
+    return box_fingerprint(box_store.chars, left, bottom, right, top)
+
+
+def apply_edit(box_store, edit):
+    op, args = edit[0], edit[1:]
+    if op in ('delete', 'move', 'relabel') and not 0 <= args[0] < len(box_store):
+        raise IndexError(f'row {args[0]} of {len(box_store)}')
+    if op == 'insert':
+        if not 0 <= args[0] <= len(box_store):
+            raise IndexError(f'row {args[0]} of {len(box_store)}')
+        box_store.insert(*args)
+    elif op == 'delete':
+        box_store.delete(*args)
+    elif op == 'move':
+        box_store.set_rect(*args)
+    elif op == 'relabel':
+        box_store.set_char(*args)
+    elif op == 'append':
+        box_store.extend(*args)
+    elif op == 'move_rows':
+        box_store.set_rects(*args)
+    else:
+        raise ValueError(f'unknown edit {op}')
+
+
+def read_journal(path):
+    """(header, edit lines) of a journal file, None when there is none or its header is unreadable."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    try:
+        header = json.loads(lines[0])
+    except (IndexError, ValueError):
+        return None
+    # a line cut short by a crash can only be the last one
+    return header, [line for line in lines[1:] if line.endswith(']')]
+
+
+class EditJournal():
+    """The journal files of one page of a box file, see the top of this module for the format."""
+
+    def __init__(self, box_path, page, img_height, image_name=''):
+        self.box_path = box_path
+        self.page = page
+        self.img_height = img_height
+        self.image_name = image_name
+        self.path = journal_path(box_path, page)
+        self.compacting_path = self.path + '.compacting'
+        self.base = None           # fingerprint written in the header, taken from the store on the first edit
+        self.file = None
+        self.pending = []          # edits not written yet, [edit, ...]
+        self.lines = []            # lines in the journal file after its header
+        self.compacting = None     # (base, lines) of the journal being compacted
+        self.edits = 0             # edits since the last snapshot
+        self.discarded = False
+
+    def record(self, box_store, edit):
+        # called before the store changes, so the base is the state the first edit applies to
+        if self.base is None:
+            self.base = store_fingerprint(box_store, self.img_height)
+        if edit[0] == 'move' and self.pending and self.pending[-1][:2] == ['move', edit[1]]:
+            self.pending[-1] = list(edit)  # a drag moves the same box on every mouse move, only the last counts
+        else:
+            self.pending.append(list(edit))
+        self.edits += 1
+
+    def flush(self):
+        if not self.pending or self.discarded:
+            return
+        lines = [json.dumps(edit, ensure_ascii=False) for edit in self.pending]
+        self.pending = []
+        try:
+            if self.file is None:
+                self.file = open(self.path, 'w', encoding='utf-8')
+                self.file.write(self.header() + '\n')
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+        except OSError as e:
+            print(f'Error: can not write {self.path}: {e}')
+        self.lines.extend(lines)
+
+    def header(self, base=None):
+        return json.dumps({'page': self.page, 'base': self.base if base is None else base})
+
+    def rewrite(self, base, lines):
+        self.close()
+        write_atomic(self.path, '\n'.join([self.header(base)] + lines + ['']).encode('utf-8'))
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.base, self.lines = base, lines
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    # =========================================================================================================
+    # ================================== Compaction  ==========================================================
+    # =========================================================================================================
+    def rotate(self):
+        """Sets the journal aside for the compaction of a snapshot, edits from now on go to a new one."""
+        self.flush()
+        self.close()
+        if os.path.exists(self.path):
+            os.replace(self.path, self.compacting_path)
+        self.compacting = (self.base, self.lines)
+        self.base, self.lines, self.edits = AFTER_COMPACTION, [], 0
+
+    def compacted(self, fingerprint):
+        if self.discarded:
+            self.remove(self.compacting_path)
+        else:
+            # the new journal gets its real base before the old one goes, a crash in between replays the new one
+            self.flush()
+            if self.lines:
+                self.rewrite(fingerprint, self.lines)
+            self.base = fingerprint
+            self.remove(self.compacting_path)
+        self.compacting = None
+
+    def compaction_failed(self):
+        # both journals together still apply to the untouched box file
+        if self.compacting is None:
+            return
+        base, lines = self.compacting
+        self.compacting = None
+        if self.discarded:
+            self.remove(self.compacting_path)
+            return
+        self.flush()
+        if lines or self.lines:
+            self.rewrite(base, lines + self.lines)
+        else:
+            self.base = base
+        self.remove(self.compacting_path)
+
+    def discard(self):
+        self.discarded = True
+        self.pending = []
+        self.close()
+        self.remove(self.path)
+        if self.compacting is None:
+            self.remove(self.compacting_path)
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # =========================================================================================================
+    # ================================== Replay  ==============================================================
+    # =========================================================================================================
+    def replay(self, box_store):
+        """Applies the edits left by a crash to the freshly loaded store, returns how many were applied."""
+        current = read_journal(self.path)
+        compacting = read_journal(self.compacting_path)
+        if current is None and compacting is None:
+            return 0
+        loaded = store_fingerprint(box_store, self.img_height)
+        lines = []
+        after = current is not None and current[0].get('base') == AFTER_COMPACTION
+        if current and current[0].get('base') == loaded:
+            lines = current[1]
+        elif compacting and compacting[0].get('base') == loaded:
+            lines = compacting[1] + (current[1] if after else [])  # the compaction never replaced the box file
+        elif compacting and after:
+            lines = current[1]  # the box file was replaced, the old journal is in it already
+
+        applied = []
+        for line in lines:
+            try:
+                apply_edit(box_store, json.loads(line))
+            except (ValueError, TypeError, IndexError) as e:
+                print(f'Error: journal {self.path} stops at a bad edit ({e}), the rest is dropped')
+                break
+            applied.append(line)
+
+        # the replayed edits are kept in one journal on the loaded rows until they are compacted
+        self.remove(self.compacting_path)
+        if applied:
+            self.rewrite(loaded, applied)
+            self.edits = len(applied)
+        else:
+            self.remove(self.path)
+        return len(applied)
+
+
+# ============================================================================================================
+# Background compaction: the full page is written from a snapshot with temp file + fsync + rename
+# ============================================================================================================
+
+
+class BoxCompactionSignals(QObject):
+    sg_box_file_compacted = pyqtSignal(object, object, int)
+
+
+class BoxCompactionWorker(QRunnable):
+    def __init__(self, journal, snapshot):
+        super().__init__()
+        self.journal = journal
+        self.snapshot = snapshot
+        self.signals = BoxCompactionSignals()
+
+    def run(self):
+        journal, snapshot = self.journal, self.snapshot
+        try:
+            with TRACER.span('compact_box_file', 'save'):
+                text = snapshot.to_box_text(journal.img_height, journal.page)
+                if journal.page is None:
+                    write_atomic(journal.box_path, text.encode('utf-8'))
+                    box_count = len(snapshot)
+                else:
+                    # only this page's lines are rewritten, the other pages are copied as they are
+                    page_index = BoxPageIndex(journal.box_path)
+                    page_index.replace_page(journal.page, text)
+                    page_index.ensure_fresh()
+                    box_count = page_index.box_count()
+                fingerprint = store_fingerprint(snapshot, journal.img_height)
+        except OSError as e:
+            print(f'Error: can not save {journal.box_path}: {e}')
+            fingerprint, box_count = None, -1
+        try:
+            self.signals.sg_box_file_compacted.emit(journal, fingerprint, box_count)
+        except RuntimeError:
+            pass  # the app was closed while the file was being written
+
+
+class BoxAutosaver(QObject):
+    """Journals every edit of the open page and writes the box file in the background once editing pauses.
+
+    The store calls record() before each edit. Edits are buffered and appended to the journal every
+    flush_ms, the box file is rewritten from a snapshot delay_ms after the last edit, on thread_pool so
+    it is ordered with the box file reads. Boxes without a char can not be written to a box file, while
+    there are any the edits only go to the journal.
+    """
+    sg_box_file_saved = pyqtSignal(str, str, int)   # image name, box path, boxes in the file
+
+    def __init__(self, thread_pool, delay_ms=2000, flush_ms=100):
+        super().__init__()
+        self.thread_pool = thread_pool
+        self.journal = None
+        self.box_store = None
+        self.in_flight = set()     # journals with a compaction running
+        self.queued = {}           # journal -> snapshot of a page left while its compaction was running
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(flush_ms)
+        self.flush_timer.timeout.connect(self.flush)
+        self.compact_timer = QTimer(self)
+        self.compact_timer.setSingleShot(True)
+        self.compact_timer.setInterval(delay_ms)
+        self.compact_timer.timeout.connect(self.compact)
+
+    def attach(self, box_store, box_path, page, img_height, image_name=''):
+        """Starts journaling the loaded page, returns how many edits of an earlier session were replayed."""
+        self.detach()
+        journal = EditJournal(box_path, page, img_height, image_name)
+        replayed = journal.replay(box_store)
+        if replayed:
+            print(f'Replayed {replayed} unsaved edits of {box_path}')
+            self.compact_timer.start()
+        self.journal, self.box_store = journal, box_store
+        box_store.journal = self
+        return replayed
+
+    def record(self, box_store, edit):
+        self.journal.record(box_store, edit)
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+        self.compact_timer.start()
+
+    def flush(self):
+        if self.journal:
+            self.journal.flush()
+
+    def detach(self, discard=False):
+        journal = self.journal
+        if journal is None:
+            return
+        self.flush_timer.stop()
+        self.compact_timer.stop()
+        if discard:
+            journal.discard()
+        elif journal.edits and not self.compact(final=True):
+            journal.flush()
+            journal.close()  # kept on disk, replayed when the page is opened again
+        self.box_store.journal = None
+        self.journal, self.box_store = None, None
+
+    def can_save(self):
+        return self.journal is not None and not self.box_store.has_empty_chars()
+
+    def save_now(self):
+        self.compact_timer.stop()
+        return self.compact()
+
+    def compact(self, final=False):
+        # final is given when the page is left, no more edits can follow the snapshot
+        journal = self.journal
+        if not self.can_save():
+            return False
+        if not journal.edits:
+            return True  # the box file has every edit already
+        if journal in self.in_flight and not final:
+            self.compact_timer.start()  # one write per file at a time, the next one follows
+            return True
+        # copying the columns is all the UI thread does, formatting and writing happen on the pool
+        snapshot = self.box_store.copy()
+        if journal in self.in_flight:
+            journal.flush()
+            self.queued[journal] = snapshot
+            return True
+        self.start_compaction(journal, snapshot)
+        return True
+
+    def start_compaction(self, journal, snapshot):
+        journal.rotate()
+        worker = BoxCompactionWorker(journal, snapshot)
+        worker.signals.sg_box_file_compacted.connect(TRACER.slot(self.on_box_file_compacted))
+        self.in_flight.add(journal)
+        self.thread_pool.start(worker)
+
+    def on_box_file_compacted(self, journal, fingerprint, box_count):
+        self.in_flight.discard(journal)
+        if fingerprint is None:
+            journal.compaction_failed()
+        else:
+            journal.compacted(fingerprint)
+            print(f'Saved {box_count} boxes to {journal.box_path}')
+            self.sg_box_file_saved.emit(journal.image_name, journal.box_path, box_count)
+        snapshot = self.queued.pop(journal, None)
+        if snapshot is not None:
+            self.start_compaction(journal, snapshot)
+        elif journal is not self.journal:
+            journal.close()
+
+    def shutdown(self, timeout_ms=5000):
+        # the journal is complete on disk either way, waiting only saves a replay on the next start
+        self.detach()
+        if self.thread_pool.waitForDone(timeout_ms):
+            QCoreApplication.processEvents()  # lets on_box_file_compacted tidy up the journal files
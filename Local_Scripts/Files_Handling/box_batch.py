@@ -0,0 +1,159 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from Local_Scripts.Files_Handling.atomic_write import write_atomic
+from Local_Scripts.Files_Handling.box_store import BoxStore
+from Local_Scripts.Files_Handling.image_metadata import ImageMetadata
+from Local_Scripts.Files_Handling.images_handler import IMAGE_EXTENSIONS
+import numpy as np
+import os
+
+# ============================================================================================================
+# Headless validation / normalisation of box files, every function here must stay picklable and Qt-window free
+# ============================================================================================================
+
+
+def iter_box_files(directory, recursive=False):
+    # os.scandir keeps this a generator, so directories bigger than memory are never listed at once
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                    elif entry.name.lower().endswith('.box'):
+                        yield entry.path
+        except OSError as e:
+            print(f'Error: can not read directory {current}: {e}')
+
+
+def find_image_for_box(box_path):
+    # same pairing rule as BoxFileHandler.extract_box_list, image stem + '.box'
+    stem = os.path.splitext(box_path)[0]
+    for ext in IMAGE_EXTENSIONS:
+        for candidate in (stem + ext, stem + ext.upper()):
+            if os.path.exists(candidate):
+                return candidate
+    return None
+
+
+def normalise_box_numbers(numbers, img_width=None, img_height=None):
+    """Swaps inverted corners and clips to the image, numbers are tesseract left, bottom, right, top, page."""
+    left = np.minimum(numbers[:, 0], numbers[:, 2])
+    right = np.maximum(numbers[:, 0], numbers[:, 2])
+    bottom = np.minimum(numbers[:, 1], numbers[:, 3])
+    top = np.maximum(numbers[:, 1], numbers[:, 3])
+    if img_width and img_height:
+        left, right = np.clip(left, 0, img_width), np.clip(right, 0, img_width)
+        bottom, top = np.clip(bottom, 0, img_height), np.clip(top, 0, img_height)
+    return np.stack([left, bottom, right, top, numbers[:, 4]], axis=1).astype(np.int32)
+
+
+def check_box_file(box_path, write=False, output_path=None, image_metadata=None):
+    result = {'path': box_path, 'image': None, 'boxes': 0, 'bad_lines': 0, 'inverted': 0,
+              'zero_size': 0, 'out_of_bounds': 0, 'changed': False, 'written': False, 'error': None}
+    try:
+        with open(box_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        result['error'] = str(e)
+        return result
+
+    chars, numbers = BoxStore.parse_box_bytes(data)
+    result['boxes'] = len(chars)
+    result['bad_lines'] = sum(1 for line in data.splitlines() if line.strip()) - len(chars)
+
+    img_width = img_height = None
+    image_path = find_image_for_box(box_path)
+    if image_path:
+        result['image'] = os.path.basename(image_path)
+        img_width, img_height = (image_metadata or ImageMetadata()).get_size(image_path)
+
+    left, bottom, right, top = numbers[:, 0], numbers[:, 1], numbers[:, 2], numbers[:, 3]
+    result['inverted'] = int(((right < left) | (top < bottom)).sum())
+    result['zero_size'] = int(((right == left) | (top == bottom)).sum())
+    if img_width and img_height:
+        outside = (np.minimum(left, right) < 0) | (np.minimum(bottom, top) < 0) | \
+                  (np.maximum(left, right) > img_width) | (np.maximum(bottom, top) > img_height)
+        result['out_of_bounds'] = int(outside.sum())
+
+    # the same scene round trip the editor's autosave uses, so the output matches an editor save
+    normalised = normalise_box_numbers(numbers, img_width, img_height)
+    height = img_height or 0
+    store = BoxStore()
+    x, y, w, h = BoxStore.tesseract_to_scene(normalised[:, 0], normalised[:, 1], normalised[:, 2],
+                                             normalised[:, 3], height)
+    store.set_columns(chars, x, y, w, h, normalised[:, 4])
+    text = store.to_box_text(height).encode('utf-8')
+    result['changed'] = text != data
+
+    if write and (result['changed'] or output_path):
+        try:
+            write_atomic(output_path or box_path, text)
+            result['written'] = True
+        except OSError as e:
+            result['error'] = str(e)
+    return result
+
+
+def check_chunk(box_paths, root, write, output_dir):
+    image_metadata = ImageMetadata()
+    results = []
+    for box_path in box_paths:
+        output_path = None
+        if output_dir:
+            output_path = os.path.join(output_dir, os.path.relpath(box_path, root))
+        results.append(check_box_file(box_path, write, output_path, image_metadata))
+    return results
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(directory, workers=None, write=False, output_dir=None, recursive=False, chunk_size=64,
+              on_result=None):
+    """Checks every box file under directory on a process pool and returns the summary.
+
+    Only workers * 4 chunks are in flight at any time, results are passed to on_result as they finish.
+    """
+    workers = workers or os.cpu_count() or 1
+    summary = {'files': 0, 'boxes': 0, 'files_with_problems': 0, 'missing_images': 0, 'bad_lines': 0,
+               'inverted': 0, 'zero_size': 0, 'out_of_bounds': 0, 'changed': 0, 'written': 0, 'errors': 0}
+
+    def collect(results):
+        for result in results:
+            summary['files'] += 1
+            summary['boxes'] += result['boxes']
+            for key in ('bad_lines', 'inverted', 'zero_size', 'out_of_bounds'):
+                summary[key] += result[key]
+            summary['missing_images'] += result['image'] is None
+            summary['changed'] += result['changed']
+            summary['written'] += result['written']
+            summary['errors'] += result['error'] is not None
+            if result['error'] or result['bad_lines'] or result['inverted'] or result['zero_size'] or \
+                    result['out_of_bounds']:
+                summary['files_with_problems'] += 1
+            if on_result:
+                on_result(result)
+
+    chunks = chunked(iter_box_files(directory, recursive), chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for chunk in chunks:
+            in_flight.add(pool.submit(check_chunk, chunk, directory, write, output_dir))
+            if len(in_flight) >= workers * 4:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future.result())
+        for future in in_flight:
+            collect(future.result())
+    return summary
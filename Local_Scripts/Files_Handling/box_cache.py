@@ -0,0 +1,132 @@
+from Local_Scripts.tracer import TRACER
+import hashlib
+import numpy as np
+import os
+import struct
+import tempfile
+import threading
+
+
+class BoxCache():
+    """Parsed box files as packed binary sidecars, so reopening a page is one read and no text parsing.
+
+    An entry holds the tesseract numbers as an int32 (n, 5) block plus the chars joined by newlines, and
+    is only used while the box file still has the size and mtime it was made from. When the directory
+    grows past max_bytes the least recently used entries are removed. The directory is scanned once, after
+    that saves only add to a running total and the scan is repeated when that total passes max_bytes.
+    """
+
+    MAGIC = b'BOXC'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHqqII')  # magic, version, reserved, source size, source mtime_ns, rows, chars bytes
+
+    def __init__(self, cache_dir=None, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser('~'), '.cache', 'box_editor', 'boxcache')
+        self.max_bytes = max_bytes
+        self.total = None                # bytes in cache_dir, None until the first scan, shared by the parse workers
+        self.total_lock = threading.Lock()
+
+    def cache_path(self, box_path):
+        key = hashlib.sha1(os.path.abspath(box_path).encode()).hexdigest()
+        return os.path.join(self.cache_dir, key + '.boxcache')
+
+    def load(self, box_path):
+        """chars, numbers of box_path if a valid entry exists, else None."""
+        try:
+            stat = os.stat(box_path)
+            path = self.cache_path(box_path)
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < self.HEADER.size:
+            return None
+        magic, version, _, size, mtime_ns, rows, chars_bytes = self.HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != self.VERSION or size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+            return None
+        numbers_end = self.HEADER.size + rows * 5 * 4
+        if len(data) != numbers_end + chars_bytes:
+            return None
+
+        with TRACER.span('load_box_cache', 'parse'):
+            # copied, the store edits its columns in place and frombuffer views are read only
+            numbers = np.frombuffer(data, dtype='<i4', count=rows * 5, offset=self.HEADER.size).reshape(rows, 5).copy()
+            chars = data[numbers_end:].decode('utf-8').split('\n') if rows else []
+        try:
+            os.utime(path)  # the mtime of an entry is its last use, eviction goes by it
+        except OSError:
+            pass
+        return chars, numbers
+
+    def save(self, box_path, chars, numbers, stat=None):
+        try:
+            stat = stat or os.stat(box_path)
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except OSError:
+            return
+        blob = '\n'.join(chars).encode('utf-8')
+        numbers = np.ascontiguousarray(numbers, dtype='<i4')
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, 0, stat.st_size, stat.st_mtime_ns, len(chars), len(blob))
+
+        path = self.cache_path(box_path)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header)
+                f.write(numbers.tobytes())
+                f.write(blob)
+            replaced = self.entry_size(path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f'Error: can not write box cache: {e}')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self.total_lock:
+            if self.total is not None:
+                self.total += self.HEADER.size + numbers.nbytes + len(blob) - replaced
+            due = self.total is None or self.total > self.max_bytes
+        if due:
+            self.evict()
+
+    @staticmethod
+    def entry_size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def evict(self):
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith('.boxcache'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            # oldest first, down to 90% so the next few saves do not evict again
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+        with self.total_lock:
+            self.total = total
+
+    def forget(self, box_path):
+        path = self.cache_path(box_path)
+        size = self.entry_size(path)
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self.total_lock:
+            if self.total is not None:
+                self.total -= size
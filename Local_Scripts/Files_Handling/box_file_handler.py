@@ -1,44 +1,247 @@
-from PyQt6.QtCore import pyqtSignal, QObject
+from PyQt6.QtCore import pyqtSignal, QObject, QTimer, QRunnable, QThreadPool
+from Local_Scripts.Files_Handling.box_store import BoxStore
+from Local_Scripts.Files_Handling.box_autosave import BoxAutosaver
+from Local_Scripts.Files_Handling.box_cache import BoxCache
+from Local_Scripts.Files_Handling.box_page_index import BoxPageIndex
+from Local_Scripts.Files_Handling.mapped_box_file import MappedBoxFile
+from Local_Scripts.tracer import TRACER
+import numpy as np
 import os
 
 
+class BoxParseSignals(QObject):
+    sg_box_file_parsed = pyqtSignal(int, object, object)
+
+
+class BoxParseWorker(QRunnable):
+    """Reads and parses a box file (or one page of it) on a pool thread, the store is filled on the UI thread."""
+
+    def __init__(self, generation, box_file, page=None, page_index=None, box_cache=None):
+        super().__init__()
+        self.generation = generation
+        self.box_file = box_file
+        self.page = page
+        self.page_index = page_index
+        self.box_cache = box_cache
+        self.signals = BoxParseSignals()
+
+    def run(self):
+        try:
+            if self.page is None:
+                chars, numbers = BoxFileHandler.parse_box_file(self.box_file, self.box_cache)
+            else:
+                with TRACER.span('parse_box_page', 'parse'):
+                    chars, numbers = BoxStore.parse_box_bytes(self.page_index.read_page(self.page))
+        except FileNotFoundError:
+            print("No box file found")
+            chars, numbers = [], np.zeros((0, 5), dtype=np.int32)
+        except OSError as e:
+            print(f'Error: can not read {self.box_file}: {e}')
+            chars, numbers = None, None
+        try:
+            self.signals.sg_box_file_parsed.emit(self.generation, chars, numbers)
+        except RuntimeError:
+            pass  # the app was closed while the file was being read
+
+
 class BoxFileHandler(QObject):
-    sg_bax_file_loaded = pyqtSignal(list)
+    sg_bax_file_loaded = pyqtSignal(object)
+    sg_box_rows_about_to_be_appended = pyqtSignal(object, int, int)
+    sg_box_rows_appended = pyqtSignal(object, int, int)
+    sg_box_file_filled = pyqtSignal(object)
 
     def __init__(self):
         super().__init__()
         self.box_file_directory = None
-        self.list_of_tuples = []
+        self.box_store = BoxStore()
+        self.page_index = None
+        # parsed box files are kept as binary sidecars, None turns the cache off
+        self.box_cache = BoxCache()
 
-    def extract_box_list(self, file, img_height):
+        # box files from lazy_min_bytes up are memory mapped and parsed lines_per_step lines at a time
+        self.lazy_min_bytes = 32 * 1024 * 1024
+        self.lines_per_step = 20000
+        self.mapped_file = None
+        self.next_line = 0
+        self.img_height = 0
+        self.fill_timer = QTimer(self)
+        self.fill_timer.setSingleShot(True)
+        self.fill_timer.timeout.connect(self.fill_next_rows)
+
+        # files below lazy_min_bytes are parsed on parse_pool, a result is only used while its generation
+        # is still the current one, so a page switch mid parse simply drops it
+        self.parse_in_background = True
+        self.parse_pool = QThreadPool(self)
+        self.parse_pool.setMaxThreadCount(1)
+        self.generation = 0
+        self.parsing = False
+
+        # edits of the loaded page are journaled and written back in the background, on parse_pool so a
+        # write always finishes before the next read of the same file
+        self.autosaver = BoxAutosaver(self.parse_pool)
+        self.image_name = ''
+        self.page = None
+
+    def extract_box_list(self, file, img_height, page=None):
+        # page is only given for multi-page images, then only that page's lines of the box file are read
         if file:
             self.box_file_directory = os.path.splitext(file)[0] + '.box'
+            self.image_name = os.path.basename(file)
+            self.page = page
+            self.img_height = img_height
             try:
-                with open(self.box_file_directory, 'r') as f:
-                    for line in f:
-                        line.strip()  # remove the leading or ending spaces
-                        parts = line.split()  # splits the list by
-                        if len(parts) == 0 or len(parts) != 6:
-                            continue
-                        char, x, y, width, height, _ = parts
-
-                        yn, wn, hn = self.revert_cords(x, y, width, height, img_height)
-                        self.list_of_tuples.append((char, x, yn, wn, hn))
-
-                self.sg_bax_file_loaded.emit(self.list_of_tuples)
+                if page is None and os.path.getsize(self.box_file_directory) >= self.lazy_min_bytes:
+                    self.open_progressively(self.box_file_directory, img_height)
+                    return None
+                if page is not None and (self.page_index is None or
+                                         self.page_index.box_path != self.box_file_directory):
+                    self.page_index = BoxPageIndex(self.box_file_directory)
+                if self.parse_in_background:
+                    self.parse_in_thread(self.box_file_directory, img_height, page)
+                    return None
+                if page is None:
+                    self.read_box_store(self.box_file_directory, img_height, self.box_store, self.box_cache)
+                else:
+                    self.read_box_page(self.box_file_directory, page, img_height)
+                self.start_autosave()
+                self.sg_bax_file_loaded.emit(self.box_store)
             except FileNotFoundError:
                 print("No box file found")
+                # boxes drawn on a page without a box file are saved to a new one, the empty store is still
+                # announced so a reload of a deleted file ends like any other
+                self.start_autosave()
+                self.sg_bax_file_loaded.emit(self.box_store)
         return None
 
-    def revert_cords(self, x, y, w, h, img_height):
-        y_new = img_height - int(h)
-        width_new = int(w) - int(x)
-        height_new = img_height - y_new - int(y)
+    def start_autosave(self):
+        # edits left in a journal by a crash are applied here, returns whether there were any
+        return self.autosaver.attach(self.box_store, self.box_file_directory, self.page, self.img_height,
+                                     self.image_name) > 0
+
+    @staticmethod
+    def parse_box_file(box_file, box_cache=None):
+        cached = box_cache.load(box_file) if box_cache else None
+        if cached:
+            return cached
+
+        # lines without exactly six fields are skipped, same as the old line by line parser
+        with TRACER.span('parse_box_file', 'parse'):
+            with open(box_file, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                data = f.read()
+            chars, numbers = BoxStore.parse_box_bytes(data)
+        if box_cache:
+            box_cache.save(box_file, chars, numbers, stat)
+        return chars, numbers
+
+    @staticmethod
+    def read_box_store(box_file, img_height, box_store=None, box_cache=None):
+        if box_store is None:
+            box_store = BoxStore()
+        chars, numbers = BoxFileHandler.parse_box_file(box_file, box_cache)
+        box_store.load_parsed(chars, numbers, img_height)
+        return box_store
 
+    def parse_in_thread(self, box_file, img_height, page=None):
+        self.generation += 1
+        self.parsing = True
+        self.img_height = img_height
+        worker = BoxParseWorker(self.generation, box_file, page, self.page_index, self.box_cache)
+        worker.signals.sg_box_file_parsed.connect(TRACER.slot(self.on_box_file_parsed))
+        self.parse_pool.start(worker)
+
+    def on_box_file_parsed(self, generation, chars, numbers):
+        if generation != self.generation:
+            return  # another page was opened meanwhile
+        self.parsing = False
+        if chars is not None:
+            self.box_store.load_parsed(chars, numbers, self.img_height)
+            self.start_autosave()
+        self.sg_bax_file_loaded.emit(self.box_store)  # also when unreadable, so the view stops waiting
+
+    def cancel_parse(self):
+        self.generation += 1
+        self.parsing = False
+
+    def reload_box_list(self, file, img_height, page=None):
+        # edits that were not written to the box file yet are dropped with their journal
+        self.autosaver.detach(discard=True)
+        self.clear_box_store()
+        self.extract_box_list(file, img_height, page)
+
+    def read_box_page(self, box_file, page, img_height):
+        # the page index is built on the first page read of a file and reused while switching pages
+        if self.page_index is None or self.page_index.box_path != box_file:
+            self.page_index = BoxPageIndex(box_file)
+        with TRACER.span('parse_box_page', 'parse'):
+            self.box_store.load_bytes(self.page_index.read_page(page), img_height)
+        return self.box_store
+
+    # =========================================================================================================
+    # ================================== Progressive loading of large files  ==================================
+    # =========================================================================================================
+    def open_progressively(self, box_file, img_height):
+        self.stop_progressive_fill()
+        self.mapped_file = MappedBoxFile(box_file)
+        self.img_height = img_height
+        self.next_line = min(self.lines_per_step, len(self.mapped_file))
+
+        # the first rows are parsed right away so the table and the scene open with something in them
+        with TRACER.span('parse_box_rows', 'parse'):
+            chars, x, y, w, h, page = self.mapped_file.read_rows(0, self.next_line, img_height)
+            self.box_store.set_columns(chars, x, y, w, h, page)
+        self.sg_bax_file_loaded.emit(self.box_store)
+        self.schedule_next_rows()
+
+    def fill_next_rows(self):
+        if self.mapped_file is None:
+            return
+        first_line, self.next_line = self.next_line, min(self.next_line + self.lines_per_step,
+                                                         len(self.mapped_file))
+        with TRACER.span('parse_box_rows', 'parse'):
+            chars, x, y, w, h, page = self.mapped_file.read_rows(first_line, self.next_line, self.img_height)
+        if chars:
+            self.append_rows(chars, x, y, w, h, page)
+        self.schedule_next_rows()
+
+    def append_rows(self, chars, x, y, w, h, page=0):
+        # the table model has to hear about the rows before the store holds them
+        first = len(self.box_store)
+        last = first + len(chars) - 1
+        self.sg_box_rows_about_to_be_appended.emit(self.box_store, first, last)
+        self.box_store.extend(chars, x, y, w, h, page)
+        self.sg_box_rows_appended.emit(self.box_store, first, last)
+
+    def schedule_next_rows(self):
+        if self.next_line < len(self.mapped_file):
+            self.fill_timer.start(0)  # back to the event loop between steps, the UI stays responsive
+        else:
+            print(f'Loaded {len(self.box_store)} boxes from {self.mapped_file.path}')
+            self.stop_progressive_fill()
+            replayed = self.start_autosave()
+            self.sg_box_file_filled.emit(self.box_store)
+            if replayed:
+                self.sg_bax_file_loaded.emit(self.box_store)
+
+    def stop_progressive_fill(self):
+        self.fill_timer.stop()
+        if self.mapped_file:
+            self.mapped_file.close()
+            self.mapped_file = None
+
+    def is_loading(self):
+        return self.parsing or self.mapped_file is not None
+
+    def revert_cords(self, x, y, w, h, img_height):
+        _, y_new, width_new, height_new = BoxStore.tesseract_to_scene(int(x), int(y), int(w), int(h), img_height)
         return y_new, width_new, height_new
 
-    def get_list_of_tuples(self):
-        return self.list_of_tuples
+    def get_box_store(self):
+        return self.box_store
 
-    def clear_list_of_tuples(self):
-        self.list_of_tuples.clear()
+    def clear_box_store(self):
+        # the page being left is snapshotted for its last write before the store is emptied
+        self.autosaver.detach()
+        self.cancel_parse()
+        self.stop_progressive_fill()
+        self.box_store.clear()
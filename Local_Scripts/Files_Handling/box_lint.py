@@ -0,0 +1,176 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from Local_Scripts.Files_Handling.box_batch import iter_box_files, find_image_for_box, chunked
+from Local_Scripts.Files_Handling.box_store import BoxStore, PLACEHOLDER_CHAR
+from Local_Scripts.Files_Handling.image_metadata import ImageMetadata
+import numpy as np
+import os
+
+# ============================================================================================================
+# Box quality checks on scene columns (x, y, w, h with the origin at the top left of the page)
+# ============================================================================================================
+
+LINT_CHECKS = ('overlaps', 'duplicates', 'zero_size', 'out_of_bounds', 'unlabelled')
+
+
+def overlapping_pairs(x, y, w, h, min_overlap=0.2, block=1 << 20):
+    """Pairs (i, j), i < j, whose intersection is at least min_overlap of the smaller box.
+
+    Sort and sweep: boxes are sorted by their start on one axis and every box is only paired with the
+    boxes that start before it ends on that axis, found with searchsorted. The axis giving fewer
+    candidates is used, text lines make one of the two much cheaper. O(n log n + candidates).
+    """
+    n = len(x)
+    if n < 2:
+        return np.zeros((0, 2), dtype=np.int64)
+    x, y = np.asarray(x, dtype=np.int64), np.asarray(y, dtype=np.int64)
+    w, h = np.asarray(w, dtype=np.int64), np.asarray(h, dtype=np.int64)
+
+    best = None
+    for start, length in ((x, w), (y, h)):
+        order = np.argsort(start, kind='stable')
+        sorted_start = start[order]
+        ends = np.searchsorted(sorted_start, sorted_start + length[order], side='left')
+        counts = np.maximum(ends - np.arange(n) - 1, 0)
+        if best is None or counts.sum() < best[2].sum():
+            best = (order, ends, counts)
+    order, ends, counts = best
+
+    pairs = []
+    area = np.maximum(w, 0) * np.maximum(h, 0)
+    # candidates are generated in blocks so a pile of boxes on top of each other can not exhaust memory
+    first = 0
+    cumulative = np.cumsum(counts)
+    while first < n:
+        budget = (cumulative[first - 1] if first else 0) + block
+        last = max(first + 1, int(np.searchsorted(cumulative, budget, side='right')))
+        block_counts = counts[first:last]
+        a = np.repeat(np.arange(first, last), block_counts)
+        b = a + 1 + np.arange(block_counts.sum()) - np.repeat(np.cumsum(block_counts) - block_counts, block_counts)
+        i, j = order[a], order[b]
+        overlap_w = np.minimum(x[i] + w[i], x[j] + w[j]) - np.maximum(x[i], x[j])
+        overlap_h = np.minimum(y[i] + h[i], y[j] + h[j]) - np.maximum(y[i], y[j])
+        inter = np.maximum(overlap_w, 0) * np.maximum(overlap_h, 0)
+        smaller = np.minimum(area[i], area[j])
+        hit = (inter > 0) & (inter >= min_overlap * smaller)
+        pairs.append(np.stack((np.minimum(i[hit], j[hit]), np.maximum(i[hit], j[hit])), axis=1))
+        first = last
+    return np.concatenate(pairs)
+
+
+def lint_boxes(chars, x, y, w, h, img_width=0, img_height=0, min_overlap=0.2, placeholder_chars=(PLACEHOLDER_CHAR,)):
+    """Row indices per check, plus the overlapping pairs. Image bounds are only checked when known."""
+    x, y = np.asarray(x, dtype=np.int64), np.asarray(y, dtype=np.int64)
+    w, h = np.asarray(w, dtype=np.int64), np.asarray(h, dtype=np.int64)
+    report = {}
+
+    # every copy after the first is a duplicate, copies also overlap but are only reported here
+    rows = np.stack((x, y, w, h), axis=1)
+    if len(rows):
+        _, first_index, inverse = np.unique(rows, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        duplicates = np.flatnonzero(first_index[inverse] != np.arange(len(rows)))
+    else:
+        duplicates = np.zeros(0, dtype=np.int64)
+    report['duplicates'] = duplicates
+
+    pairs = overlapping_pairs(x, y, w, h, min_overlap)
+    if len(duplicates) and len(pairs):
+        same = np.all(rows[pairs[:, 0]] == rows[pairs[:, 1]], axis=1)
+        pairs = pairs[~same]
+    report['overlap_pairs'] = pairs
+    report['overlaps'] = np.unique(pairs)
+
+    report['zero_size'] = np.flatnonzero((w <= 0) | (h <= 0))
+    if img_width and img_height:
+        report['out_of_bounds'] = np.flatnonzero((x < 0) | (y < 0) | (x + w > img_width) | (y + h > img_height))
+    else:
+        report['out_of_bounds'] = np.zeros(0, dtype=np.int64)
+    unlabelled = set(placeholder_chars) | {''}
+    report['unlabelled'] = np.array([i for i, char in enumerate(chars) if char.strip() == '' or char in unlabelled],
+                                    dtype=np.int64)
+    return report
+
+
+def lint_store(box_store, img_width=0, img_height=0, min_overlap=0.2, placeholder_chars=(PLACEHOLDER_CHAR,)):
+    return lint_boxes(box_store.chars, box_store.x, box_store.y, box_store.w, box_store.h, img_width, img_height,
+                      min_overlap, placeholder_chars)
+
+
+def offending_rows(report):
+    rows = [report[check] for check in LINT_CHECKS if len(report[check])]
+    return np.unique(np.concatenate(rows)) if rows else np.zeros(0, dtype=np.int64)
+
+
+def summarise(report):
+    return {check: int(len(report[check])) for check in LINT_CHECKS}
+
+
+# ============================================================================================================
+# Headless lint over a directory, same bounded process pool as box_batch.run_batch
+# ============================================================================================================
+
+
+def lint_box_file(box_path, image_metadata, min_overlap=0.2, placeholder_chars=(PLACEHOLDER_CHAR,), max_examples=20):
+    result = {'path': box_path, 'image': find_image_for_box(box_path), 'boxes': 0, 'error': None}
+    result.update({check: 0 for check in LINT_CHECKS})
+    result['examples'] = {}
+    try:
+        with open(box_path, 'rb') as f:
+            chars, numbers = BoxStore.parse_box_bytes(f.read())
+    except OSError as e:
+        result['error'] = str(e)
+        return result
+    result['boxes'] = len(chars)
+
+    # pages of a multi-page file are linted on their own, boxes of different pages never overlap
+    for page in np.unique(numbers[:, 4]).tolist():
+        rows = np.flatnonzero(numbers[:, 4] == page)
+        width, height = image_metadata.get_size(result['image'], page) if result['image'] else (0, 0)
+        left, bottom, right, top = (numbers[rows, k] for k in range(4))
+        x, y, w, h = BoxStore.tesseract_to_scene(left, bottom, right, top, height)
+        report = lint_boxes([chars[i] for i in rows.tolist()], x, y, w, h, width, height, min_overlap,
+                            placeholder_chars)
+        for check in LINT_CHECKS:
+            result[check] += int(len(report[check]))
+            # examples are 1 based line numbers among the box lines, as a text editor would show them
+            examples = result['examples'].setdefault(check, [])
+            examples.extend((rows[report[check][:max_examples]] + 1).tolist())
+    result['examples'] = {check: sorted(lines)[:max_examples] for check, lines in result['examples'].items() if lines}
+    return result
+
+
+def lint_chunk(box_paths, min_overlap, placeholder_chars):
+    image_metadata = ImageMetadata()
+    return [lint_box_file(box_path, image_metadata, min_overlap, placeholder_chars) for box_path in box_paths]
+
+
+def run_lint(directory, workers=None, recursive=False, chunk_size=32, min_overlap=0.2,
+             placeholder_chars=(PLACEHOLDER_CHAR,), on_result=None):
+    workers = workers or os.cpu_count() or 1
+    summary = {'files': 0, 'boxes': 0, 'files_with_problems': 0, 'missing_images': 0, 'errors': 0}
+    summary.update({check: 0 for check in LINT_CHECKS})
+
+    def collect(results):
+        for result in results:
+            summary['files'] += 1
+            summary['boxes'] += result['boxes']
+            summary['missing_images'] += result['image'] is None
+            summary['errors'] += result['error'] is not None
+            for check in LINT_CHECKS:
+                summary[check] += result[check]
+            if result['error'] or any(result[check] for check in LINT_CHECKS):
+                summary['files_with_problems'] += 1
+            if on_result:
+                on_result(result)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for chunk in chunked(iter_box_files(directory, recursive), chunk_size):
+            in_flight.add(pool.submit(lint_chunk, chunk, min_overlap, tuple(placeholder_chars)))
+            if len(in_flight) >= workers * 4:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future.result())
+        for future in in_flight:
+            collect(future.result())
+    return summary
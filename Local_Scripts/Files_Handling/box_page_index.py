@@ -0,0 +1,145 @@
+from Local_Scripts.Files_Handling.atomic_write import keep_file_mode
+from Local_Scripts.Files_Handling.box_store import BoxStore
+from Local_Scripts.tracer import TRACER
+import numpy as np
+import os
+import tempfile
+
+
+class BoxPageIndex():
+    """Byte ranges of every page's lines in a multi-page box file, from one vectorised pass over the file.
+
+    Pages are read by seeking straight to their ranges. Saving one page rewrites only that page's lines,
+    everything else is copied over byte for byte. The index is rebuilt when the file's size or mtime changes.
+    """
+
+    COPY_CHUNK = 1024 * 1024
+
+    def __init__(self, box_path):
+        self.box_path = box_path
+        self.signature = None
+        self.file_size = 0
+        self.sections = []     # (page, start, end) in file order, lines of one page can be split in runs
+        self.box_counts = {}   # page -> boxes on that page
+
+    def ensure_fresh(self):
+        stat = os.stat(self.box_path)
+        if self.signature != (stat.st_mtime_ns, stat.st_size):
+            self.build()
+            self.signature = (stat.st_mtime_ns, stat.st_size)
+
+    def build(self):
+        with TRACER.span('index_box_pages', 'parse'):
+            with open(self.box_path, 'rb') as f:
+                data = f.read()
+            self.file_size = len(data)
+            self.sections, self.box_counts = self.scan(data)
+
+    @staticmethod
+    def scan(data):
+        buf = np.frombuffer(data, dtype=np.uint8)
+        if buf.size == 0:
+            return [], {}
+        newlines = np.flatnonzero(buf == 10)
+        line_starts = np.concatenate(([0], newlines + 1))
+        line_ends = np.concatenate((newlines + 1, [buf.size]))
+        if line_starts[-1] == buf.size:
+            line_starts, line_ends = line_starts[:-1], line_ends[:-1]
+        line_count = line_starts.size
+
+        # the page is the last of exactly six fields, other lines stay with the page of the line above
+        starts, ends, line_of_token = BoxStore.tokenize(buf)
+        tokens_per_line = np.bincount(line_of_token, minlength=line_count)[:line_count]
+        last_token = np.cumsum(tokens_per_line) - 1
+        boxes = np.flatnonzero(tokens_per_line == 6)
+        pages = np.full(line_count, -1, dtype=np.int64)
+        numbers, valid = BoxStore.parse_int_tokens(buf, starts[last_token[boxes]], ends[last_token[boxes]])
+        boxes, numbers = boxes[valid], numbers[valid]
+        pages[boxes] = numbers
+
+        known = np.where(pages >= 0, np.arange(line_count), 0)
+        np.maximum.accumulate(known, out=known)
+        pages = np.where(pages[known] >= 0, pages[known], pages)
+
+        change = np.flatnonzero(pages[1:] != pages[:-1]) + 1
+        run_starts = np.concatenate(([0], change))
+        run_ends = np.concatenate((change, [line_count]))
+        sections = list(zip(pages[run_starts].tolist(), line_starts[run_starts].tolist(),
+                            line_ends[run_ends - 1].tolist()))
+        counted = np.unique(numbers, return_counts=True)
+        return sections, dict(zip(counted[0].tolist(), counted[1].tolist()))
+
+    def pages(self):
+        return sorted(set(page for page, _, _ in self.sections if page >= 0))
+
+    def box_count(self):
+        return sum(self.box_counts.values())
+
+    # =========================================================================================================
+    # ================================== Page access  =========================================================
+    # =========================================================================================================
+    def read_page(self, page):
+        self.ensure_fresh()
+        chunks = []
+        with open(self.box_path, 'rb') as f:
+            for section_page, start, end in self.sections:
+                if section_page == page:
+                    f.seek(start)
+                    chunks.append(f.read(end - start))
+        return b''.join(chunks)
+
+    def replace_page(self, page, text):
+        """Writes text as the lines of page, at the place of the old ones or in page order for a new page."""
+        data = text.encode('utf-8') if isinstance(text, str) else text
+        try:
+            self.ensure_fresh()
+        except FileNotFoundError:
+            self.sections, self.box_counts, self.file_size = [], {}, 0
+
+        own = [(start, end) for section_page, start, end in self.sections if section_page == page]
+        if own:
+            insert_at = own[0][0]
+        else:
+            later = [start for section_page, start, _ in self.sections if section_page > page]
+            insert_at = later[0] if later else self.file_size
+
+        directory = os.path.dirname(self.box_path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                if self.file_size:
+                    with open(self.box_path, 'rb') as src:
+                        self.copy_range(src, out, 0, insert_at)
+                        if insert_at == self.file_size and insert_at and not self.ends_with_newline(src):
+                            out.write(b'\n')
+                        out.write(data)
+                        position = insert_at
+                        for start, end in own:
+                            self.copy_range(src, out, position, start)
+                            position = max(position, end)
+                        self.copy_range(src, out, position, self.file_size)
+                else:
+                    out.write(data)
+                out.flush()
+                os.fsync(out.fileno())
+            keep_file_mode(tmp_path, self.box_path)
+            os.replace(tmp_path, self.box_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.signature = None
+
+    def copy_range(self, src, out, start, end):
+        src.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = src.read(min(self.COPY_CHUNK, remaining))
+            if not chunk:
+                break
+            out.write(chunk)
+            remaining -= len(chunk)
+
+    def ends_with_newline(self, src):
+        src.seek(self.file_size - 1)
+        return src.read(1) == b'\n'
@@ -0,0 +1,300 @@
+from PyQt6.QtCore import pyqtSignal, QObject, QRunnable
+from PyQt6.QtGui import QImage, QImageReader
+from Local_Scripts.Files_Handling.atomic_write import write_atomic
+from Local_Scripts.Files_Handling.box_batch import chunked
+from Local_Scripts.Files_Handling.box_store import BoxStore, PLACEHOLDER_CHAR
+from Local_Scripts.Files_Handling.images_handler import IMAGE_EXTENSIONS
+from Local_Scripts.tracer import TRACER
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import os
+
+
+# ============================================================================================================
+# Box proposals from connected components, numpy only so it runs in a worker thread or in a headless process
+# ============================================================================================================
+
+
+def load_gray(path, page=0):
+    reader = QImageReader(path)
+    image = reader.read() if page == 0 or reader.jumpToImage(page) else QImage()
+    if image.isNull():
+        return None
+    image = image.convertToFormat(QImage.Format.Format_Grayscale8)
+    width, height = image.width(), image.height()
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    rows = np.frombuffer(bits, dtype=np.uint8).reshape(height, image.bytesPerLine())
+    return rows[:, :width].copy()
+
+
+def otsu_threshold(gray):
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    omega = np.cumsum(hist) / gray.size
+    mu = np.cumsum(hist * np.arange(256)) / gray.size
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (mu[-1] * omega - mu) ** 2 / (omega * (1 - omega))
+    return int(np.nanargmax(between)) if np.isfinite(between).any() else 127
+
+
+def binarize(gray, threshold=None):
+    # dark ink on a light page
+    if threshold is None:
+        threshold = otsu_threshold(gray)
+    return gray <= threshold
+
+
+def find_runs(ink):
+    """Horizontal runs of ink as (row, start, end) arrays, end exclusive, ordered row by row."""
+    height, width = ink.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = ink
+    steps = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(steps == 1)
+    _, ends = np.nonzero(steps == -1)
+    return rows, starts, ends
+
+
+def label_runs(rows, starts, ends, width):
+    """8-connected component label per run, union-find done with vectorised hooking + pointer jumping."""
+    n = rows.size
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    stride = width + 2
+    key_start = rows.astype(np.int64) * stride + starts
+    key_end = rows.astype(np.int64) * stride + ends
+    previous = (rows.astype(np.int64) - 1) * stride
+
+    # runs of the row above that touch this run (diagonals included)
+    low = np.searchsorted(key_end, previous + starts, side='left')
+    high = np.searchsorted(key_start, previous + ends, side='right')
+    counts = np.maximum(high - low, 0)
+    below = np.repeat(np.arange(n), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    above = np.repeat(low, counts) + offsets
+
+    labels = np.arange(n)
+    while below.size:
+        root_a, root_b = labels[above], labels[below]
+        differ = root_a != root_b
+        if not differ.any():
+            break
+        root_a, root_b = root_a[differ], root_b[differ]
+        np.minimum.at(labels, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        above, below = above[differ], below[differ]
+    return labels
+
+
+def component_boxes(rows, starts, ends, labels):
+    """Returns left, top, right, bottom (exclusive right / bottom) and ink area per component."""
+    _, component = np.unique(labels, return_inverse=True)
+    count = component.max() + 1 if component.size else 0
+    left = np.full(count, np.iinfo(np.int64).max)
+    top = np.full(count, np.iinfo(np.int64).max)
+    right = np.zeros(count, dtype=np.int64)
+    bottom = np.zeros(count, dtype=np.int64)
+    area = np.zeros(count, dtype=np.int64)
+    np.minimum.at(left, component, starts)
+    np.maximum.at(right, component, ends)
+    np.minimum.at(top, component, rows)
+    np.maximum.at(bottom, component, rows + 1)
+    np.add.at(area, component, ends - starts)
+    return left, top, right, bottom, area
+
+
+def merge_dots(left, top, right, bottom):
+    """Merges small marks sitting just above a glyph into it, the dots of i / j and most accents."""
+    heights = bottom - top
+    widths = right - left
+    if heights.size == 0:
+        return left, top, right, bottom
+    typical = float(np.median(heights))
+    is_small = (heights < 0.45 * typical) & (widths < typical)
+    small = np.flatnonzero(is_small)
+    bases = np.flatnonzero(~is_small)
+    if small.size == 0 or bases.size == 0:
+        return left, top, right, bottom
+
+    # a base starts at most limit below the bottom of the mark, so only the bases whose top falls in that
+    # band are paired with it, found with one searchsorted on the sorted tops
+    bases = bases[np.argsort(top[bases], kind='stable')]
+    limit = np.minimum(0.5 * typical, 1.5 * np.maximum(heights[small], widths[small]))
+    low = np.searchsorted(top[bases], bottom[small] - 1, side='left')
+    high = np.searchsorted(top[bases], bottom[small] + limit, side='right')
+    counts = high - low
+    mark = np.repeat(small, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    base = bases[np.repeat(low, counts) + offsets]
+
+    overlap = np.minimum(right[base], right[mark]) - np.maximum(left[base], left[mark])
+    touching = overlap >= 0.5 * widths[mark]
+    mark, base = mark[touching], base[touching]
+    if mark.size == 0:
+        return left, top, right, bottom
+    # every mark goes to its closest base, the lowest index wins a tie
+    gap = top[base] - bottom[mark]
+    order = np.lexsort((base, gap, mark))
+    mark, base = mark[order], base[order]
+    first = np.flatnonzero(np.r_[True, mark[1:] != mark[:-1]])
+    mark, base = mark[first], base[first]
+
+    left, top, right = left.copy(), top.copy(), right.copy()
+    np.minimum.at(left, base, left[mark])
+    np.minimum.at(top, base, top[mark])
+    np.maximum.at(right, base, right[mark])
+    keep = np.ones(heights.size, dtype=bool)
+    keep[mark] = False
+    return left[keep], top[keep], right[keep], bottom[keep]
+
+
+def reading_order(left, top, right, bottom):
+    """Groups boxes into text lines by vertical overlap, top to bottom, then left to right inside a line."""
+    order = np.argsort((top + bottom) / 2.0, kind='stable')
+    lines = []
+    line_top = line_bottom = None
+    for index in order.tolist():
+        box_top, box_bottom = top[index], bottom[index]
+        if lines:
+            overlap = min(line_bottom, box_bottom) - max(line_top, box_top)
+            if overlap >= 0.5 * min(line_bottom - line_top, box_bottom - box_top):
+                lines[-1].append(index)
+                line_top, line_bottom = min(line_top, box_top), max(line_bottom, box_bottom)
+                continue
+        lines.append([index])
+        line_top, line_bottom = box_top, box_bottom
+    ordered = []
+    for line in lines:
+        ordered.extend(sorted(line, key=lambda i: left[i]))
+    return np.array(ordered, dtype=np.int64)
+
+
+def propose_boxes(gray, min_area=6, max_size_fraction=0.25, threshold=None):
+    """Candidate glyph boxes of a grayscale page as int32 (x, y, w, h) columns in reading order."""
+    with TRACER.span('propose_boxes', 'propose'):
+        height, width = gray.shape
+        rows, starts, ends = find_runs(binarize(gray, threshold))
+        labels = label_runs(rows, starts, ends, width)
+        left, top, right, bottom, area = component_boxes(rows, starts, ends, labels)
+
+        # specks and page sized things (frames, rules, photos) are not glyphs
+        sane = (area >= min_area) & (right - left <= max_size_fraction * width) & \
+               (bottom - top <= max_size_fraction * height)
+        left, top, right, bottom = merge_dots(left[sane], top[sane], right[sane], bottom[sane])
+        order = reading_order(left, top, right, bottom)
+        left, top, right, bottom = left[order], top[order], right[order], bottom[order]
+        return (left.astype(np.int32), top.astype(np.int32),
+                (right - left).astype(np.int32), (bottom - top).astype(np.int32))
+
+
+def propose_boxes_for_file(path, page=0, **options):
+    gray = load_gray(path, page)
+    if gray is None:
+        return None
+    return propose_boxes(gray, **options)
+
+
+# ============================================================================================================
+# Headless proposals over a directory, writes a .box file next to every page that has none
+# ============================================================================================================
+
+
+def iter_image_files(directory, recursive=False):
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                    elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield entry.path
+        except OSError as e:
+            print(f'Error: can not read directory {current}: {e}')
+
+
+def propose_file(image_path, overwrite=False, char=PLACEHOLDER_CHAR):
+    box_path = os.path.splitext(image_path)[0] + '.box'
+    result = {'path': image_path, 'box_path': box_path, 'boxes': 0, 'written': False, 'skipped': False,
+              'error': None}
+    if os.path.exists(box_path) and not overwrite:
+        result['skipped'] = True
+        return result
+    # every page of a multi-page tiff goes into the one box file, tagged with its page number
+    page_count = max(1, QImageReader(image_path).imageCount())
+    store = BoxStore()
+    text = []
+    for page in range(page_count):
+        gray = load_gray(image_path, page)
+        if gray is None:
+            result['error'] = f'can not decode page {page}'
+            return result
+        x, y, w, h = propose_boxes(gray)
+        # tesseract needs a char on every line, char marks the boxes that still have to be labelled
+        store.set_columns([char] * len(x), x, y, w, h)
+        text.append(store.to_box_text(gray.shape[0], page))
+        result['boxes'] += len(store)
+    try:
+        write_atomic(box_path, ''.join(text).encode('utf-8'))
+        result['written'] = True
+    except OSError as e:
+        result['error'] = str(e)
+    return result
+
+
+def propose_chunk(image_paths, overwrite, char):
+    return [propose_file(path, overwrite, char) for path in image_paths]
+
+
+def run_proposals(directory, workers=None, overwrite=False, recursive=False, chunk_size=4, char=PLACEHOLDER_CHAR,
+                  on_result=None):
+    """Same bounded process pool as box_batch.run_batch, pages are heavier so the chunks are smaller."""
+    workers = workers or os.cpu_count() or 1
+    summary = {'images': 0, 'boxes': 0, 'written': 0, 'skipped': 0, 'errors': 0}
+
+    def collect(results):
+        for result in results:
+            summary['images'] += 1
+            summary['boxes'] += result['boxes']
+            summary['written'] += result['written']
+            summary['skipped'] += result['skipped']
+            summary['errors'] += result['error'] is not None
+            if on_result:
+                on_result(result)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for chunk in chunked(iter_image_files(directory, recursive), chunk_size):
+            in_flight.add(pool.submit(propose_chunk, chunk, overwrite, char))
+            if len(in_flight) >= workers * 4:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future.result())
+        for future in in_flight:
+            collect(future.result())
+    return summary
+
+
+class BoxProposalSignals(QObject):
+    sg_boxes_proposed = pyqtSignal(str, int, object)
+
+
+class BoxProposalWorker(QRunnable):
+    def __init__(self, path, page=0):
+        super().__init__()
+        self.path = path
+        self.page = page
+        self.signals = BoxProposalSignals()
+
+    def run(self):
+        boxes = propose_boxes_for_file(self.path, self.page)
+        try:
+            self.signals.sg_boxes_proposed.emit(self.path, self.page, boxes)
+        except RuntimeError:
+            pass  # the app was closed while the page was being analysed
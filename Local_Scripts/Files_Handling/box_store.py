@@ -0,0 +1,227 @@
+import numpy as np
+
+_WHITESPACE = np.array([9, 10, 11, 12, 13, 32], dtype=np.uint8)
+# char of boxes that still need a label, tesseract needs a char on every line so proposals write this one
+PLACEHOLDER_CHAR = '~'
+
+
+class BoxStore():
+    """Columnar box data in scene coordinates: one char list plus int32 x, y, w, h and page columns.
+
+    It is shared by the loader, the scene and the table, so every edit has to go through it. Row edits
+    are handed to journal (a BoxAutosaver) before they are made, bulk loads are not.
+    """
+
+    def __init__(self):
+        self.chars = []
+        self.x = np.zeros(0, dtype=np.int32)
+        self.y = np.zeros(0, dtype=np.int32)
+        self.w = np.zeros(0, dtype=np.int32)
+        self.h = np.zeros(0, dtype=np.int32)
+        self.page = np.zeros(0, dtype=np.int32)
+        self.spare = None  # buffers with room to grow that x, y, w, h and page are views of, set by extend
+        self.journal = None
+
+    def __len__(self):
+        return len(self.chars)
+
+    def __getitem__(self, index):
+        return self.chars[index], int(self.x[index]), int(self.y[index]), int(self.w[index]), int(self.h[index])
+
+    def __iter__(self):
+        return self.rows()
+
+    def rows(self):
+        return zip(self.chars, self.x.tolist(), self.y.tolist(), self.w.tolist(), self.h.tolist())
+
+    def rects(self):
+        return zip(self.x.tolist(), self.y.tolist(), self.w.tolist(), self.h.tolist())
+
+    # =========================================================================================================
+    # ================================== Bulk loading / saving  ===============================================
+    # =========================================================================================================
+    def load_bytes(self, data, img_height):
+        chars, numbers = self.parse_box_bytes(data)
+        self.load_parsed(chars, numbers, img_height)
+
+    def load_parsed(self, chars, numbers, img_height):
+        # numbers is the (n, 5) int block of tesseract left, bottom, right, top, page
+        x, y, w, h = self.tesseract_to_scene(numbers[:, 0], numbers[:, 1], numbers[:, 2], numbers[:, 3], img_height)
+        self.set_columns(chars, x, y, w, h, numbers[:, 4])
+
+    def set_columns(self, chars, x, y, w, h, page=None):
+        self.spare = None
+        self.chars = list(chars)
+        self.x = np.asarray(x, dtype=np.int32)
+        self.y = np.asarray(y, dtype=np.int32)
+        self.w = np.asarray(w, dtype=np.int32)
+        self.h = np.asarray(h, dtype=np.int32)
+        if page is None:
+            page = np.zeros(len(self.chars), dtype=np.int32)
+        self.page = np.asarray(page, dtype=np.int32)
+
+    def copy(self):
+        box_store = BoxStore()
+        box_store.set_columns(self.chars, self.x.copy(), self.y.copy(), self.w.copy(), self.h.copy(), self.page.copy())
+        return box_store
+
+    def extend(self, chars, x, y, w, h, page=0):
+        chars = list(chars)
+        if self.journal is not None:
+            self.record('append', chars, *(np.asarray(column).tolist() for column in (x, y, w, h, page)))
+        old, new = len(self.chars), len(self.chars) + len(chars)
+        # the columns grow into buffers of doubling size, so filling a file step by step stays linear
+        if self.spare is None or len(self.spare[0]) < new:
+            columns = (self.x, self.y, self.w, self.h, self.page)
+            self.spare = tuple(np.empty(max(new, 2 * old, 1024), dtype=np.int32) for _ in columns)
+            for buffer, column in zip(self.spare, columns):
+                buffer[:old] = column
+        for buffer, values in zip(self.spare, (x, y, w, h, page)):
+            buffer[old:new] = values
+        self.x, self.y, self.w, self.h, self.page = (buffer[:new] for buffer in self.spare)
+        self.chars.extend(chars)
+
+    def to_box_text(self, img_height, page=None):
+        # page overrides the page column, used when the store holds a single page of a multi-page file
+        left, bottom, right, top = self.scene_to_tesseract(self.x, self.y, self.w, self.h, img_height)
+        pages = self.page.tolist() if page is None else [page] * len(self.chars)
+        lines = [f'{c} {l} {b} {r} {t} {p}\n' for c, l, b, r, t, p in
+                 zip(self.chars, left.tolist(), bottom.tolist(), right.tolist(), top.tolist(), pages)]
+        return ''.join(lines)
+
+    @staticmethod
+    def parse_box_bytes(data):
+        # tokenises the whole file with array ops, only the char column is turned into python strings
+        buf = np.frombuffer(data, dtype=np.uint8)
+        empty = [], np.zeros((0, 5), dtype=np.int32)
+        if buf.size == 0:
+            return empty
+
+        starts, ends, line_of_token = BoxStore.tokenize(buf)
+        if starts.size == 0:
+            return empty
+
+        # same rule as before: only lines with exactly six fields are boxes
+        tokens_per_line = np.bincount(line_of_token)
+        keep = tokens_per_line[line_of_token] == 6
+        starts = starts[keep].reshape(-1, 6)
+        ends = ends[keep].reshape(-1, 6)
+
+        numbers, valid = BoxStore.parse_int_tokens(buf, starts[:, 1:].ravel(), ends[:, 1:].ravel())
+        numbers = numbers.reshape(-1, 5)
+        valid = valid.reshape(-1, 5).all(axis=1)
+
+        raw = data if isinstance(data, bytes) else bytes(data)
+        chars = [raw[s:e].decode('utf-8', errors='replace')
+                 for s, e in zip(starts[valid, 0].tolist(), ends[valid, 0].tolist())]
+        return chars, numbers[valid]
+
+    @staticmethod
+    def tokenize(buf):
+        # start / end byte of every whitespace separated token and the line it is on
+        solid = ~np.isin(buf, _WHITESPACE)
+        before = np.concatenate(([False], solid[:-1]))
+        after = np.concatenate((solid[1:], [False]))
+        starts = np.flatnonzero(solid & ~before)
+        ends = np.flatnonzero(solid & ~after) + 1
+        line_of_token = np.searchsorted(np.flatnonzero(buf == 10), starts)
+        return starts, ends, line_of_token
+
+    @staticmethod
+    def parse_int_tokens(buf, starts, ends):
+        if starts.size == 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=bool)
+        lengths = ends - starts
+        columns = np.arange(lengths.max())
+        inside = columns < lengths[:, None]
+        digits = buf[np.where(inside, starts[:, None] + columns, 0)].astype(np.int64) - 48
+
+        negative = digits[:, 0] == (ord('-') - 48)
+        is_digit = (digits >= 0) & (digits <= 9) & inside
+        is_digit[:, 0] |= negative
+        valid = (is_digit | ~inside).all(axis=1) & (lengths > negative) & (lengths - negative < 11)
+
+        power = np.where(inside, lengths[:, None] - 1 - columns, 0)
+        weights = np.where(inside & (digits >= 0) & (digits <= 9), 10 ** np.minimum(power, 18), 0)
+        values = (np.clip(digits, 0, 9) * weights).sum(axis=1)
+        values = np.where(negative, -values, values)
+        return np.clip(values, -2 ** 31, 2 ** 31 - 1).astype(np.int32), valid
+
+    # =========================================================================================================
+    # ================================== Coordinate conversion  ===============================================
+    # =========================================================================================================
+    @staticmethod
+    def tesseract_to_scene(left, bottom, right, top, img_height):
+        # tesseract boxes are left, bottom, right, top with the origin at the bottom of the page
+        x = left
+        y = img_height - top
+        w = right - left
+        h = top - bottom
+        return x, y, w, h
+
+    @staticmethod
+    def scene_to_tesseract(x, y, w, h, img_height):
+        left = x
+        bottom = img_height - h - y
+        right = w + x
+        top = img_height - y
+        return left, bottom, right, top
+
+    # =========================================================================================================
+    # ================================== Row edits  ===========================================================
+    # =========================================================================================================
+    def record(self, *edit):
+        if self.journal is not None:
+            self.journal.record(self, edit)
+
+    def insert(self, index, char, x, y, w, h, page=0):
+        self.record('insert', index, char, int(x), int(y), int(w), int(h), int(page))
+        self.chars.insert(index, char)
+        self.spare = None
+        self.x = np.insert(self.x, index, int(x))
+        self.y = np.insert(self.y, index, int(y))
+        self.w = np.insert(self.w, index, int(w))
+        self.h = np.insert(self.h, index, int(h))
+        self.page = np.insert(self.page, index, int(page))
+
+    def insert_rect(self, index, rect, char=''):
+        self.insert(index, char, rect.x(), rect.y(), rect.width(), rect.height())
+
+    def delete(self, index):
+        self.record('delete', index)
+        del self.chars[index]
+        self.spare = None
+        self.x = np.delete(self.x, index)
+        self.y = np.delete(self.y, index)
+        self.w = np.delete(self.w, index)
+        self.h = np.delete(self.h, index)
+        self.page = np.delete(self.page, index)
+
+    def set_rect(self, index, x, y, w, h):
+        self.record('move', index, int(x), int(y), int(w), int(h))
+        self.x[index] = int(x)
+        self.y[index] = int(y)
+        self.w[index] = int(w)
+        self.h[index] = int(h)
+
+    def set_qrect(self, index, rect):
+        self.set_rect(index, rect.x(), rect.y(), rect.width(), rect.height())
+
+    def set_rects(self, rows, x, y, w, h):
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        x, y, w, h = (np.asarray(column, dtype=np.int32) for column in (x, y, w, h))
+        if self.journal is not None:
+            self.record('move_rows', rows.tolist(), x.tolist(), y.tolist(), w.tolist(), h.tolist())
+        self.x[rows], self.y[rows], self.w[rows], self.h[rows] = x, y, w, h
+
+    def set_char(self, index, char):
+        self.record('relabel', index, char)
+        self.chars[index] = char
+
+    def has_empty_chars(self):
+        return '' in self.chars
+
+    def clear(self):
+        self.set_columns([], [], [], [], [])
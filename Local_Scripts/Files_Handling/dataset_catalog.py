@@ -0,0 +1,128 @@
+from Local_Scripts.Files_Handling.box_store import BoxStore
+from Local_Scripts.Files_Handling.image_metadata import ImageMetadata
+from collections import namedtuple
+import os
+import sqlite3
+import time
+
+ImageStatus = namedtuple('ImageStatus', ['name', 'width', 'height', 'has_box', 'box_count', 'last_edit'])
+
+
+class DatasetCatalog():
+    """SQLite catalog of a dataset directory, kept next to the images.
+
+    refresh() walks the directory with os.scandir and only probes images and box files whose
+    mtime or size changed since the last scan, everything else comes straight from the database.
+    """
+    FILE_NAME = '.box_editor_catalog.sqlite'
+
+    def __init__(self, directory, image_extensions):
+        self.directory = directory
+        self.image_extensions = tuple(image_extensions)
+        self.image_metadata = ImageMetadata()
+        self.connection = self.connect(os.path.join(directory, self.FILE_NAME))
+        self.statuses = {}
+
+    def connect(self, path):
+        try:
+            connection = sqlite3.connect(path)
+            self.create_table(connection)
+        except sqlite3.Error as e:
+            # read only datasets still get a catalog, it just does not survive closing the app
+            print(f'Error: can not open catalog {path}: {e}')
+            connection = sqlite3.connect(':memory:')
+            self.create_table(connection)
+        return connection
+
+    def create_table(self, connection):
+        connection.execute('''CREATE TABLE IF NOT EXISTS images (
+                                name TEXT PRIMARY KEY,
+                                mtime_ns INTEGER, size INTEGER,
+                                width INTEGER, height INTEGER,
+                                box_mtime_ns INTEGER, box_size INTEGER,
+                                box_count INTEGER, last_edit REAL)''')
+        connection.commit()
+
+    def refresh(self):
+        images = {}
+        boxes = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                name = entry.name
+                lower = name.lower()
+                if lower.endswith(self.image_extensions):
+                    images[name] = entry
+                elif lower.endswith('.box'):
+                    boxes[os.path.splitext(name)[0]] = entry
+
+        known = {row[0]: row for row in self.connection.execute(
+            'SELECT name, mtime_ns, size, width, height, box_mtime_ns, box_size, box_count, last_edit FROM images')}
+        changed = []
+        for name, entry in images.items():
+            stat = entry.stat()
+            row = known.get(name)
+            box_entry = boxes.get(os.path.splitext(name)[0])
+            box_stat = box_entry.stat() if box_entry else None
+            box_mtime = box_stat.st_mtime_ns if box_stat else None
+            box_size = box_stat.st_size if box_stat else None
+
+            if row and row[1] == stat.st_mtime_ns and row[2] == stat.st_size:
+                width, height = row[3], row[4]
+            else:
+                width, height = self.image_metadata.get_size(entry.path)
+
+            if row and row[5] == box_mtime and row[6] == box_size:
+                box_count, last_edit = row[7], row[8]
+            elif box_entry:
+                box_count, last_edit = self.count_boxes(box_entry.path), box_stat.st_mtime
+            else:
+                box_count, last_edit = 0, None
+
+            new_row = (name, stat.st_mtime_ns, stat.st_size, width, height, box_mtime, box_size, box_count, last_edit)
+            if row != new_row:
+                changed.append(new_row)
+
+        gone = [(name,) for name in known if name not in images]
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', changed)
+            self.connection.executemany('DELETE FROM images WHERE name = ?', gone)
+        self.load_statuses()
+        return len(changed), len(gone)
+
+    def load_statuses(self):
+        self.statuses = {}
+        for name, width, height, box_mtime, box_count, last_edit in self.connection.execute(
+                'SELECT name, width, height, box_mtime_ns, box_count, last_edit FROM images ORDER BY name'):
+            self.statuses[name] = ImageStatus(name, width, height, box_mtime is not None, box_count, last_edit)
+
+    def count_boxes(self, box_path):
+        try:
+            with open(box_path, 'rb') as f:
+                chars, _ = BoxStore.parse_box_bytes(f.read())
+            return len(chars)
+        except OSError:
+            return 0
+
+    # =========================================================================================================
+    # ================================== Lookups / updates  ===================================================
+    # =========================================================================================================
+    def image_names(self):
+        return list(self.statuses)
+
+    def get_status(self, name):
+        return self.statuses.get(name)
+
+    def record_box_saved(self, name, box_path, box_count):
+        try:
+            stat = os.stat(box_path)
+        except OSError:
+            return
+        with self.connection:
+            self.connection.execute('UPDATE images SET box_mtime_ns = ?, box_size = ?, box_count = ?, last_edit = ? '
+                                    'WHERE name = ?', (stat.st_mtime_ns, stat.st_size, box_count, time.time(), name))
+        status = self.statuses.get(name)
+        if status:
+            self.statuses[name] = status._replace(has_box=True, box_count=box_count, last_edit=time.time())
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,187 @@
+from PyQt6.QtCore import QRect, Qt
+from PyQt6.QtGui import QImage, QImageReader
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from Local_Scripts.Files_Handling.box_batch import iter_box_files, find_image_for_box, chunked
+from Local_Scripts.Files_Handling.box_store import BoxStore
+import json
+import numpy as np
+import os
+
+# ============================================================================================================
+# Glyph crops of every image / box pair of a directory into one preallocated memory mapped dataset:
+#   glyphs.npy   uint8 (n, size, size), white padded
+#   labels.npy   unicode (n,), the box char
+#   boxes.npy    int32 (n, 7): file, page, left, bottom, right, top (tesseract cords), valid
+#   index.json   source files with the offset and count of their glyphs, and the export options
+# Workers open the .npy files in r+ mode and write their own rows, so no pixels go through the parent.
+# ============================================================================================================
+
+BOX_COLUMNS = ('file', 'page', 'left', 'bottom', 'right', 'top', 'valid')
+
+
+def count_boxes(box_path):
+    try:
+        with open(box_path, 'rb') as f:
+            chars, _ = BoxStore.parse_box_bytes(f.read())
+    except OSError:
+        return 0
+    return len(chars)
+
+
+def count_chunk(box_paths):
+    return [(box_path, find_image_for_box(box_path), count_boxes(box_path)) for box_path in box_paths]
+
+
+def read_page_image(image_path, page):
+    reader = QImageReader(image_path)
+    if page and not reader.jumpToImage(page):
+        return QImage()
+    image = reader.read()
+    if image.isNull():
+        return image
+    return image.convertToFormat(QImage.Format.Format_Grayscale8)
+
+
+def image_to_array(image):
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    rows = np.frombuffer(bits, dtype=np.uint8).reshape(image.height(), image.bytesPerLine())
+    return rows[:, :image.width()]
+
+
+def cut_glyph(page_image, left, bottom, right, top, size, padding, keep_aspect):
+    """One glyph as a (size, size) uint8 array, None when the box does not overlap the page."""
+    height = page_image.height()
+    area = QRect(left - padding, height - top - padding, right - left + 2 * padding, top - bottom + 2 * padding)
+    area = area.intersected(page_image.rect())
+    if area.isEmpty():
+        return None
+    crop = page_image.copy(area)
+    glyph = np.full((size, size), 255, dtype=np.uint8)
+    if keep_aspect:
+        scale = size / max(area.width(), area.height())
+        width, height = max(1, round(area.width() * scale)), max(1, round(area.height() * scale))
+    else:
+        width, height = size, size
+    scaled = crop.scaled(width, height, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+    top_pad, left_pad = (size - height) // 2, (size - width) // 2
+    glyph[top_pad:top_pad + height, left_pad:left_pad + width] = image_to_array(scaled)
+    return glyph
+
+
+def export_file(task):
+    """Writes the glyphs of one image / box pair into rows offset .. offset + count of the dataset."""
+    file_index, image_path, box_path, offset, count, output_dir, size, padding, keep_aspect = task
+    result = {'box': box_path, 'glyphs': 0, 'invalid': 0, 'error': None}
+    glyphs = np.load(os.path.join(output_dir, 'glyphs.npy'), mmap_mode='r+')
+    labels = np.load(os.path.join(output_dir, 'labels.npy'), mmap_mode='r+')
+    boxes = np.load(os.path.join(output_dir, 'boxes.npy'), mmap_mode='r+')
+    try:
+        with open(box_path, 'rb') as f:
+            chars, numbers = BoxStore.parse_box_bytes(f.read())
+    except OSError as e:
+        # rows left at 0 read as solid black ink, mark them white and invalid instead
+        glyphs[offset:offset + count] = 255
+        glyphs.flush()
+        result['error'] = str(e)
+        result['invalid'] = count
+        return result
+    # the file may have changed since it was counted, never write past the rows reserved for it
+    chars, numbers = chars[:count], numbers[:count]
+    glyphs[offset + len(chars):offset + count] = 255
+
+    rows = np.zeros((len(chars), 7), dtype=np.int32)
+    rows[:, 0] = file_index
+    rows[:, 1] = numbers[:, 4]
+    rows[:, 2:6] = numbers[:, :4]
+    labels[offset:offset + len(chars)] = chars
+
+    # one page in memory at a time, boxes are grouped by their page column
+    for page in np.unique(numbers[:, 4]).tolist():
+        page_image = read_page_image(image_path, page) if image_path else QImage()
+        on_page = np.flatnonzero(numbers[:, 4] == page)
+        if page_image.isNull():
+            glyphs[offset + on_page] = 255
+            result['error'] = f'can not decode page {page} of {image_path}'
+            continue
+        for i in on_page.tolist():
+            left, bottom, right, top = numbers[i, :4].tolist()
+            glyph = cut_glyph(page_image, left, bottom, right, top, size, padding, keep_aspect)
+            if glyph is None:
+                glyphs[offset + i] = 255
+                continue
+            glyphs[offset + i] = glyph
+            rows[i, 6] = 1
+    boxes[offset:offset + len(chars)] = rows
+    glyphs.flush()
+    labels.flush()
+    boxes.flush()
+    result['glyphs'] = int(rows[:, 6].sum())
+    result['invalid'] = count - result['glyphs']
+    return result
+
+
+def run_export(directory, output_dir, size=32, padding=2, keep_aspect=True, workers=None, recursive=False,
+               label_width=8, on_result=None):
+    """Counts the boxes of every pair, preallocates the dataset and fills it from a process pool.
+
+    Both passes keep at most workers * 4 tasks in flight, the parent only holds the per file index.
+    """
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+
+    files = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def collect_counts(futures):
+            for future in futures:
+                files.extend(entry for entry in future.result() if entry[1] and entry[2])
+
+        in_flight = set()
+        for chunk in chunked(iter_box_files(directory, recursive), 64):
+            in_flight.add(pool.submit(count_chunk, chunk))
+            if len(in_flight) >= workers * 4:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect_counts(done)
+        collect_counts(in_flight)
+        # chunks finish in any order, sort so file_index and the offsets are the same on every run
+        files.sort()
+
+        offset = 0
+        index = []
+        for file_index, (box_path, image_path, count) in enumerate(files):
+            index.append({'image': image_path, 'box': box_path, 'offset': offset, 'count': count})
+            offset += count
+        total = offset
+
+        np.lib.format.open_memmap(os.path.join(output_dir, 'glyphs.npy'), mode='w+', dtype=np.uint8,
+                                  shape=(total, size, size)).flush()
+        np.lib.format.open_memmap(os.path.join(output_dir, 'labels.npy'), mode='w+', dtype=f'<U{label_width}',
+                                  shape=(total,)).flush()
+        np.lib.format.open_memmap(os.path.join(output_dir, 'boxes.npy'), mode='w+', dtype=np.int32,
+                                  shape=(total, len(BOX_COLUMNS))).flush()
+
+        summary = {'files': len(index), 'glyphs': 0, 'invalid': 0, 'errors': 0, 'total': total}
+
+        def collect(result):
+            summary['glyphs'] += result['glyphs']
+            summary['invalid'] += result['invalid']
+            summary['errors'] += result['error'] is not None
+            if on_result:
+                on_result(result)
+
+        in_flight = set()
+        for file_index, entry in enumerate(index):
+            task = (file_index, entry['image'], entry['box'], entry['offset'], entry['count'], output_dir, size,
+                    padding, keep_aspect)
+            in_flight.add(pool.submit(export_file, task))
+            if len(in_flight) >= workers * 4:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future.result())
+        for future in in_flight:
+            collect(future.result())
+
+    with open(os.path.join(output_dir, 'index.json'), 'w') as f:
+        json.dump({'size': size, 'padding': padding, 'keep_aspect': keep_aspect, 'box_columns': BOX_COLUMNS,
+                   'total': total, 'files': index}, f, indent=1)
+    return summary
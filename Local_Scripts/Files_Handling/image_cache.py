@@ -0,0 +1,143 @@
+from PyQt6.QtCore import pyqtSignal, QObject, QRunnable, QThreadPool
+from PyQt6.QtGui import QImage, QImageReader, QPixmap
+from collections import OrderedDict
+from Local_Scripts.tracer import TRACER
+import os
+
+
+class ImageDecodeSignals(QObject):
+    sg_image_decoded = pyqtSignal(str, QImage)
+
+
+class ImageDecodeWorker(QRunnable):
+    # decodes one file to a QImage on a pool thread, QPixmap is not allowed outside the UI thread
+    def __init__(self, path, max_image_pixels=None):
+        super().__init__()
+        self.path = path
+        self.max_image_pixels = max_image_pixels
+        self.cancelled = False
+        self.signals = ImageDecodeSignals()
+
+    def run(self):
+        if self.cancelled:
+            return
+        reader = QImageReader(self.path)
+        size = reader.size()
+        if self.max_image_pixels and size.width() * size.height() >= self.max_image_pixels:
+            return  # shown from tiles, decoding the whole page here would only waste memory
+        with TRACER.span('prefetch_decode', 'decode'):
+            image = reader.read()
+        if self.cancelled:
+            return
+        try:  # a null image is sent too, the page loader may be waiting for this decode
+            self.signals.sg_image_decoded.emit(self.path, image)
+        except RuntimeError:
+            pass  # the app was closed while this page was still decoding
+
+
+
+class ImageCache(QObject):
+    """LRU of decoded pages bounded by a byte budget, filled ahead of navigation by a worker pool."""
+    sg_prefetch_finished = pyqtSignal(str, QImage)
+
+    def __init__(self, prefetch_count=2, max_bytes=512 * 1024 * 1024, max_threads=2, max_image_pixels=None):
+        super().__init__()
+        self.prefetch_count = prefetch_count
+        self.max_bytes = max_bytes
+        self.max_image_pixels = max_image_pixels
+        self.images = OrderedDict()      # (path, page) -> QImage, most recently used at the end
+        self.current_bytes = 0
+        self.pending = {}                # path -> ImageDecodeWorker still queued or running
+        self.wanted = set()              # paths inside the current prefetch window
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(max_threads)
+
+    def get_pixmap(self, path, page=0):
+        key = (path, page)
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+        else:
+            with TRACER.span('decode_image', 'decode'):
+                reader = QImageReader(path)
+                # only the requested page of a multi-page tiff is decoded
+                image = reader.read() if page == 0 or reader.jumpToImage(page) else QImage()
+            if image.isNull():
+                return QPixmap()
+            self.store(key, image)
+        return QPixmap.fromImage(image)
+
+    def cached_pixmap(self, path, page=0):
+        # no decoding here, None when the page is not in memory yet
+        image = self.cached_image(path, page)
+        return None if image is None else QPixmap.fromImage(image)
+
+    def cached_image(self, path, page=0, touch=True):
+        # touch=False reads without making the page recently used, for thumbnails of rows in view
+        image = self.images.get((path, page))
+        if image is not None and touch:
+            self.images.move_to_end((path, page))
+        return image
+
+    def is_prefetching(self, path):
+        """True when path is decoding on a pool thread right now, a decode still queued is dropped instead."""
+        worker = self.pending.get(path)
+        if worker is None:
+            return False
+        if self.thread_pool.tryTake(worker):
+            del self.pending[path]
+            return False
+        return True
+
+    def prefetch_around(self, directory, list_images, index):
+        if not directory or not list_images:
+            return
+        start = max(0, index - self.prefetch_count)
+        end = min(len(list_images), index + self.prefetch_count + 1)
+        # nearest neighbours first so the next/previous pages are ready before the far ones, the page at
+        # index itself is the page loader's, a prefetch of it already running is kept for it to pick up
+        order = sorted((i for i in range(start, end) if i != index), key=lambda i: (abs(i - index), i < index))
+        paths = [os.path.join(directory, list_images[i]) for i in order]
+        self.wanted = set(paths)
+        self.wanted.add(os.path.join(directory, list_images[index]))
+
+        # anything outside the new window is stale, e.g. after a jump through the sidebar list
+        for path in list(self.pending):
+            if path not in self.wanted:
+                self.pending.pop(path).cancelled = True
+
+        # only the first page of neighbouring files is prefetched
+        for path in paths:
+            if (path, 0) in self.images:
+                self.images.move_to_end((path, 0))
+            elif path not in self.pending:
+                worker = ImageDecodeWorker(path, self.max_image_pixels)
+                worker.signals.sg_image_decoded.connect(self.on_image_decoded)
+                self.pending[path] = worker
+                self.thread_pool.start(worker)
+
+    def on_image_decoded(self, path, image):
+        worker = self.pending.pop(path, None)
+        if worker is None or worker.cancelled:
+            return
+        if path in self.wanted and not image.isNull() and (path, 0) not in self.images:
+            self.store((path, 0), image)
+        self.sg_prefetch_finished.emit(path, image)
+
+    def store(self, key, image):
+        size = image.sizeInBytes()
+        if size > self.max_bytes:
+            return
+        self.images[key] = image
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self.images.popitem(last=False)
+            self.current_bytes -= evicted.sizeInBytes()
+
+    def clear(self):
+        for worker in self.pending.values():
+            worker.cancelled = True
+        self.pending.clear()
+        self.wanted.clear()
+        self.images.clear()
+        self.current_bytes = 0
@@ -0,0 +1,109 @@
+from PyQt6.QtGui import QImageReader
+from collections import namedtuple
+import os
+import struct
+
+ImageInfo = namedtuple('ImageInfo', ['width', 'height', 'format', 'dpi'])
+
+
+class ImageMetadata():
+    """Reads image dimensions from the file header only, memoised by path + mtime."""
+
+    def __init__(self):
+        self.cache = {}  # (path, page) -> (mtime_ns, file_size, ImageInfo)
+        self.page_counts = {}  # path -> (mtime_ns, file_size, count)
+
+    def get_info(self, path, page=0):
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError):
+            return None
+        cached = self.cache.get((path, page))
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        reader = QImageReader(path)
+        if page and not reader.jumpToImage(page):
+            return None
+        size = reader.size()  # header only, pixels are never decoded here
+        if not size.isValid():
+            return None
+        info = ImageInfo(size.width(), size.height(), reader.format().data().decode(),
+                         self.read_dpi(path) if page == 0 else None)
+        self.cache[(path, page)] = (stat.st_mtime_ns, stat.st_size, info)
+        return info
+
+    def get_size(self, path, page=0):
+        info = self.get_info(path, page)
+        if info is None:
+            return 0, 0
+        return info.width, info.height
+
+    def get_page_count(self, path):
+        # multi-page tiffs report every page, other formats one
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError):
+            return 0
+        cached = self.page_counts.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        count = max(1, QImageReader(path).imageCount())
+        self.page_counts[path] = (stat.st_mtime_ns, stat.st_size, count)
+        return count
+
+    def forget(self, path):
+        for key in [key for key in self.cache if key[0] == path]:
+            del self.cache[key]
+        self.page_counts.pop(path, None)
+
+    def clear(self):
+        self.cache.clear()
+        self.page_counts.clear()
+
+    # =========================================================================================================
+    # ================================== DPI from the raw headers  ============================================
+    # =========================================================================================================
+    def read_dpi(self, path):
+        try:
+            with open(path, 'rb') as f:
+                head = f.read(64 * 1024)
+        except OSError:
+            return None
+        if head.startswith(b'\x89PNG\r\n\x1a\n'):
+            return self.png_dpi(head)
+        if head.startswith(b'\xff\xd8'):
+            return self.jpeg_dpi(head)
+        if head.startswith(b'BM') and len(head) >= 46:
+            x_ppm, y_ppm = struct.unpack_from('<ii', head, 38)
+            return self.ppm_to_dpi(x_ppm, y_ppm)
+        return None
+
+    def png_dpi(self, head):
+        pos = 8
+        while pos + 8 <= len(head):
+            length, kind = struct.unpack_from('>I4s', head, pos)
+            if kind == b'pHYs' and pos + 17 <= len(head):
+                x_ppu, y_ppu, unit = struct.unpack_from('>IIB', head, pos + 8)
+                return self.ppm_to_dpi(x_ppu, y_ppu) if unit == 1 else None
+            if kind in (b'IDAT', b'IEND'):
+                return None
+            pos += 12 + length
+        return None
+
+    def jpeg_dpi(self, head):
+        # JFIF APP0: density units (1 = dpi, 2 = dots per cm) followed by x/y density
+        pos = head.find(b'JFIF\x00')
+        if pos < 0 or pos + 12 > len(head):
+            return None
+        unit, x_density, y_density = struct.unpack_from('>BHH', head, pos + 7)
+        if unit == 1:
+            return x_density, y_density
+        if unit == 2:
+            return round(x_density * 2.54), round(y_density * 2.54)
+        return None
+
+    def ppm_to_dpi(self, x_ppm, y_ppm):
+        if x_ppm <= 0 or y_ppm <= 0:
+            return None
+        return round(x_ppm * 0.0254), round(y_ppm * 0.0254)
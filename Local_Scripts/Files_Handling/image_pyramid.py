@@ -0,0 +1,283 @@
+from PyQt6.QtCore import pyqtSignal, QObject, QRunnable, QThreadPool, QRect, Qt
+from PyQt6.QtGui import QImage, QImageReader, QImageIOHandler, QPainter
+from Local_Scripts.tracer import TRACER
+import hashlib
+import json
+import math
+import os
+import shutil
+
+
+class PyramidSignals(QObject):
+    sg_pyramid_ready = pyqtSignal(str)
+    sg_tile_loaded = pyqtSignal(int, int, int, QImage)
+
+
+class PyramidBuildWorker(QRunnable):
+    def __init__(self, pyramid):
+        super().__init__()
+        self.pyramid = pyramid
+
+    def run(self):
+        self.pyramid.build()
+        try:
+            self.pyramid.signals.sg_pyramid_ready.emit(self.pyramid.path)
+        except RuntimeError:
+            pass  # the app was closed while the pyramid was being built
+
+
+class TileLoadWorker(QRunnable):
+    def __init__(self, pyramid, level, col, row):
+        super().__init__()
+        self.pyramid = pyramid
+        self.key = (level, col, row)
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            return
+        with TRACER.span('decode_tile', 'decode'):
+            image = QImage(self.pyramid.tile_path(*self.key))
+        if not self.cancelled:
+            try:  # a null tile is sent too, the item stops waiting for it and asks again on a later paint
+                self.pyramid.signals.sg_tile_loaded.emit(*self.key, image)
+            except RuntimeError:
+                pass  # the app was closed while this tile was loading
+
+
+class ImagePyramid():
+    """Disk cached multi resolution tiles of one very large page.
+
+    Level 0 is full resolution and every next level halves it, down to a level that fits in a
+    single tile. Tiles live in cache_dir keyed by path + mtime + size, so the full page is decoded
+    only the first time it is opened. When cache_dir grows past max_bytes the least recently opened
+    pyramids are removed. Width / height / isNull mirror QPixmap for MainWindow.load_image.
+    """
+    thread_pool = None
+    building = {}  # directory -> pyramids of the same page waiting for the build that is running
+    band_bytes = 128 * 1024 * 1024  # size of one clipped read of level 0
+
+    def __init__(self, path, width, height, tile_size=512, cache_dir=None, tile_format='png', page=0,
+                 max_bytes=2 * 1024 * 1024 * 1024):
+        self.path = path
+        self.page = page
+        self.image_width = width
+        self.image_height = height
+        self.tile_size = tile_size
+        self.tile_format = tile_format
+        self.level_count = max(1, math.ceil(math.log2(max(width, height, 1) / tile_size)) + 1)
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser('~'), '.cache', 'box_editor', 'pyramids')
+        self.directory = os.path.join(self.cache_dir, self.cache_key())
+        self.max_bytes = max_bytes
+        self.signals = PyramidSignals()
+
+    @classmethod
+    def pool(cls):
+        # made on first use from the UI thread, thumbnail workers also make pyramids to read their last level
+        if cls.thread_pool is None:
+            cls.thread_pool = QThreadPool()
+            cls.thread_pool.setMaxThreadCount(2)
+        return cls.thread_pool
+
+    def cache_key(self):
+        stat = os.stat(self.path)
+        raw = f'{os.path.abspath(self.path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.tile_size}'
+        if self.page:
+            raw += f'|{self.page}'
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def width(self):
+        return self.image_width
+
+    def height(self):
+        return self.image_height
+
+    def isNull(self):
+        return self.image_width <= 0 or self.image_height <= 0
+
+    def is_built(self):
+        return os.path.exists(os.path.join(self.directory, 'pyramid.json'))
+
+    def coarsest_tile(self):
+        # the whole page in the single tile of the last level, a null image while the pyramid is not built
+        if not self.is_built():
+            return QImage()
+        return QImage(self.tile_path(self.level_count - 1, 0, 0))
+
+    def level_size(self, level):
+        scale = 2 ** level
+        return math.ceil(self.image_width / scale), math.ceil(self.image_height / scale)
+
+    def tile_grid(self, level):
+        width, height = self.level_size(level)
+        return math.ceil(width / self.tile_size), math.ceil(height / self.tile_size)
+
+    def tile_path(self, level, col, row):
+        return os.path.join(self.directory, str(level), f'{col}_{row}.{self.tile_format}')
+
+    # =========================================================================================================
+    # ================================== Building / loading  ==================================================
+    # =========================================================================================================
+    def build_async(self):
+        # a page reopened while its pyramid is still building waits for that build, a second one would
+        # overwrite tiles the first has already announced as ready
+        waiting = ImagePyramid.building.get(self.directory)
+        if waiting is not None:
+            waiting.append(self)
+            return
+        ImagePyramid.building[self.directory] = []
+        self.signals.sg_pyramid_ready.connect(self.on_built)
+        self.pool().start(PyramidBuildWorker(self))
+
+    def on_built(self, _):
+        for pyramid in ImagePyramid.building.pop(self.directory, []):
+            pyramid.signals.sg_pyramid_ready.emit(pyramid.path)
+
+    def build(self):
+        if self.is_built():
+            return
+        with TRACER.span('build_pyramid', 'decode'):
+            self.build_tiles()
+        self.evict()
+
+    def page_reader(self):
+        reader = QImageReader(self.path)
+        if self.page and not reader.jumpToImage(self.page):
+            return None
+        return reader
+
+    def build_tiles(self):
+        # level 0 is cut in strips one tile high and each strip is halved into the next level, so no level is
+        # ever held whole. Only the jpeg reader can clip while decoding, it reads the page in a few bands.
+        # png and tiff pages are decoded once in full by Qt and that image is cut into the same strips.
+        reader = self.page_reader()
+        if reader is None:
+            print(f'Error: can not decode {self.path}')
+            return
+        band = self.image_height
+        if reader.supportsOption(QImageIOHandler.ImageOption.ClipRect):
+            # every clipped read decodes the page from the top again, more bands cost more time
+            band = max(self.band_bytes // (4 * self.image_width), math.ceil(self.image_height / 8))
+            band = min(self.image_height, math.ceil(band / self.tile_size) * self.tile_size)
+        needed = math.ceil(self.image_width * band * 4 / (1024 * 1024))
+
+        pending = [None] * self.level_count  # halved rows of each level still short of a full tile row
+        rows = [0] * self.level_count        # tile rows written so far per level
+        written = 0
+        for band_top in range(0, self.image_height, band):
+            if band_top:
+                reader = self.page_reader()
+            if band < self.image_height:
+                reader.setClipRect(QRect(0, band_top, self.image_width, min(band, self.image_height - band_top)))
+            image = self.read_band(reader, needed)
+            if image.isNull():
+                print(f'Error: can not decode {self.path}')
+                return
+            for top in range(0, image.height(), self.tile_size):
+                strip = image.copy(QRect(0, top, image.width(), min(self.tile_size, image.height() - top)))
+                written += self.add_strip(0, strip, pending, rows)
+            image = None
+        # the bottom of every coarser level is shorter than a tile, it is written once the page is done
+        for level in range(1, self.level_count):
+            if pending[level] is not None:
+                strip, pending[level] = pending[level], None
+                written += self.add_strip(level, strip, pending, rows)
+        with open(os.path.join(self.directory, 'pyramid.json'), 'w') as f:
+            json.dump({'path': self.path, 'page': self.page, 'width': self.image_width, 'height': self.image_height,
+                       'tile_size': self.tile_size, 'levels': self.level_count, 'bytes': written}, f)
+
+    @staticmethod
+    def read_band(reader, needed_mb):
+        # Qt refuses images over 256 MB by default, the limit is process wide so it is put back right away
+        limit = QImageReader.allocationLimit()
+        if 0 < limit < needed_mb:
+            QImageReader.setAllocationLimit(needed_mb)
+        try:
+            return reader.read()
+        finally:
+            QImageReader.setAllocationLimit(limit)
+
+    def add_strip(self, level, strip, pending, rows):
+        """Saves strip as the next tile row of level, halves it into the level above, returns the bytes saved."""
+        os.makedirs(os.path.join(self.directory, str(level)), exist_ok=True)
+        row, written = rows[level], 0
+        rows[level] += 1
+        for col in range(self.tile_grid(level)[0]):
+            area = QRect(col * self.tile_size, 0, self.tile_size, strip.height())
+            path = self.tile_path(level, col, row)
+            strip.copy(area.intersected(strip.rect())).save(path)
+            written += os.path.getsize(path)
+        level += 1
+        if level == self.level_count:
+            return written
+        half = strip.scaled(self.level_size(level)[0], math.ceil(strip.height() / 2),
+                            Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+        if pending[level] is not None:
+            half = self.stacked(pending[level], half)
+        if half.height() < self.tile_size:
+            pending[level] = half
+            return written
+        pending[level] = None
+        return written + self.add_strip(level, half, pending, rows)
+
+    def stacked(self, top, bottom):
+        image = QImage(top.width(), top.height() + bottom.height(), top.format())
+        painter = QPainter(image)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+        painter.drawImage(0, 0, top)
+        painter.drawImage(0, top.height(), bottom)
+        painter.end()
+        return image
+
+    def mark_used(self):
+        try:
+            os.utime(os.path.join(self.directory, 'pyramid.json'))  # eviction goes by this mtime
+        except OSError:
+            pass
+
+    def evict(self):
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.path == self.directory or entry.path in ImagePyramid.building or not entry.is_dir():
+                        continue
+                    try:
+                        entries.append(self.cache_entry(entry.path))
+                    except (OSError, ValueError):
+                        continue
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        try:
+            total += self.cache_entry(self.directory)[1]
+        except (OSError, ValueError):
+            pass
+        if total <= self.max_bytes:
+            return
+        # oldest first, down to 90% so the next few builds do not evict again
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * 0.9:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    @staticmethod
+    def cache_entry(directory):
+        """mtime_ns, bytes, directory of one pyramid in the cache."""
+        info = os.path.join(directory, 'pyramid.json')
+        if os.path.exists(info):
+            with open(info) as f:
+                size = json.load(f).get('bytes')
+            if size is not None:
+                return os.stat(info).st_mtime_ns, size, directory
+            mtime = os.stat(info).st_mtime_ns  # built before the size was recorded
+        else:
+            mtime = os.stat(directory).st_mtime_ns  # left half built by a crashed or cancelled build
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+        return mtime, size, directory
+
+    def load_tile_async(self, level, col, row):
+        worker = TileLoadWorker(self, level, col, row)
+        self.pool().start(worker)
+        return worker
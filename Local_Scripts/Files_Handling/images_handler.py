@@ -1,8 +1,16 @@
 from PyQt6.QtWidgets import QFileDialog, QMessageBox, QWidget
 from PyQt6.QtGui import QPixmap
 from PyQt6.QtCore import pyqtSignal
+from Local_Scripts.Files_Handling.image_cache import ImageCache
+from Local_Scripts.Files_Handling.image_metadata import ImageMetadata
+from Local_Scripts.Files_Handling.dataset_catalog import DatasetCatalog
+from Local_Scripts.Files_Handling.image_pyramid import ImagePyramid
+from Local_Scripts.Files_Handling.page_loader import PageLoader, PendingPage
+from Local_Scripts.Files_Handling.thumbnail_cache import ThumbnailCache
 import os
 
+IMAGE_EXTENSIONS = ('.png', '.jpeg', '.jpg', '.bmp', '.tif', '.tiff')
+
 
 class ImageHandler():
     def __init__(self):
@@ -11,30 +19,46 @@ class ImageHandler():
         self.current_image_index = -1
         self.current_image_base_name = ''
         self.list_images = []
+        self.image_positions = {}  # name -> index in list_images, rebuilt whenever the list is replaced
+        self.current_page = 0   # page of a multi-page tiff, 0 for every other format
+        self.page_count = 1
+        # pages with more pixels than this are shown from a disk cached tile pyramid instead of one pixmap
+        self.tiled_min_pixels = 60 * 1000 * 1000
+        self.image_cache = ImageCache(prefetch_count=2, max_bytes=512 * 1024 * 1024,
+                                      max_image_pixels=self.tiled_min_pixels)
+        # pages not in the cache yet are decoded by the page loader while the window already shows them
+        self.page_loader = PageLoader(self.image_cache)
+        self.thumbnail_cache = ThumbnailCache(image_cache=self.image_cache)
+        self.image_metadata = ImageMetadata()
+        self.catalog = None
 
     def open_image(self):
         self.current_image_opened, _ = QFileDialog.getOpenFileName(None, 'Select Image', r'D:\New DataSet\Img',
-                                                                   'Images (*.png *.jpeg *.jpg *.bmp)')
+                                                                   'Images (*.png *.jpeg *.jpg *.bmp *.tif *.tiff)')
         if self.current_image_opened:
-            self.list_images.clear()
             self.current_image_base_name = os.path.basename(self.current_image_opened)
-            self.list_images.append(self.current_image_base_name)
-            return QPixmap(self.current_image_opened)
+            self.set_image_list([self.current_image_base_name])
+            self.set_first_page()
+            return self.load_page(self.current_image_opened)
         else:
             print('No image to load')
 
     def select_directory(self):
         self.directory = QFileDialog.getExistingDirectory(None, 'Select Directory', r'D:\New DataSet\Img')
         if self.directory:
-            self.list_images.clear()
-            self.list_images = [f for f in os.listdir(self.directory) if
-                                f.lower().endswith(('.png', '.jpeg', '.jpg', '.bmp'))]
+            self.image_cache.clear()
+            self.thumbnail_cache.clear()
+            self.open_catalog()
+            self.set_image_list(self.catalog.image_names())
             self.current_image_index = 0
 
             if self.list_images:
                 self.current_image_opened = os.path.join(self.directory, self.list_images[self.current_image_index])
                 self.current_image_base_name = os.path.basename(self.current_image_opened)
-                return QPixmap(self.current_image_opened)
+                self.set_first_page()
+                pixmap = self.load_page(self.current_image_opened)
+                self.image_cache.prefetch_around(self.directory, self.list_images, self.current_image_index)
+                return pixmap
             else:
                 print('There is no image to open')
 
@@ -49,23 +73,82 @@ class ImageHandler():
                 QMessageBox.information(None, 'Completion Message', 'There is no more images in the directory')
 
     def open_image_from_list(self, name):
-        if name in self.list_images:
-            index = self.list_images.index(name)
+        index = self.index_of(name)
+        if index >= 0:
             self.current_image_index = index
             self.current_image_opened = os.path.join(self.directory, name)
             self.current_image_base_name = os.path.basename(self.current_image_opened)
-            return QPixmap(self.current_image_opened)
+            self.set_first_page()
+            pixmap = self.load_page(self.current_image_opened)
+            self.image_cache.prefetch_around(self.directory, self.list_images, index)
+            return pixmap
         else:
             print(f'there is no file found in list with name {name}')
 
+    def load_page(self, path, page=0):
+        # returns a QPixmap when the page is cached, an ImagePyramid for pages too big to hold as one
+        # pixmap, else a PendingPage that MainWindow hands to the page loader
+        self.page_loader.cancel()
+        width, height = self.image_metadata.get_size(path, page)
+        if width * height >= self.tiled_min_pixels:
+            return ImagePyramid(path, width, height, page=page)
+        pixmap = self.image_cache.cached_pixmap(path, page)
+        if pixmap is not None:
+            return pixmap
+        return PendingPage(path, page, width, height)
+
+    def set_first_page(self):
+        self.current_page = 0
+        self.page_count = self.image_metadata.get_page_count(self.current_image_opened)
+
+    def open_page(self, page):
+        if self.current_image_opened and 0 <= page < self.page_count:
+            self.current_page = page
+            return self.load_page(self.current_image_opened, page)
+        return None
+
+    def is_multi_page(self):
+        return self.page_count > 1
+
+    def open_catalog(self):
+        # only new or modified files are probed, the rest comes from the catalog of the last visit
+        if self.catalog is None or self.catalog.directory != self.directory:
+            if self.catalog:
+                self.catalog.close()
+            self.catalog = DatasetCatalog(self.directory, IMAGE_EXTENSIONS)
+        self.catalog.refresh()
+
+    def get_image_status(self, name):
+        if self.catalog and self.directory:
+            return self.catalog.get_status(name)
+        return None
+
+    def record_box_saved(self, box_path, box_count, name=None):
+        # name is given for saves that finish in the background, the user may be on another image by then
+        if self.catalog and self.directory:
+            self.catalog.record_box_saved(name or self.current_image_base_name, box_path, box_count)
+
     def get_current_opened_image_base_name(self):
         return self.current_image_base_name
 
     def get_image_list(self):
         return self.list_images
 
+    def set_image_list(self, names):
+        # a new list object, the sidebar model tells a changed list apart by identity
+        self.list_images = names
+        self.image_positions = {name: index for index, name in enumerate(names)}
+
+    def index_of(self, name):
+        return self.image_positions.get(name, -1)
+
+    def path_of(self, name):
+        directory = self.directory or os.path.dirname(self.current_image_opened or '')
+        return os.path.join(directory, name)
+
     def get_image_size(self):
-        img = QPixmap(self.current_image_opened)
-        width = img.width()
-        height = img.height()
-        return width, height
+        # header only lookup, the pixels are already decoded once for display
+        return self.image_metadata.get_size(self.current_image_opened, self.current_page)
+
+    def get_image_info(self):
+        return self.image_metadata.get_info(self.current_image_opened, self.current_page)
@@ -0,0 +1,67 @@
+from Local_Scripts.Files_Handling.box_proposer import load_gray, binarize
+from Local_Scripts.tracer import TRACER
+import numpy as np
+
+
+class InkSnapper():
+    """Shrinks boxes to the ink inside them, from a summed-area table built once per page.
+
+    Any row or column projection of a box is four table lookups, so each edge of a box is found by a
+    binary search over those prefix sums. All boxes of a page are searched together as arrays.
+    """
+
+    def __init__(self, ink):
+        self.height, self.width = ink.shape
+        # table[r, c] is the ink count of rows [0, r) and columns [0, c)
+        self.table = np.zeros((self.height + 1, self.width + 1), dtype=np.int32)
+        np.cumsum(ink, axis=0, dtype=np.int32, out=self.table[1:, 1:])
+        np.cumsum(self.table[1:, 1:], axis=1, out=self.table[1:, 1:])
+
+    @classmethod
+    def from_image(cls, path, threshold=None, page=0):
+        gray = load_gray(path, page)
+        if gray is None:
+            return None
+        with TRACER.span('build_ink_table', 'snap'):
+            return cls(binarize(gray, threshold))
+
+    def ink_in(self, left, top, right, bottom):
+        table = self.table
+        return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+    @staticmethod
+    def first_true(low, high, predicate):
+        # smallest k in [low, high] with predicate(k), predicate is monotone and true at high
+        while True:
+            open_ = low < high
+            if not open_.any():
+                return low
+            middle = (low + high) // 2
+            hit = predicate(middle) & open_
+            high = np.where(hit, middle, high)
+            low = np.where(hit | ~open_, low, middle + 1)
+
+    def tighten(self, x, y, w, h):
+        """Tight x, y, w, h of the ink inside each box, boxes without any ink are returned unchanged."""
+        with TRACER.span('tighten_boxes', 'snap'):
+            x, y = np.asarray(x, dtype=np.int64), np.asarray(y, dtype=np.int64)
+            w, h = np.asarray(w, dtype=np.int64), np.asarray(h, dtype=np.int64)
+            left, right = np.clip(x, 0, self.width), np.clip(x + w, 0, self.width)
+            top, bottom = np.clip(y, 0, self.height), np.clip(y + h, 0, self.height)
+            total = self.ink_in(left, top, right, bottom)
+            inked = total > 0
+
+            # columns from the full box height, rows from the full box width, the two are independent
+            new_left = self.first_true(left, right, lambda k: self.ink_in(left, top, k, bottom) > 0) - 1
+            new_right = self.first_true(left, right, lambda k: self.ink_in(left, top, k, bottom) >= total)
+            new_top = self.first_true(top, bottom, lambda k: self.ink_in(left, top, right, k) > 0) - 1
+            new_bottom = self.first_true(top, bottom, lambda k: self.ink_in(left, top, right, k) >= total)
+
+            return (np.where(inked, new_left, x).astype(np.int32),
+                    np.where(inked, new_top, y).astype(np.int32),
+                    np.where(inked, new_right - new_left, w).astype(np.int32),
+                    np.where(inked, new_bottom - new_top, h).astype(np.int32))
+
+    def tighten_one(self, x, y, w, h):
+        x, y, w, h = self.tighten([round(x)], [round(y)], [round(w)], [round(h)])
+        return int(x[0]), int(y[0]), int(w[0]), int(h[0])
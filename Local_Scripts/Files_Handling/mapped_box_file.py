@@ -0,0 +1,59 @@
+from Local_Scripts.Files_Handling.box_store import BoxStore
+from Local_Scripts.tracer import TRACER
+import mmap
+import numpy as np
+import os
+
+
+class MappedBoxFile():
+    """Read-only memory map of a box file with a start offset per line, rows are parsed only when asked for.
+
+    Indexing is one pass over the map in fixed size windows, so a file of hundreds of MB never needs more
+    than one window of temporaries. Offsets are uint32 below 4 GB, four bytes per line.
+    """
+
+    SCAN_CHUNK = 16 * 1024 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.buffer = np.frombuffer(self.map, dtype=np.uint8) if self.map else np.zeros(0, dtype=np.uint8)
+        with TRACER.span('index_box_lines', 'parse'):
+            self.line_starts = self.index_lines()
+
+    def index_lines(self):
+        dtype = np.uint32 if self.size < 2 ** 32 else np.uint64
+        parts = [np.zeros(1, dtype=dtype)]
+        for offset in range(0, self.size, self.SCAN_CHUNK):
+            newlines = np.flatnonzero(self.buffer[offset:offset + self.SCAN_CHUNK] == 10)
+            parts.append((newlines + (offset + 1)).astype(dtype))
+        starts = np.concatenate(parts)
+        if starts[-1] == self.size:
+            starts = starts[:-1]  # nothing after the last newline
+        return starts
+
+    def __len__(self):
+        return len(self.line_starts)
+
+    def byte_range(self, first, last):
+        start = int(self.line_starts[first]) if first < len(self) else self.size
+        end = int(self.line_starts[last]) if last < len(self) else self.size
+        return start, end
+
+    def read_rows(self, first, last, img_height):
+        """chars, x, y, w, h, page of the boxes on lines [first, last), lines that are not boxes are skipped."""
+        start, end = self.byte_range(first, last)
+        chars, numbers = BoxStore.parse_box_bytes(self.map[start:end] if self.map else b'')
+        x, y, w, h = BoxStore.tesseract_to_scene(numbers[:, 0], numbers[:, 1], numbers[:, 2], numbers[:, 3],
+                                                 img_height)
+        return chars, x, y, w, h, numbers[:, 4]
+
+    def close(self):
+        # the numpy view has to go before the map, mmap refuses to close while it is exported
+        self.buffer = None
+        if self.map:
+            self.map.close()
+            self.map = None
+        self.file.close()
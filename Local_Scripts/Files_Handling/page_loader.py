@@ -0,0 +1,149 @@
+from PyQt6.QtCore import pyqtSignal, QObject, QRunnable, QThreadPool, QTimer, QSize
+from PyQt6.QtGui import QImage, QImageReader, QImageIOHandler
+from Local_Scripts.tracer import TRACER
+
+
+class PendingPage():
+    """Placeholder for a page that is still being decoded.
+
+    Width / height / isNull mirror QPixmap for MainWindow.load_image, like ImagePyramid does, so the
+    scene, the zoom and the boxes can be set up from the header size before any pixel is decoded.
+    """
+
+    def __init__(self, path, page, width, height):
+        self.path = path
+        self.page = page
+        self.image_width = width
+        self.image_height = height
+
+    def width(self):
+        return self.image_width
+
+    def height(self):
+        return self.image_height
+
+    def isNull(self):
+        return self.image_width <= 0 or self.image_height <= 0
+
+
+class PageDecodeSignals(QObject):
+    sg_page_decoded = pyqtSignal(int, str, int, QImage, bool)
+
+
+class PageDecodeWorker(QRunnable):
+    def __init__(self, loader, generation, path, page, scaled_size=None):
+        super().__init__()
+        self.loader = loader
+        self.generation = generation
+        self.path = path
+        self.page = page
+        self.scaled_size = scaled_size
+        self.signals = PageDecodeSignals()
+
+    def run(self):
+        if self.generation != self.loader.generation:
+            return  # the user left this page before the decode started
+        reader = QImageReader(self.path)
+        if self.page and not reader.jumpToImage(self.page):
+            return
+        if self.scaled_size is not None:
+            reader.setScaledSize(self.scaled_size)
+        with TRACER.span('decode_preview' if self.scaled_size else 'decode_image', 'decode'):
+            image = reader.read()
+        if image.isNull() or self.generation != self.loader.generation:
+            return
+        try:
+            self.signals.sg_page_decoded.emit(self.generation, self.path, self.page, image, self.scaled_size is None)
+        except RuntimeError:
+            pass  # the app was closed while the page was decoding
+
+
+class PageLoader(QObject):
+    """Decodes the page being opened off the UI thread, first at the fit-in-view size, then in full.
+
+    The full decode starts upgrade_delay_ms after the preview is shown, or right away on upgrade_now
+    (the user zoomed in). Every request bumps the generation, results of an older one are dropped.
+    Full decodes go into the ImageCache, so coming back to a page is a cache hit, and a page the
+    ImageCache is prefetching already is taken from that decode instead of being decoded again.
+
+    Only formats whose reader decodes straight to a smaller size (jpeg) get a preview, png and tiff
+    readers decode in full and scale afterwards, which is slower than the full decode alone.
+    """
+    sg_page_decoded = pyqtSignal(str, int, QImage, bool)
+
+    def __init__(self, image_cache, upgrade_delay_ms=300, min_preview_ratio=0.5):
+        super().__init__()
+        self.image_cache = image_cache
+        self.upgrade_delay_ms = upgrade_delay_ms
+        self.min_preview_ratio = min_preview_ratio  # no preview when the fit scale is above this
+        self.generation = 0
+        self.current = None   # (path, page) of the request in progress
+        self.full_started = False
+        self.waiting_prefetch = False  # the full decode is the ImageCache prefetch of the page
+        image_cache.sg_prefetch_finished.connect(self.on_prefetch_finished)
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.upgrade_timer = QTimer(self)
+        self.upgrade_timer.setSingleShot(True)
+        self.upgrade_timer.timeout.connect(self.upgrade_now)
+
+    def request(self, pending, view_size):
+        self.cancel()
+        self.current = (pending.path, pending.page)
+        # a prefetch may have finished since load_page looked at the cache, or may still be decoding
+        image = self.image_cache.cached_image(pending.path, pending.page)
+        if image is not None:
+            self.current = None
+            self.sg_page_decoded.emit(pending.path, pending.page, image, True)
+            return
+        if pending.page == 0 and self.image_cache.is_prefetching(pending.path):
+            self.full_started = self.waiting_prefetch = True
+            return
+        scale = min(view_size.width() / pending.width(), view_size.height() / pending.height())
+        scalable = QImageReader(pending.path).supportsOption(QImageIOHandler.ImageOption.ScaledSize)
+        if scale > self.min_preview_ratio or not scalable:
+            self.upgrade_now()
+            return
+        size = QSize(max(1, round(pending.width() * scale)), max(1, round(pending.height() * scale)))
+        self.start(PageDecodeWorker(self, self.generation, pending.path, pending.page, size))
+
+    def upgrade_now(self, _=None):
+        if self.current is None or self.full_started:
+            return
+        self.upgrade_timer.stop()
+        self.full_started = True
+        self.start(PageDecodeWorker(self, self.generation, *self.current))
+
+    def start(self, worker):
+        worker.signals.sg_page_decoded.connect(TRACER.slot(self.on_page_decoded))
+        self.thread_pool.start(worker)
+
+    def on_page_decoded(self, generation, path, page, image, full):
+        if generation != self.generation:
+            return
+        if full:
+            self.image_cache.store((path, page), image)
+            self.current = None
+        else:
+            self.upgrade_timer.start(self.upgrade_delay_ms)
+        self.sg_page_decoded.emit(path, page, image, full)
+
+    def on_prefetch_finished(self, path, image):
+        if not self.waiting_prefetch or self.current != (path, 0):
+            return
+        self.waiting_prefetch = False
+        self.current = None
+        if not image.isNull():
+            self.sg_page_decoded.emit(path, 0, image, True)
+
+    def cancel(self):
+        self.generation += 1
+        self.current = None
+        self.full_started = False
+        self.waiting_prefetch = False
+        self.upgrade_timer.stop()
+        # queued decodes of the pages left behind are dropped before they start
+        self.thread_pool.clear()
+
+    def is_loading(self):
+        return self.current is not None
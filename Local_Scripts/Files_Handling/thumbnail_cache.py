@@ -0,0 +1,193 @@
+from PyQt6.QtCore import pyqtSignal, QObject, QRunnable, QThreadPool, Qt
+from PyQt6.QtGui import QImage, QImageIOHandler, QImageReader, QPixmap
+from collections import OrderedDict
+from Local_Scripts.Files_Handling.image_pyramid import ImagePyramid
+from Local_Scripts.tracer import TRACER
+import hashlib
+import os
+import tempfile
+import threading
+
+
+class ThumbnailSignals(QObject):
+    sg_thumbnail_loaded = pyqtSignal(str, QImage)
+
+
+class ThumbnailWorker(QRunnable):
+    """Loads one thumbnail from the disk cache, or makes it from the page at reduced size and stores it."""
+
+    def __init__(self, cache, path, source=None):
+        super().__init__()
+        self.cache = cache
+        self.path = path
+        self.source = source  # the decoded page when the ImageCache already holds it
+        self.cancelled = False
+        self.signals = ThumbnailSignals()
+
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            cache_path = self.cache.cache_path(self.path)
+        except OSError:
+            return  # the image is gone
+        image = QImage(cache_path) if os.path.exists(cache_path) else QImage()
+        if image.isNull():
+            image = self.make_thumbnail()
+            if image.isNull() or self.cancelled:
+                return
+            self.cache.save(cache_path, image)
+        else:
+            self.cache.mark_used(cache_path)
+        if self.cancelled:
+            return
+        try:
+            self.signals.sg_thumbnail_loaded.emit(self.path, image)
+        except RuntimeError:
+            pass  # the app was closed while the thumbnail was loading
+
+    def make_thumbnail(self):
+        if self.source is not None:
+            return self.scaled(self.source)
+        reader = QImageReader(self.path)
+        size = reader.size()
+        if not size.isValid():
+            return QImage()
+        if not reader.supportsOption(QImageIOHandler.ImageOption.ScaledSize):
+            # png and tiff readers can not decode at a smaller size, the last level of a built pyramid
+            # already is the page in one tile
+            tile = ImagePyramid(self.path, size.width(), size.height()).coarsest_tile()
+            if not tile.isNull():
+                return self.scaled(tile)
+        # only a page that is neither in memory nor tiled is decoded here, in full for png and tiff
+        reader.setScaledSize(size.scaled(self.cache.size, self.cache.size, Qt.AspectRatioMode.KeepAspectRatio))
+        with TRACER.span('make_thumbnail', 'decode'):
+            return reader.read()
+
+    def scaled(self, image):
+        return image.scaled(self.cache.size, self.cache.size, Qt.AspectRatioMode.KeepAspectRatio,
+                            Qt.TransformationMode.SmoothTransformation)
+
+
+class ThumbnailCache(QObject):
+    """Thumbnails of the image list, made by a worker pool and kept on disk keyed by path + mtime + size.
+
+    get() never blocks, it answers from memory or queues a worker and returns a blank placeholder of
+    the thumbnail size, the view is told through sg_thumbnail_ready once the pixmap is there.
+    keep_only() drops queued work for rows that scrolled out of view. When cache_dir grows past
+    max_bytes the least recently used thumbnails are removed.
+    """
+    sg_thumbnail_ready = pyqtSignal(str)
+
+    def __init__(self, size=96, cache_dir=None, max_pixmaps=2000, max_threads=2, max_bytes=128 * 1024 * 1024,
+                 image_cache=None):
+        super().__init__()
+        self.size = size
+        self.image_cache = image_cache   # pages it holds are scaled down instead of decoded again
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser('~'), '.cache', 'box_editor', 'thumbnails')
+        self.max_bytes = max_bytes
+        self.written = 0                 # bytes saved since the last eviction, shared by the workers
+        self.written_lock = threading.Lock()
+        self.max_pixmaps = max_pixmaps
+        self.pixmaps = OrderedDict()     # path -> QPixmap, most recently used at the end
+        self.pending = {}                # path -> ThumbnailWorker still queued or running
+        self.placeholder = None
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(max_threads)
+
+    def cache_path(self, path):
+        stat = os.stat(path)
+        raw = f'{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.size}'
+        return os.path.join(self.cache_dir, hashlib.sha1(raw.encode()).hexdigest() + '.png')
+
+    def save(self, cache_path, image):
+        # called from the workers, written to a temporary name first so a reader never sees half a file
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.', suffix='.png')
+            os.close(fd)
+        except OSError as e:
+            print(f'Error: can not write thumbnail cache: {e}')
+            return
+        if image.save(tmp_path, 'PNG'):
+            os.replace(tmp_path, cache_path)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+            return
+        # the directory is only scanned once a tenth of max_bytes was written, not after every thumbnail
+        try:
+            size = os.path.getsize(cache_path)
+        except OSError:
+            return  # already evicted by another worker
+        with self.written_lock:
+            self.written += size
+            due = self.written > self.max_bytes // 10
+            if due:
+                self.written = 0
+        if due:
+            self.evict()
+
+    def mark_used(self, cache_path):
+        try:
+            os.utime(cache_path)  # the mtime of a thumbnail is its last use, eviction goes by it
+        except OSError:
+            pass
+
+    def evict(self):
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith('.png') and not entry.name.startswith('.'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        # oldest first, down to 90% so the next few thumbnails do not evict again
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def get(self, path):
+        pixmap = self.pixmaps.get(path)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(path)
+            return pixmap
+        if path not in self.pending:
+            source = self.image_cache.cached_image(path, touch=False) if self.image_cache else None
+            worker = ThumbnailWorker(self, path, source)
+            worker.signals.sg_thumbnail_loaded.connect(self.on_thumbnail_loaded)
+            self.pending[path] = worker
+            self.thread_pool.start(worker)
+        if self.placeholder is None:
+            # same size as a thumbnail, so rows do not change height when the real one arrives
+            self.placeholder = QPixmap(self.size, self.size)
+            self.placeholder.fill(Qt.GlobalColor.transparent)
+        return self.placeholder
+
+    def on_thumbnail_loaded(self, path, image):
+        worker = self.pending.pop(path, None)
+        if worker is None or worker.cancelled:
+            return
+        self.pixmaps[path] = QPixmap.fromImage(image)
+        while len(self.pixmaps) > self.max_pixmaps:
+            self.pixmaps.popitem(last=False)
+        self.sg_thumbnail_ready.emit(path)
+
+    def keep_only(self, paths):
+        paths = set(paths)
+        for path in list(self.pending):
+            if path not in paths:
+                self.pending.pop(path).cancelled = True
+
+    def clear(self):
+        self.keep_only(())
+        self.pixmaps.clear()
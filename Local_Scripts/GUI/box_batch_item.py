@@ -0,0 +1,193 @@
+from PyQt6.QtWidgets import QGraphicsItem, QGraphicsRectItem, QStyleOptionGraphicsItem
+from PyQt6.QtGui import QPen, QColor
+from PyQt6.QtCore import QRectF, Qt
+import numpy as np
+
+
+class BatchedRect():
+    """Stand-in for a QGraphicsRectItem in batched mode, only the geometry lives here.
+
+    RectDrawer keeps these in list_rect and in the spatial index, the pixels come from BoxBatchItem.
+    """
+    __slots__ = ('batch', 'rect_f')
+
+    def __init__(self, batch, rect):
+        self.batch = batch
+        self.rect_f = QRectF(rect)
+
+    def rect(self):
+        return QRectF(self.rect_f)
+
+    def setRect(self, rect):
+        self.rect_f = QRectF(rect)
+        self.batch.item_rect_changed(self)
+
+    def setPen(self, pen):
+        self.batch.set_item_pen(self, pen)
+
+
+class BoxBatchItem(QGraphicsItem):
+    """Paints every box of a BoxStore from its coordinate columns in one item.
+
+    Only boxes intersecting the exposed rect are drawn, boxes smaller than a pixel are skipped and
+    when zoomed far out a density overlay replaces the individual boxes. A box with a pen other
+    than the default one (the selected box) is drawn by a single overlay QGraphicsRectItem, boxes
+    flagged by the lint are drawn once more on top with mark_pen.
+    """
+
+    def __init__(self, box_store, pen):
+        super().__init__()
+        self.box_store = box_store
+        self.pen = QPen(pen)
+        self.pad = pen.widthF()
+        self.min_screen_size = 1.0      # boxes smaller than this many pixels on screen are skipped
+        self.density_screen_size = 3.0  # below this typical box size the density overlay is drawn
+        self.density_cell_pixels = 12
+        self.max_painted_boxes = 200000   # more boxes than this in view can not be told apart anyway
+        self.density_color = QColor(255, 90, 10)
+        self.bounds = QRectF()
+        self.typical_size = 0.0
+        self.typical_rows = 0           # boxes in the store when typical_size was last measured
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+
+        self.overlay = QGraphicsRectItem()
+        self.overlay.setZValue(1)
+        self.overlay.hide()
+        self.overlay_owner = None
+        self.marked = set()  # BatchedRects, not rows, so inserts and deletes do not move the marks
+        self.mark_pen = QPen(pen)
+        self.refresh()
+
+    def add_to_scene(self, scene):
+        scene.addItem(self)
+        scene.addItem(self.overlay)
+
+    def remove_from_scene(self, scene):
+        if self.scene() is scene:
+            scene.removeItem(self)
+        if self.overlay.scene() is scene:
+            scene.removeItem(self.overlay)
+
+    # =========================================================================================================
+    # ================================== Geometry bookkeeping  ================================================
+    # =========================================================================================================
+    def refresh(self):
+        store = self.box_store
+        if len(store):
+            left, top = float(store.x.min()), float(store.y.min())
+            right, bottom = float((store.x + store.w).max()), float((store.y + store.h).max())
+            bounds = QRectF(left, top, right - left, bottom - top).adjusted(-self.pad, -self.pad, self.pad, self.pad)
+            self.typical_size = float(np.median(np.maximum(store.w, store.h)))
+        else:
+            bounds = QRectF()
+            self.typical_size = 0.0
+        self.typical_rows = len(store)
+        self.set_bounds(bounds)
+
+    def refresh_rows(self, first, last):
+        # rows first..last were appended to the store, only they are looked at and the median box size is
+        # only taken again once the store has doubled, so a file filled step by step stays linear
+        store = self.box_store
+        if first == 0 or len(store) >= 2 * self.typical_rows:
+            self.refresh()
+            return
+        x, y, w, h = (column[first:last + 1] for column in (store.x, store.y, store.w, store.h))
+        left, top = float(x.min()), float(y.min())
+        right, bottom = float((x + w).max()), float((y + h).max())
+        added = QRectF(left, top, right - left, bottom - top).adjusted(-self.pad, -self.pad, self.pad, self.pad)
+        self.set_bounds(self.bounds.united(added))
+
+    def set_bounds(self, bounds):
+        if bounds != self.bounds:
+            self.prepareGeometryChange()
+            self.bounds = bounds
+        self.update()
+
+    def item_rect_changed(self, item):
+        if item is self.overlay_owner:
+            self.overlay.setRect(item.rect_f)
+        self.refresh()
+
+    def set_item_pen(self, item, pen):
+        if pen == self.pen:
+            if item is self.overlay_owner:
+                self.overlay_owner = None
+                self.overlay.hide()
+            return
+        self.overlay_owner = item
+        self.overlay.setPen(pen)
+        self.overlay.setRect(item.rect_f)
+        self.overlay.show()
+
+    def forget(self, item):
+        if item is self.overlay_owner:
+            self.overlay_owner = None
+            self.overlay.hide()
+        self.marked.discard(item)
+        self.refresh()
+
+    def set_marked(self, items, pen=None):
+        self.marked = set(items)
+        if pen is not None:
+            self.mark_pen = QPen(pen)
+        self.update()
+
+    # =========================================================================================================
+    # ================================== Painting  ============================================================
+    # =========================================================================================================
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, painter, option, widget=None):
+        store = self.box_store
+        if not len(store):
+            return
+        exposed = option.exposedRect.adjusted(-self.pad, -self.pad, self.pad, self.pad)
+        x, y, w, h = store.x, store.y, store.w, store.h
+        visible = ((x <= exposed.right()) & (x + w >= exposed.left()) &
+                   (y <= exposed.bottom()) & (y + h >= exposed.top()))
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+
+        if self.typical_size * lod < self.density_screen_size:
+            self.paint_density(painter, exposed, lod, visible)
+            return
+
+        visible &= np.maximum(w, h) * lod >= self.min_screen_size
+        index = np.flatnonzero(visible)
+        if index.size > self.max_painted_boxes:
+            self.paint_density(painter, exposed, lod, visible)
+            return
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        if index.size:
+            rects = [QRectF(a, b, c, d) for a, b, c, d in
+                     zip(x[index].tolist(), y[index].tolist(), w[index].tolist(), h[index].tolist())]
+            painter.setPen(self.pen)
+            painter.drawRects(*rects)
+        # normalized and grown by the pen, so empty and inverted boxes the lint found are drawn too
+        marked = [item.rect_f for item in self.marked
+                  if item.rect_f.normalized().adjusted(-self.pad, -self.pad, self.pad, self.pad).intersects(exposed)]
+        if marked:
+            painter.setPen(self.mark_pen)
+            painter.drawRects(*marked)
+
+    def paint_density(self, painter, exposed, lod, visible):
+        store = self.box_store
+        index = np.flatnonzero(visible)
+        if index.size == 0:
+            return
+        cell = self.density_cell_pixels / max(lod, 1e-6)
+        cols = max(1, int(exposed.width() // cell) + 1)
+        rows = max(1, int(exposed.height() // cell) + 1)
+        cx = store.x[index] + store.w[index] / 2.0
+        cy = store.y[index] + store.h[index] / 2.0
+        counts, _, _ = np.histogram2d(cx, cy, bins=(cols, rows),
+                                      range=((exposed.left(), exposed.left() + cols * cell),
+                                             (exposed.top(), exposed.top() + rows * cell)))
+        peak = counts.max()
+        if peak <= 0:
+            return
+        painter.setPen(Qt.PenStyle.NoPen)
+        color = QColor(self.density_color)
+        for col, row in zip(*np.nonzero(counts)):
+            color.setAlpha(int(40 + 200 * counts[col, row] / peak))
+            painter.fillRect(QRectF(exposed.left() + col * cell, exposed.top() + row * cell, cell, cell), color)
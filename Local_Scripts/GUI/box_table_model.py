@@ -0,0 +1,101 @@
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+
+
+class BoxTableModel(QAbstractTableModel):
+    """Table model over the shared BoxStore, cells are only read for the rows the view shows.
+
+    Rows are inserted and removed between the about-to and the done signals of RectDrawer and BoxFileHandler,
+    the sidebar opens and closes the matching begin/end pair around the store change. Other rows are edited
+    in the store first and then announced, sg_cell_edited is only emitted for edits typed into the table.
+    """
+    sg_cell_edited = pyqtSignal(int, int)
+
+    HEADERS = ['Char', 'X', 'Y', 'Width', 'Height']
+
+    def __init__(self, box_store):
+        super().__init__()
+        self.box_store = box_store
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.box_store)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return None
+        row, col = index.row(), index.column()
+        if row >= len(self.box_store):
+            return None
+        if col == 0:
+            return self.box_store.chars[row]
+        return str(self.box_store[row][col])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return str(section + 1)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        row, col = index.row(), index.column()
+        if col == 0:
+            self.box_store.set_char(row, str(value))
+        else:
+            try:
+                number = int(value)
+            except ValueError:
+                print('Error: None integer value entered')
+                return False
+            char, x, y, width, height = self.box_store[row]
+            cords = [x, y, width, height]
+            cords[col - 1] = number
+            self.box_store.set_rect(row, *cords)
+        self.dataChanged.emit(index, index)
+        self.sg_cell_edited.emit(row, col)
+        return True
+
+    # =========================================================================================================
+    # ================================== Store changed outside the table  =====================================
+    # =========================================================================================================
+    def set_box_store(self, box_store):
+        self.beginResetModel()
+        self.box_store = box_store
+        self.endResetModel()
+
+    def reset(self):
+        self.beginResetModel()
+        self.endResetModel()
+
+    def begin_insert_rows(self, first, last=None):
+        # called while the store does not hold the new rows yet, end_insert_rows follows once it does
+        self.beginInsertRows(QModelIndex(), first, first if last is None else last)
+
+    def end_insert_rows(self):
+        self.endInsertRows()
+
+    def begin_remove_rows(self, first, last=None):
+        self.beginRemoveRows(QModelIndex(), first, first if last is None else last)
+
+    def end_remove_rows(self):
+        self.endRemoveRows()
+
+    def row_changed(self, row, first_col=0, last_col=4):
+        self.dataChanged.emit(self.index(row, first_col), self.index(row, last_col))
+
+    def rows_changed(self, first, last, first_col=0, last_col=4):
+        # one signal for a whole block, the view repaints only the rows it shows
+        self.dataChanged.emit(self.index(first, first_col), self.index(last, last_col))
@@ -0,0 +1,136 @@
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt
+from PyQt6.QtGui import QColor
+import bisect
+import os
+
+
+class ImageListModel(QAbstractListModel):
+    """List model over the image names of the open directory, filled fetch_batch rows at a time.
+
+    Rows map to positions in names through matches (None while no filter is set), every filter
+    that extends the previous one only searches the previous matches. Lookups by name go through
+    the name -> position map, so locating the open image does not scan the list. With thumbnails on,
+    the icon of a row is only asked of the ThumbnailCache when the view paints that row.
+    """
+
+    def __init__(self, image_loader, fetch_batch=2000):
+        super().__init__()
+        self.image_loader = image_loader
+        self.fetch_batch = fetch_batch
+        self.names = []
+        self.lower_names = []
+        self.position_of = {}
+        self.matches = None      # sorted positions in names that pass the filter
+        self.filter_text = ''
+        self.loaded = 0          # rows handed to the view so far
+        self.thumbnails = False
+
+    def set_names(self, names):
+        self.beginResetModel()
+        self.names = names
+        self.lower_names = [name.lower() for name in names]
+        self.position_of = {name: position for position, name in enumerate(names)}
+        self.matches = None
+        self.filter_text = ''
+        self.loaded = min(self.fetch_batch, len(names))
+        self.endResetModel()
+
+    def set_filter(self, text):
+        text = text.lower()
+        if text == self.filter_text:
+            return
+        self.beginResetModel()
+        if not text:
+            self.matches = None
+        else:
+            # typing one more char narrows the last result instead of searching every name again
+            if self.matches is not None and self.filter_text and text.startswith(self.filter_text):
+                candidates = self.matches
+            else:
+                candidates = range(len(self.names))
+            lower_names = self.lower_names
+            self.matches = [position for position in candidates if text in lower_names[position]]
+        self.filter_text = text
+        self.loaded = min(self.fetch_batch, self.total_rows())
+        self.endResetModel()
+
+    def set_thumbnails(self, enabled):
+        self.thumbnails = enabled
+        if self.loaded:
+            self.dataChanged.emit(self.index(0), self.index(self.loaded - 1), [Qt.ItemDataRole.DecorationRole])
+
+    def on_thumbnail_ready(self, path):
+        row = self.row_in_view(os.path.basename(path))
+        if 0 <= row < self.loaded:
+            self.dataChanged.emit(self.index(row), self.index(row), [Qt.ItemDataRole.DecorationRole])
+
+    def total_rows(self):
+        return len(self.names) if self.matches is None else len(self.matches)
+
+    # =========================================================================================================
+    # ================================== Model interface  =====================================================
+    # =========================================================================================================
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.loaded
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < self.total_rows()
+
+    def fetchMore(self, parent=QModelIndex()):
+        self.fetch_until(self.loaded + self.fetch_batch - 1)
+
+    def fetch_until(self, row):
+        last = min(row, self.total_rows() - 1)
+        if last < self.loaded:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, last)
+        self.loaded = last + 1
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= self.loaded:
+            return None
+        name = self.name_at(index.row())
+        if role == Qt.ItemDataRole.DisplayRole:
+            return name
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.image_loader.thumbnail_cache.get(self.image_loader.path_of(name)) if self.thumbnails else None
+        if role not in (Qt.ItemDataRole.ToolTipRole, Qt.ItemDataRole.ForegroundRole):
+            return None
+        # status comes from the dataset catalog, no file is touched here
+        status = self.image_loader.get_image_status(name)
+        if status is None:
+            return None
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return None if status.has_box else QColor(Qt.GlobalColor.gray)
+        if status.has_box:
+            return f'{status.box_count} boxes, {status.width} x {status.height}'
+        return f'No box file, {status.width} x {status.height}'
+
+    # =========================================================================================================
+    # ================================== Lookups  =============================================================
+    # =========================================================================================================
+    def name_at(self, row):
+        position = row if self.matches is None else self.matches[row]
+        return self.names[position]
+
+    def row_in_view(self, name):
+        # row of name under the current filter, or -1, whether it was fetched yet or not
+        position = self.position_of.get(name)
+        if position is None:
+            return -1
+        if self.matches is None:
+            return position
+        row = bisect.bisect_left(self.matches, position)
+        if row == len(self.matches) or self.matches[row] != position:
+            return -1
+        return row
+
+    def row_of(self, name):
+        """Row of name under the current filter, or -1. Rows not fetched yet are fetched first."""
+        row = self.row_in_view(name)
+        if row >= 0:
+            self.fetch_until(row)
+        return row
@@ -1,25 +1,77 @@
-from PyQt6.QtWidgets import QGraphicsRectItem, QMessageBox
+from PyQt6.QtWidgets import QMessageBox
 from PyQt6.QtGui import QPen, QColor
-from PyQt6.QtCore import QRectF, Qt, pyqtSignal, QObject
+from PyQt6.QtCore import QRectF, Qt, pyqtSignal, QObject, QTimer
+from Local_Scripts.GUI.spatial_index import SpatialGrid
+from Local_Scripts.GUI.box_batch_item import BoxBatchItem, BatchedRect
+from Local_Scripts.GUI.rect_item_pool import RectItemPool
+from Local_Scripts.Files_Handling.ink_snapper import InkSnapper
+import numpy as np
+import time
 
 
 class RectDrawer(QObject):
+    sg_rect_about_to_be_placed = pyqtSignal(str, int)
     sg_new_rect_placed = pyqtSignal(str, int, QRectF)
     sg_rect_selection_changes = pyqtSignal(str, int, QRectF)
     sg_rect_updated = pyqtSignal(str, int, QRectF)
+    sg_rect_about_to_be_deleted = pyqtSignal(str, int)
     sg_rect_deleted = pyqtSignal(str, int)
     sg_key_pressed = pyqtSignal(str, int, str)
+    sg_interaction_finished = pyqtSignal(str)
+    sg_rects_tightened = pyqtSignal(str, object)
+    sg_population_progress = pyqtSignal(str, int, int)
 
-    def __init__(self):
+    def __init__(self, box_store):
         super().__init__()
+        self.box_store = box_store
         self.current_rect = None
         self.drawing_allowed = False
         self.list_rect = []
+        self.item_rows = {}  # rect item -> row in list_rect, see row_of
+        self.spatial_index = SpatialGrid()
+        # 'items' draws one QGraphicsRectItem per box, 'batched' paints all boxes from one BoxBatchItem
+        # and 'auto' switches to batched once a box file has at least batched_min_boxes boxes
+        self.render_mode = 'auto'
+        self.batched_min_boxes = 5000
+        self.batch_item = None
+        self.spare_batch_item = None  # the batch of the last page, reused when the next one is batched too
+        # one pen per state, shared by every item instead of a new QPen per box
+        self.box_pen = QPen(QColor(255, 90, 10))
+        self.box_pen.setWidth(2)
+        self.selected_pen = QPen(QColor(Qt.GlobalColor.blue))
+        self.selected_pen.setWidth(2)
+        self.marked_pen = QPen(QColor(220, 0, 0))
+        self.marked_pen.setWidth(3)
+        # items of the pages left behind are handed out again for the next page
+        self.item_pool = RectItemPool()
+        # columns of the boxes on screen when Reload was clicked, the reloaded rows are diffed against them
+        self.reload_base = None
+        self.reloading = False  # from prepare_reload until the reloaded store is drawn, the rows do not match
         self.selected_rect = None
         self.previous_rect_index = None
         self.is_resizing_any_rect = False
         self.resizing_side = None
+        self.resizing_index = None  # row of the rect being resized, so mouse moves skip list_rect.index
         self.resizing_threshold = 5
+        # snap to ink, the summed-area table of the page is only built the first time it is needed
+        self.snap_to_ink = False
+        self.page_path = None
+        self.page_number = 0
+        self.ink_snapper = None
+        # boxes flagged by the last lint run keep a red pen until the next run or a redraw
+        self.lint_marked = set()
+        # rect items are made in slices of population_slice_ms per event loop turn, boxes in view first.
+        # list_rect holds None for rows not made yet, edits that shift rows finish the population first
+        self.progressive_population = True
+        self.population_slice_ms = 8
+        self.population_step = 500
+        self.pending_rows = np.zeros(0, dtype=np.int64)
+        self.pending_position = 0
+        self.population_scene = None
+        self.visible_rect = None
+        self.population_timer = QTimer(self)
+        self.population_timer.setSingleShot(True)
+        self.population_timer.timeout.connect(self.populate_next_slice)
         # for detecting clicks
         self.dragging_threshold = 15
         self.click_starting_position = None
@@ -31,13 +83,16 @@ class RectDrawer(QObject):
         # Checking if we are resizing or not
         if self.selected_rect and self.is_near_side(position):
             self.is_resizing_any_rect = True
+            self.resizing_index = self.row_of(self.selected_rect)
+            return
+        if self.start_resizing_nearest_edge(position):
             return
 
         if not self.select_rect(position):  # this click happens outside the rect
             # check if there is any rect exist and one is selected
             if len(self.list_rect) > 0:  # which means we have one or more rects on the scene
                 if self.selected_rect:
-                    self.previous_rect_index = self.list_rect.index(self.selected_rect)
+                    self.previous_rect_index = self.row_of(self.selected_rect)
                     self.deselect_current_rect()
                     self.place_a_rect(scene, position)
                 else:
@@ -47,13 +102,21 @@ class RectDrawer(QObject):
 
 
 
+    def start_resizing_nearest_edge(self, position):
+        rect_item, side = self.spatial_index.edge_near(position.x(), position.y(), self.resizing_threshold)
+        if rect_item is None:
+            return False
+        self.deselect_current_rect()
+        self.selected_rect = rect_item
+        self.resizing_index = self.row_of(rect_item)
+        self.highlight_selected_rect(self.resizing_index)
+        self.resizing_side = side
+        self.is_resizing_any_rect = True
+        return True
+
     def place_a_rect(self, scene, position):
         # Start drawing a new rectangle
-        self.current_rect = QGraphicsRectItem(QRectF(position, position))
-        pen = QPen(QColor(255, 90, 10))  # Set pen for the new rectangle
-        pen.setWidth(2)
-        self.current_rect.setPen(pen)
-        scene.addItem(self.current_rect)
+        self.current_rect = self.item_pool.acquire(scene, QRectF(position, position), self.box_pen)
 
     def update_rect(self, view, event):
         position = view.mapToScene(event.pos())
@@ -73,12 +136,23 @@ class RectDrawer(QObject):
                           abs(self.click_ending_position.y() - self.click_starting_position.y()))
         allowed = drag_amount >= self.dragging_threshold
         if self.current_rect and allowed:
+            self.finish_population()
+            if self.snap_to_ink:
+                self.current_rect.setRect(self.snapped(self.current_rect.rect()))
+            if self.batch_item:
+                self.item_pool.release(scene, [self.current_rect])
+                self.current_rect = BatchedRect(self.batch_item, self.current_rect.rect())
             if len(self.list_rect) == 0:
                 self.list_rect.append(self.current_rect)
                 index = 0
             else:
                 index = self.previous_rect_index + 1
                 self.list_rect.insert(self.previous_rect_index+1, self.current_rect)
+            self.sg_rect_about_to_be_placed.emit('rect', index)
+            self.box_store.insert_rect(index, self.current_rect.rect())
+            self.spatial_index.insert(self.current_rect, self.current_rect.rect())
+            if self.batch_item:
+                self.batch_item.refresh()
             self.selected_rect = self.current_rect
             self.current_rect = None
             self.is_resizing_any_rect = False
@@ -86,41 +160,43 @@ class RectDrawer(QObject):
             self.sg_new_rect_placed.emit('rect',index, message)
             self.highlight_selected_rect(index)
         else:
+            if self.snap_to_ink and self.is_resizing_any_rect and self.resizing_index is not None:
+                self.snap_resized_rect()
             self.manage_clicks(scene)
+        self.resizing_index = None
+        self.sg_interaction_finished.emit('rect')
     
     def manage_clicks(self, scene):
         if not self.selected_rect:
-            scene.removeItem(self.current_rect)
+            if self.current_rect is not None:
+                self.item_pool.release(scene, [self.current_rect])
             self.current_rect = None
             self.selected_rect = None
         else:
             self.is_resizing_any_rect = None
 
     def select_rect(self, position):
-        for rect_item in self.list_rect:
-            if rect_item.rect().contains(position):
-                if self.select_rect:
-                    self.deselect_current_rect()
-            
-                self.selected_rect = rect_item
-                index = self.list_rect.index(rect_item)
-                self.highlight_selected_rect(index)
-                return True
+        rect_item = self.spatial_index.item_at(position.x(), position.y())
+        if rect_item is not None:
+            if self.select_rect:
+                self.deselect_current_rect()
+
+            self.selected_rect = rect_item
+            index = self.row_of(rect_item)
+            self.highlight_selected_rect(index)
+            return True
         return False
 
     def highlight_selected_rect(self, index):
         if self.selected_rect:
-            pen = QPen(QColor(Qt.GlobalColor.blue))  # Highlight color for selected rectangle
-            pen.setWidth(2)
-            self.selected_rect.setPen(pen)
+            self.selected_rect.setPen(self.selected_pen)
             message = self.selected_rect.rect()
            
             self.sg_rect_selection_changes.emit('rect',index, message)
 
     def deselect_current_rect(self):
         if self.selected_rect:
-            pen = QPen(QColor(255, 90, 10))  # Reset pen to original color (orange)
-            pen.setWidth(2)
+            pen = self.marked_pen if self.selected_rect in self.lint_marked else self.box_pen
             self.selected_rect.setPen(pen)
             self.selected_rect = None
 
@@ -166,99 +242,370 @@ class RectDrawer(QObject):
         elif self.resizing_side == 'bottom':
             rect.setBottom(position.y())
 
+        index = self.resizing_index
+        if index is None:
+            index = self.row_of(self.selected_rect)
+        self.box_store.set_qrect(index, rect)
         self.selected_rect.setRect(rect)
         message = self.selected_rect.rect()
-        index = self.list_rect.index(self.selected_rect)
+        self.spatial_index.update(self.selected_rect, message)
         self.sg_rect_updated.emit('rect', index, message)
         
     
 
+    # =========================================================================================================
+    # ================================== Snap to ink  =========================================================
+    # =========================================================================================================
+    def set_page(self, path, page=0):
+        if (path, page) != (self.page_path, self.page_number):
+            self.page_path = path
+            self.page_number = page
+            self.ink_snapper = None
+
+    def set_snap_to_ink(self, _, enabled):
+        self.snap_to_ink = enabled
+
+    def get_ink_snapper(self):
+        if self.ink_snapper is None and self.page_path:
+            self.ink_snapper = InkSnapper.from_image(self.page_path, page=self.page_number)
+        return self.ink_snapper
+
+    def snapped(self, rect):
+        snapper = self.get_ink_snapper()
+        if snapper is None:
+            return rect
+        return QRectF(*snapper.tighten_one(rect.x(), rect.y(), rect.width(), rect.height()))
+
+    def snap_resized_rect(self):
+        index = self.resizing_index
+        rect = self.snapped(self.selected_rect.rect())
+        self.box_store.set_qrect(index, rect)
+        self.selected_rect.setRect(rect)
+        self.spatial_index.update(self.selected_rect, rect)
+        self.sg_rect_updated.emit('rect', index, rect)
+
+    def tighten_all_boxes(self):
+        self.finish_population()
+        store = self.box_store
+        snapper = self.get_ink_snapper()
+        if snapper is None or not len(store) or len(self.list_rect) != len(store):
+            return
+        x, y, w, h = snapper.tighten(store.x, store.y, store.w, store.h)
+        changed = np.flatnonzero((x != store.x) | (y != store.y) | (w != store.w) | (h != store.h))
+        store.set_rects(changed, x[changed], y[changed], w[changed], h[changed])
+
+        for index, left, top, width, height in zip(changed.tolist(), x[changed].tolist(), y[changed].tolist(),
+                                                   w[changed].tolist(), h[changed].tolist()):
+            rect_item = self.list_rect[index]
+            rect = QRectF(left, top, width, height)
+            if self.batch_item:
+                rect_item.rect_f = rect  # one refresh of the batch below instead of one per box
+            else:
+                rect_item.setRect(rect)
+            self.spatial_index.update(rect_item, rect)
+        if self.batch_item:
+            if self.batch_item.overlay_owner:
+                self.batch_item.overlay.setRect(self.batch_item.overlay_owner.rect_f)
+            self.batch_item.refresh()
+        print(f'Tightened {changed.size} of {len(store)} boxes')
+        self.sg_rects_tightened.emit('rect', changed)
+
     def update_on_cell_value_changes(self, caller, index, rect):
-        if self.selected_rect:
-            rrc = self.selected_rect.rect()
-            rrc.setLeft(rect.left())
-            rrc.setTop(rect.top())
-            rrc.setWidth(rect.width())
-            rrc.setHeight(rect.height())
-            self.selected_rect.setRect(rect.normalized())
-            index = self.list_rect.index(self.selected_rect)
-            new_rect = self.selected_rect.rect()
-            # self.sg_rect_updated.emit('rect', index, new_rect)  causing recursion needs to fix somehow
-
-    def draw_new_rects_of_box_file(self, scene, list_of_tuples):
+        # the row typed into in the table, not necessarily the selected one
+        if self.reloading or index >= len(self.list_rect):
+            return
+        rect_item = self.item_for_row(index)
+        rect = rect.normalized()
+        rect_item.setRect(rect)
+        self.spatial_index.update(rect_item, rect)
+        # self.sg_rect_updated.emit('rect', index, new_rect)  causing recursion needs to fix somehow
+
+    def draw_new_rects_of_box_file(self, scene, box_store, visible_rect=None):
+        self.reloading = False
+        if self.reload_base is not None:
+            base, self.reload_base = self.reload_base, None
+            if box_store is self.box_store and bool(self.batch_item) == self.use_batched_rendering(box_store):
+                self.redraw_changed_rows(base)
+                return
         # Clear any existing rectangles in the scene
         self.clear_everything(scene)
-
-        for data in list_of_tuples:
-            # Extract data from tuple
-            char, x, y, width, height = data
-            x, y, width, height = int(x), int(y), int(width), int(height)
-
-            # Create QRectF from x, y, width, and height
+        self.box_store = box_store
+
+        if self.use_batched_rendering(box_store):
+            # the batch paints every box from the store columns right away, the slices only make hit test keys
+            spare = self.spare_batch_item
+            if spare is not None and spare.box_store is box_store and spare.scene() is scene:
+                self.batch_item, self.spare_batch_item = spare, None
+                self.batch_item.show()
+                self.batch_item.refresh()
+            else:
+                self.batch_item = BoxBatchItem(box_store, self.box_pen)
+                self.batch_item.add_to_scene(scene)
+        self.population_scene = scene
+        self.visible_rect = visible_rect
+        self.list_rect = [None] * len(box_store)
+        self.queue_rows(0, len(box_store) - 1)
+        if not self.is_populating():
+            # nothing left to make (empty or unreadable box file), the view stops waiting all the same
+            self.sg_population_progress.emit('rect', len(box_store), len(box_store))
+
+    def append_rects_of_box_file(self, scene, box_store, first, last):
+        # rows first..last were appended to the store while the box file is still being read
+        self.box_store = box_store
+        self.list_rect.extend([None] * (last - first + 1))
+        self.queue_rows(first, last)
+        if self.batch_item:
+            self.batch_item.refresh_rows(first, last)
+
+    # =========================================================================================================
+    # ================================== Reload  ==============================================================
+    # =========================================================================================================
+    def prepare_reload(self):
+        """Remembers the boxes on screen, the next draw of the same store only updates the rows that differ."""
+        self.reload_base = None
+        self.reloading = True
+        self.deselect_current_rect()
+        self.stop_population()  # the store is emptied until the reload is parsed, rows left are queued again
+        if self.list_rect and len(self.list_rect) == len(self.box_store):
+            store = self.box_store
+            self.reload_base = (store.x.copy(), store.y.copy(), store.w.copy(), store.h.copy())
+
+    def redraw_changed_rows(self, base):
+        # rows equal at the start and at the end keep their items as they are, the rows in between reuse
+        # the old items in order, spare ones go back to the pool and missing ones are made by the population
+        store, scene = self.box_store, self.population_scene
+        self.deselect_current_rect()
+        self.clear_lint_marks()
+        old = np.stack(base, axis=1)
+        new = np.stack((store.x, store.y, store.w, store.h), axis=1)
+        common = min(len(old), len(new))
+        differ = np.flatnonzero(np.any(old[:common] != new[:common], axis=1))
+        prefix = int(differ[0]) if differ.size else common
+        tail = common - prefix
+        differ = np.flatnonzero(np.any(old[len(old) - tail:][::-1] != new[len(new) - tail:][::-1], axis=1))
+        suffix = int(differ[0]) if differ.size else tail
+
+        middle = self.list_rect[prefix:len(old) - suffix]
+        count = len(new) - suffix - prefix
+        reused, spare = middle[:count], [item for item in middle[count:] if item is not None]
+        for item in spare:
+            self.spatial_index.remove(item)
+        if spare and not self.batch_item:
+            self.item_pool.release(scene, spare)
+        self.list_rect[prefix:len(old) - suffix] = reused + [None] * (count - len(reused))
+
+        moved = prefix + np.flatnonzero(np.any(old[prefix:prefix + len(reused)] != new[prefix:prefix + len(reused)],
+                                               axis=1))
+        for row in moved.tolist():
+            item = self.list_rect[row]
+            if item is None:
+                continue
+            rect = QRectF(*new[row].tolist())
+            if self.batch_item:
+                item.rect_f = rect  # the batch paints from the store, one refresh below
+            else:
+                item.setRect(rect)
+            self.spatial_index.update(item, rect)
+        if self.batch_item:
+            self.batch_item.refresh()
+
+        self.stop_population()
+        missing = np.flatnonzero(np.fromiter((item is None for item in self.list_rect), dtype=bool,
+                                             count=len(self.list_rect)))
+        self.pending_rows = missing.astype(np.int64)
+        if not self.progressive_population:
+            self.finish_population()
+        elif missing.size:
+            self.population_timer.start(0)
+        print(f'Reloaded {len(new)} boxes, {moved.size} moved, {len(spare)} removed, {missing.size} to add')
+
+    # =========================================================================================================
+    # ================================== Time sliced population  ==============================================
+    # =========================================================================================================
+    def queue_rows(self, first, last):
+        rows = np.arange(first, last + 1, dtype=np.int64)
+        if rows.size and self.visible_rect is not None:
+            # nearest to the middle of the view first, so the boxes on screen can be clicked right away
+            store, view = self.box_store, self.visible_rect
+            cx = store.x[first:last + 1] + store.w[first:last + 1] / 2.0 - view.center().x()
+            cy = store.y[first:last + 1] + store.h[first:last + 1] / 2.0 - view.center().y()
+            inside = (np.abs(cx) <= view.width() / 2) & (np.abs(cy) <= view.height() / 2)
+            rows = rows[np.lexsort((cx * cx + cy * cy, ~inside))]
+        self.pending_rows = np.concatenate((self.pending_rows[self.pending_position:], rows))
+        self.pending_position = 0
+        if not self.progressive_population:
+            self.finish_population()
+        elif self.pending_rows.size:
+            self.population_timer.start(0)
+
+    def populate_rows(self, rows):
+        store, scene = self.box_store, self.population_scene
+        rows = [row for row in rows.tolist() if self.list_rect[row] is None]
+        if not rows:
+            return
+        index = np.asarray(rows)
+        for row, x, y, width, height in zip(rows, store.x[index].tolist(), store.y[index].tolist(),
+                                            store.w[index].tolist(), store.h[index].tolist()):
             rect = QRectF(x, y, width, height)
+            if self.batch_item:
+                rect_item = BatchedRect(self.batch_item, rect)
+            else:
+                rect_item = self.item_pool.acquire(scene, rect, self.box_pen)
+            self.list_rect[row] = rect_item
+            self.item_rows[rect_item] = row
+            self.spatial_index.insert(rect_item, rect)
+
+    def populate_next_slice(self):
+        deadline = time.perf_counter() + self.population_slice_ms / 1000
+        while self.pending_position < self.pending_rows.size and time.perf_counter() < deadline:
+            end = self.pending_position + self.population_step
+            self.populate_rows(self.pending_rows[self.pending_position:end])
+            self.pending_position = min(end, self.pending_rows.size)
+        self.sg_population_progress.emit('rect', self.pending_position, self.pending_rows.size)
+        if self.pending_position < self.pending_rows.size:
+            self.population_timer.start(0)
+        else:
+            self.stop_population()
+
+    def finish_population(self):
+        if self.pending_position < self.pending_rows.size:
+            self.populate_rows(self.pending_rows[self.pending_position:])
+            self.sg_population_progress.emit('rect', self.pending_rows.size, self.pending_rows.size)
+        self.stop_population()
+
+    def stop_population(self):
+        self.population_timer.stop()
+        self.pending_rows = np.zeros(0, dtype=np.int64)
+        self.pending_position = 0
+
+    def is_populating(self):
+        return self.pending_position < self.pending_rows.size
+
+    def item_for_row(self, index):
+        if self.list_rect[index] is None:
+            self.populate_rows(np.array([index]))
+        return self.list_rect[index]
+
+    def row_of(self, item):
+        # clicks and keys find the row of an item here instead of searching list_rect, rows are filled in as
+        # items are made and only rebuilt after an insert, a delete or a reload diff moved them
+        row = self.item_rows.get(item)
+        if row is None or row >= len(self.list_rect) or self.list_rect[row] is not item:
+            self.item_rows = {rect_item: row for row, rect_item in enumerate(self.list_rect) if rect_item is not None}
+            row = self.item_rows.get(item)
+            if row is None:
+                raise ValueError('rect item is not in list_rect')
+        return row
+
+    # =========================================================================================================
+    # ================================== Lint marks  ==========================================================
+    # =========================================================================================================
+    def mark_rows(self, rows):
+        """Draws the boxes of the given store rows in red, replacing the marks of the previous lint."""
+        self.finish_population()
+        self.clear_lint_marks()
+        items = [self.list_rect[i] for i in rows if i < len(self.list_rect)]
+        self.lint_marked = set(items)
+        if self.batch_item:
+            self.batch_item.set_marked(items, self.marked_pen)
+            return
+        for item in items:
+            if item is not self.selected_rect:
+                item.setPen(self.marked_pen)
 
-            # Create a new rectangle item
-            rect_item = QGraphicsRectItem(rect)
-
-            # Customize rectangle appearance (pen color and width)
-            pen = QPen(QColor(255, 90, 10))  # Use orange color for new rectangles
-            pen.setWidth(2)
-            rect_item.setPen(pen)
-
-            # Add the rectangle to the scene
-            scene.addItem(rect_item)
-
-            # Optionally, store the rectangle for later reference (if needed)
-            self.list_rect.append(rect_item)
+    def clear_lint_marks(self):
+        if self.batch_item:
+            self.batch_item.set_marked(())
+        else:
+            for item in self.lint_marked:
+                if item is not self.selected_rect:
+                    item.setPen(self.box_pen)
+        self.lint_marked = set()
 
-            # You can also emit a signal to inform that a rectangle has been drawn if required
-            # self.sg_new_rect_placed.emit('rect')
+    def use_batched_rendering(self, box_store):
+        if self.render_mode == 'auto':
+            return len(box_store) >= self.batched_min_boxes
+        return self.render_mode == 'batched'
 
     def clear_everything(self, scene):
+        if self.is_populating():
+            self.sg_population_progress.emit('rect', 0, 0)
+        self.stop_population()
+        self.reload_base = None
+        self.reloading = False
+        if self.current_rect is not None:
+            self.item_pool.release(scene, [self.current_rect])
+        self.current_rect = None
+        self.selected_rect = None
+        if self.batch_item:
+            # kept in the scene, hidden, for the next batched page
+            if self.spare_batch_item is not None:
+                self.spare_batch_item.remove_from_scene(scene)
+            self.batch_item.forget(self.batch_item.overlay_owner)
+            self.batch_item.set_marked(())
+            self.batch_item.hide()
+            self.spare_batch_item, self.batch_item = self.batch_item, None
+            self.list_rect.clear()
         if self.list_rect:
-            for item in self.list_rect:
-                scene.removeItem(item)
-
+            self.item_pool.release(scene, [item for item in self.list_rect if item is not None])
             self.list_rect.clear()
+        self.spatial_index.clear()
+        self.item_rows = {}
+        self.lint_marked = set()
 
     def sidebar_selection_changes(self, _, index):
-        if index < len(self.list_rect):
+        if not self.reloading and index < len(self.list_rect):
             if self.selected_rect:
                 self.deselect_current_rect()
 
-            self.selected_rect = self.list_rect[index]
+            self.selected_rect = self.item_for_row(index)
             self.highlight_selected_rect(index)
 
     def key_pressed_emitter(self, key):
         if self.selected_rect:
             try:
-                index = self.list_rect.index(self.selected_rect)
+                index = self.row_of(self.selected_rect)
                 self.sg_key_pressed.emit('rect', index, key)
             except ValueError:
                 print('we can not find the index this')
 
     def toolbar_delete_button_clicked(self, scene):
         if self.selected_rect:
-            index = self.list_rect.index(self.selected_rect)
+            self.finish_population()
+            index = self.row_of(self.selected_rect)
+            self.sg_rect_about_to_be_deleted.emit('rect', index)
+            self.box_store.delete(index)
             self.sg_rect_deleted.emit('rect', index,)
             
-            csr = self.list_rect[index]
-            self.list_rect.remove(csr)
-            scene.removeItem(self.selected_rect)
+            csr = self.list_rect.pop(index)
+            self.spatial_index.remove(csr)
+            self.lint_marked.discard(csr)
+            if self.batch_item:
+                self.batch_item.forget(csr)
+            else:
+                self.item_pool.release(scene, [csr])
             self.selected_rect = None
             
     def toolbar_insert_button_clicked(self, scene):
         if self.selected_rect:
+            self.finish_population()
             margin = 5
-            index = self.list_rect.index(self.selected_rect)+1
+            index = self.row_of(self.selected_rect)+1
             rect = self.selected_rect.rect()
             place = rect.width() + rect.x() + margin 
             rect.moveLeft(place)
             
-            rect_item = QGraphicsRectItem(rect.normalized())
-            scene.addItem(rect_item)
-            
+            if self.batch_item:
+                rect_item = BatchedRect(self.batch_item, rect.normalized())
+            else:
+                rect_item = self.item_pool.acquire(scene, rect.normalized(), self.box_pen)
+
             self.list_rect.insert(index, rect_item)
+            self.sg_rect_about_to_be_placed.emit('rect', index)
+            self.box_store.insert_rect(index, rect_item.rect())
+            self.spatial_index.insert(rect_item, rect_item.rect())
+            if self.batch_item:
+                self.batch_item.refresh()
             self.deselect_current_rect()
             self.selected_rect = rect_item
             self.sg_new_rect_placed.emit('rect', index, rect)
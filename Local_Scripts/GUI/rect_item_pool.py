@@ -0,0 +1,41 @@
+from PyQt6.QtWidgets import QGraphicsRectItem
+
+
+class RectItemPool():
+    """QGraphicsRectItems of the pages left behind, handed out again for the boxes of the next page.
+
+    Released items stay in their scene, hidden, and acquire() only moves one to its new rect, sets the
+    shared pen and shows it. Paging through similar pages so does not create, index and delete one
+    item per box every time. Items released past max_items are removed from the scene for good.
+    """
+
+    def __init__(self, max_items=20000):
+        self.max_items = max_items
+        self.free = []
+
+    def acquire(self, scene, rect, pen):
+        if not self.free:
+            item = QGraphicsRectItem(rect)
+            item.setPen(pen)
+            scene.addItem(item)
+            return item
+        item = self.free.pop()
+        if item.scene() is not scene:
+            if item.scene():
+                item.scene().removeItem(item)
+            scene.addItem(item)
+        item.setRect(rect)
+        item.setPen(pen)  # QPen is implicitly shared, an item that already has it is left alone
+        item.show()
+        return item
+
+    def release(self, scene, items):
+        for item in items:
+            if len(self.free) < self.max_items:
+                item.hide()
+                self.free.append(item)
+            elif item.scene() is scene:
+                scene.removeItem(item)
+
+    def __len__(self):
+        return len(self.free)
@@ -1,8 +1,8 @@
-from PyQt6.QtWidgets import QWidget, QPushButton, QMessageBox, QListWidget, QTableWidget, QTableWidgetItem, QVBoxLayout, \
-    QHBoxLayout
-from PyQt6.QtCore import pyqtSignal, QRectF
-from PyQt6.QtGui import QColor
-from Local_Scripts.Files_Handling.box_file_handler import BoxFileHandler
+from PyQt6.QtWidgets import QWidget, QPushButton, QMessageBox, QListView, QTableView, QVBoxLayout, QHBoxLayout, \
+    QLineEdit, QAbstractItemView
+from PyQt6.QtCore import pyqtSignal, QRectF, QTimer, QSize, QPoint
+from Local_Scripts.GUI.box_table_model import BoxTableModel
+from Local_Scripts.GUI.image_list_model import ImageListModel
 
 
 class Sidebar(QWidget):  # Inherit from QWidget or QObject
@@ -10,10 +10,10 @@ class Sidebar(QWidget):  # Inherit from QWidget or QObject
     sg_selection_changes = pyqtSignal(str, int)
     sg_image_selection_changes = pyqtSignal(str, str, int)
 
-    def __init__(self, image_loader):
+    def __init__(self, image_loader, box_store):
         super().__init__()  # Call the QWidget constructor
         self.image_loader = image_loader
-        self.box_file_handler = BoxFileHandler()
+        self.box_store = box_store
         self.list_image = None
         self.setObjectName('sidebar')
         self.layouts = QVBoxLayout()
@@ -22,9 +22,30 @@ class Sidebar(QWidget):  # Inherit from QWidget or QObject
         self.btn_box = QPushButton('Box Cords')
         self.btn_list = QPushButton('Image List')
 
-        # Define widgets (both QListWidget and QTableWidget)
-        self.image_list_widget = QListWidget()
-        self.box_table = QTableWidget()
+        # Define widgets (QListView over the directory's image names, QTableView over the box store for cords)
+        self.image_list_model = ImageListModel(self.image_loader)
+        self.image_list_widget = QListView()
+        self.image_list_widget.setModel(self.image_list_model)
+        # uniform sizes and batched layout keep a jump to row 150k of a 200k list from laying out every row
+        self.image_list_widget.setUniformItemSizes(True)
+        self.image_list_widget.setLayoutMode(QListView.LayoutMode.Batched)
+        self.image_list_widget.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.image_filter = QLineEdit()
+        self.image_filter.setPlaceholderText('Filter images')
+        self.image_filter.setClearButtonEnabled(True)
+        # the filter runs once typing pauses, not on every key
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(150)
+        self.btn_thumbnails = QPushButton('Thumbnails')
+        self.btn_thumbnails.setCheckable(True)
+        # thumbnails still queued for rows scrolled out of view are dropped once scrolling pauses
+        self.visible_rows_timer = QTimer(self)
+        self.visible_rows_timer.setSingleShot(True)
+        self.visible_rows_timer.setInterval(100)
+        self.box_table_model = BoxTableModel(self.box_store)
+        self.box_table = QTableView()
+        self.box_table.setModel(self.box_table_model)
 
         # layouts
         self.tabs_row = QHBoxLayout()
@@ -33,6 +54,10 @@ class Sidebar(QWidget):  # Inherit from QWidget or QObject
         self.layouts.addLayout(self.tabs_row)
 
         # Add both widgets to the layout (only one will be visible at a time)
+        self.filter_row = QHBoxLayout()
+        self.filter_row.addWidget(self.image_filter)
+        self.filter_row.addWidget(self.btn_thumbnails)
+        self.layouts.addLayout(self.filter_row)
         self.layouts.addWidget(self.image_list_widget)
         self.layouts.addWidget(self.box_table)
         self.setLayout(self.layouts)
@@ -46,73 +71,89 @@ class Sidebar(QWidget):  # Inherit from QWidget or QObject
         # Connect buttons to respective methods
         self.btn_list.clicked.connect(self.show_image_list)
         self.btn_box.clicked.connect(self.show_box_cords)
-        self.box_table.cellClicked.connect(self.on_table_cell_clicked)
+        self.box_table.clicked.connect(self.on_table_cell_clicked)
 
-        self.box_table.cellChanged.connect(self.on_cell_value_changed)  # if value changes in  table
+        self.box_table_model.sg_cell_edited.connect(self.on_cell_value_changed)  # if value changes in  table
 
-        self.image_list_widget.itemDoubleClicked.connect(self.item_in_list_doubleclicked)
+        self.image_list_widget.doubleClicked.connect(self.item_in_list_doubleclicked)
+        self.image_filter.textChanged.connect(self.filter_timer.start)
+        self.filter_timer.timeout.connect(self.apply_image_filter)
+        self.btn_thumbnails.toggled.connect(self.show_thumbnails)
+        self.image_loader.thumbnail_cache.sg_thumbnail_ready.connect(self.image_list_model.on_thumbnail_ready)
+        self.image_list_widget.verticalScrollBar().valueChanged.connect(self.visible_rows_timer.start)
+        self.visible_rows_timer.timeout.connect(self.drop_hidden_thumbnails)
         self.setEnabled(False)
 
-    def item_in_list_doubleclicked(self, event):
-        name = event.text()
-        if name in self.list_image:
-            index = self.list_image.index(name)
+    def item_in_list_doubleclicked(self, model_index):
+        name = self.image_list_model.name_at(model_index.row())
+        index = self.image_loader.index_of(name)
+        if index >= 0:
             self.sg_image_selection_changes.emit('sidebar', name, index)
+
+    def show_thumbnails(self, enabled):
+        # still a list, icon mode would ask every row for its icon to lay the grid out
+        size = self.image_loader.thumbnail_cache.size
+        self.image_list_widget.setIconSize(QSize(size, size) if enabled else QSize())
+        self.image_list_model.set_thumbnails(enabled)
+        if not enabled:
+            self.image_loader.thumbnail_cache.keep_only(())
+        self.select_the_opened_one_in_list()
+
+    def drop_hidden_thumbnails(self):
+        if not self.image_list_model.thumbnails:
+            return
+        view, model = self.image_list_widget, self.image_list_model
+        viewport = view.viewport().rect()
+        first = view.indexAt(QPoint(2, 2)).row()
+        last = view.indexAt(viewport.bottomRight() - QPoint(2, 2)).row()
+        first = max(first, 0)
+        last = model.rowCount() - 1 if last < 0 else last
+        self.image_loader.thumbnail_cache.keep_only(
+            self.image_loader.path_of(model.name_at(row)) for row in range(first, last + 1))
+
+    def apply_image_filter(self):
+        self.image_list_model.set_filter(self.image_filter.text())
+        self.select_the_opened_one_in_list()
     
     
     def on_cell_value_changed(self, row, col):
-
+        # the model already wrote the typed value into the store, only the scene has to follow
         if col in [1, 2, 3, 4]:
-            try:
-                # checking if last element is exists than other must exist.
-                height_element = self.box_table.item(row, 4)
-                if height_element:
-                    x = int(self.box_table.item(row, 1).text())
-                    y = int(self.box_table.item(row, 2).text())
-                    width = int(self.box_table.item(row, 3).text())
-                    height = int(self.box_table.item(row, 4).text())
-
-                    updated_rect = QRectF(x, y, width, height)
-                    self.sg_coordinates_change.emit('sidebar', row, updated_rect)
-
-            except ValueError:
-                print('Error: None integer value entered')
-            except Exception:
-                print('somthing went wrong in on_cell_value_changed()')
-
-    def on_table_cell_clicked(self, row, _):
-        self.sg_selection_changes.emit('sidebar', row)
+            _, x, y, width, height = self.box_store[row]
+            updated_rect = QRectF(x, y, width, height)
+            self.sg_coordinates_change.emit('sidebar', row, updated_rect)
+
+    def on_table_cell_clicked(self, index):
+        self.sg_selection_changes.emit('sidebar', index.row())
+
+    def on_rect_about_to_be_placed(self, caller, index):
+        self.box_table_model.begin_insert_rows(index)
 
     def on_rect_placed(self, caller, index, rect):
+        self.box_table_model.end_insert_rows()
         if index == 0:
-            self.box_table.setColumnCount(5)
-            self.box_table.setHorizontalHeaderLabels(['Char', 'X', 'Y', 'Width', 'Height'])
-            self.box_table.clearContents()
             self.resize_table_column_widht()
-            
-        self.box_table.insertRow(index)
-        self.box_table.setItem(index, 0, QTableWidgetItem(''))  # first item is a key
-        self.update_row(index, rect)
 
     def on_rect_updated(self, caller, index, rect):
-        if caller == 'rect':
-            self.box_table.blockSignals(True)
         self.update_row(index, rect)
-        self.box_table.blockSignals(False)
+
+    def on_rects_tightened(self, caller, rows):
+        if len(rows):
+            self.box_table_model.rows_changed(int(rows[0]), int(rows[-1]), 1, 4)
+
     def update_row(self, index, rect):
-        self.box_table.setItem(index, 1, QTableWidgetItem(str(int(rect.x()))))
-        self.box_table.setItem(index, 2, QTableWidgetItem(str(int(rect.y()))))
-        self.box_table.setItem(index, 3, QTableWidgetItem(str(int(rect.width()))))
-        self.box_table.setItem(index, 4, QTableWidgetItem(str(int(rect.height()))))
+        # RectDrawer has already put the rect into the store
+        self.box_table_model.row_changed(index, 1, 4)
 
     def show_image_list(self):
         self.box_table.hide()
+        self.image_filter.show()
+        self.btn_thumbnails.show()
         self.image_list_widget.show()
-        if self.list_image:
-            self.image_list_widget.clear()
-            for image_name in self.list_image:
-                self.image_list_widget.addItem(image_name)
-        
+        # the model is only rebuilt when the image loader has a new list, switching tabs costs nothing
+        if self.list_image is not None and self.list_image is not self.image_list_model.names:
+            self.image_list_model.set_names(self.list_image)
+
         self.select_the_opened_one_in_list()
 
     def show_box_cords(self, action):
@@ -120,48 +161,33 @@ class Sidebar(QWidget):  # Inherit from QWidget or QObject
         self.setEnabled(True)
         self.show_image_list()
         
+        self.image_filter.hide()
+        self.btn_thumbnails.hide()
         self.image_list_widget.hide()
         self.box_table.show()
 
     def select_the_opened_one_in_list(self):
-        name = self.image_loader.get_current_opened_image_base_name()
-        self.list_image = self.image_loader.get_image_list()
-        
-        if name in self.list_image:
-            index = self.list_image.index(name)
-            item = self.image_list_widget.item(index)
-            if item is not None:
-                item.setSelected(True)
-            print(f'We have a item {item}')
-
-    def update_box_cords(self, list_tuples, key='a'):
-        if self.box_table:
-            self.clear_box_table()
-
-        try:
-            if list_tuples:
-                self.box_table.blockSignals(True)
-                self.box_table.setColumnCount(5)
-                self.box_table.setHorizontalHeaderLabels(['Char', 'X', 'Y', 'Width', 'Height'])
-                self.box_table.clearContents()
-                self.box_table.setRowCount(len(list_tuples))
-
-                for i, row_data in enumerate(list_tuples):
-                    for j, data in enumerate(row_data):
-                        item = QTableWidgetItem(str(data))
-                        self.box_table.setItem(i, j, item)
-
-                self.resize_table_column_widht()
-
-                self.box_table.blockSignals(False)
-        except ValueError:
-            print('Value Error:')
-        except TypeError:
-            print("Type Error")
-        except MemoryError:
-            print('Memory Error: ')
-        except Exception:
-            print('Haha you loose other type of error')
+        self.select_image_in_list(self.image_loader.get_current_opened_image_base_name())
+
+    def select_image_in_list(self, name):
+        row = self.image_list_model.row_of(name)
+        if row >= 0:
+            model_index = self.image_list_model.index(row)
+            self.image_list_widget.setCurrentIndex(model_index)
+            self.image_list_widget.scrollTo(model_index)
+
+    def update_box_cords(self, box_store, key='a'):
+        # the view only asks the model for the rows it shows, nothing is copied here
+        self.box_store = box_store
+        self.box_table_model.set_box_store(box_store)
+        if len(box_store):
+            self.resize_table_column_widht()
+
+    def on_box_rows_about_to_be_appended(self, box_store, first, last):
+        self.box_table_model.begin_insert_rows(first, last)
+
+    def on_box_rows_appended(self, box_store, first, last):
+        self.box_table_model.end_insert_rows()
 
     def resize_table_column_widht(self):
         table_width = self.width()
@@ -170,67 +196,34 @@ class Sidebar(QWidget):  # Inherit from QWidget or QObject
             self.box_table.setColumnWidth(i, column_width)
     
     def clear_box_table(self):
-        self.box_table.clearContents()
-        self.box_table.setRowCount(0)
+        self.box_table_model.reset()
 
     def clear_everything(self):
-        self.image_list_widget.clear()
+        self.image_filter.clear()
+        self.image_list_model.set_names([])
 
     def on_key_press(self, caller, index, key):
-        limit = self.box_table.rowCount()
+        limit = self.box_table_model.rowCount()
         if index < limit:
-            item = self.box_table.item(index, 0)
-            if item is not None:
-                item.setText(key)
-            else:
-                print('Error:')
-                print(f'we got index: {index} and Key: {key} and item: {item}')
-
-    def handling_the_save_button(self, file_name):
-        rows = self.box_table.rowCount()
-        for row in range(rows):
-            for col in range(5):
-                val = self.box_table.item(row, col).text()
-                if val == '' or val == 0:
-                    QMessageBox.information(None, 'Information',
-                                            'Some values in table are not correct or empty. \n We can not save this to file')
-                    return
-        width, height = self.image_loader.get_image_size()
-        self.save_table_to_box_file(file_name, height)
-
-    def save_table_to_box_file(self, filename, image_height):
-        try:
-            # Open a file with the .box extension
-            with open(filename, 'w') as file:
-                rows = self.box_table.rowCount()
-
-                # Iterate over all rows
-                for row in range(rows):
-                    # Extract the 'key', 'x', 'y', 'width', 'height' values from the table
-                    key = self.box_table.item(row, 0).text()
-                    x = int(self.box_table.item(row, 1).text())  # x-coordinate
-                    y = int(self.box_table.item(row, 2).text())  # original y-coordinate
-                    width = int(self.box_table.item(row, 3).text())  # original width
-                    height = int(self.box_table.item(row, 4).text())  # original height
-
-                    # Apply the transformation formulas
-                    y_new = image_height - height - y  # Adjust y
-                    height_new = image_height - y  # Adjust height
-                    width_new = width + x  # Adjust width
-
-                    # Format the data as: key x y_new width_new height_new 0
-                    box_line = f"{key} {x} {y_new} {width_new} {height_new} 0"
-
-                    # Write the formatted data to the file
-                    file.write(box_line + '\n')
-
-            print(f"Y: {y_new}, Height: {height_new}, Width: {width_new}")
-
-        except Exception as e:
-            print(f"Error saving file: {e}")
+            self.box_store.set_char(index, key)
+            self.box_table_model.row_changed(index, 0, 0)
+        else:
+            print('Error:')
+            print(f'we got index: {index} and Key: {key} and limit: {limit}')
+
+    def handling_the_save_button(self):
+        # coordinates in the store are always integers, only the chars can still be empty
+        if self.box_store.has_empty_chars():
+            QMessageBox.information(None, 'Information',
+                                    'Some values in table are not correct or empty. \n We can not save this to file')
+            return False
+        return True
+
+    def on_rect_about_to_be_deleted(self, _, index):
+        self.box_table_model.begin_remove_rows(index)
 
     def handling_rect_deletion(self, _, index):
-        self.box_table.removeRow(index)
+        self.box_table_model.end_remove_rows()
 
     def on_rect_selection_changes(self, _, index):
         self.box_table.selectRow(index)
@@ -239,5 +232,4 @@ class Sidebar(QWidget):  # Inherit from QWidget or QObject
         self.box_table.selectRow(0)
         
     def toolbar_navigation_buttons_handling(self, caller, name, index):
-        item = self.image_list_widget.item(index)
-        item.setSelected(True)
\ No newline at end of file
+        self.select_image_in_list(name)
\ No newline at end of file
@@ -0,0 +1,100 @@
+class SpatialGrid():
+    """Uniform grid over box geometry for point hit tests and resize edge lookups.
+
+    Items are any hashable keys (the rect items of RectDrawer), each stored with its
+    (left, top, right, bottom) bounds in every grid cell it overlaps.
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}    # (col, row) -> set of keys
+        self.bounds = {}   # key -> (left, top, right, bottom)
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def cell_range(self, left, top, right, bottom):
+        size = self.cell_size
+        return int(left // size), int(top // size), int(right // size), int(bottom // size)
+
+    def insert(self, key, rect):
+        if key in self.bounds:
+            self.remove(key)
+        left, top, right, bottom = self.normalize(rect)
+        self.bounds[key] = (left, top, right, bottom)
+        c0, r0, c1, r1 = self.cell_range(left, top, right, bottom)
+        for col in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                self.cells.setdefault((col, row), set()).add(key)
+
+    def remove(self, key):
+        bounds = self.bounds.pop(key, None)
+        if bounds is None:
+            return
+        c0, r0, c1, r1 = self.cell_range(*bounds)
+        for col in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                cell = self.cells.get((col, row))
+                if cell is not None:
+                    cell.discard(key)
+                    if not cell:
+                        del self.cells[(col, row)]
+
+    def update(self, key, rect):
+        self.insert(key, rect)
+
+    def clear(self):
+        self.cells.clear()
+        self.bounds.clear()
+
+    def candidates(self, left, top, right, bottom):
+        c0, r0, c1, r1 = self.cell_range(left, top, right, bottom)
+        if c0 == c1 and r0 == r1:
+            return self.cells.get((c0, r0), ())
+        found = set()
+        for col in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                found.update(self.cells.get((col, row), ()))
+        return found
+
+    def item_at(self, x, y):
+        # smallest box under the point wins, so a glyph inside a bigger box stays clickable
+        best = None
+        best_area = None
+        for key in self.candidates(x, y, x, y):
+            left, top, right, bottom = self.bounds[key]
+            if left <= x <= right and top <= y <= bottom:
+                area = (right - left) * (bottom - top)
+                if best is None or area < best_area:
+                    best, best_area = key, area
+        return best
+
+    def edge_near(self, x, y, threshold):
+        """Returns (key, side) of the closest box edge within threshold of the point, or (None, None)."""
+        best = (None, None)
+        best_distance = threshold
+        for key in self.candidates(x - threshold, y - threshold, x + threshold, y + threshold):
+            side, distance = self.side_near(self.bounds[key], x, y, threshold)
+            if side and distance < best_distance:
+                best, best_distance = (key, side), distance
+        return best
+
+    @staticmethod
+    def side_near(bounds, x, y, threshold):
+        left, top, right, bottom = bounds
+        inside_y = top <= y <= bottom
+        inside_x = left <= x <= right
+        # same order as RectDrawer.is_near_side
+        for side, distance, along in (('left', abs(x - left), inside_y), ('right', abs(x - right), inside_y),
+                                      ('top', abs(y - top), inside_x), ('bottom', abs(y - bottom), inside_x)):
+            if distance < threshold and along:
+                return side, distance
+        return None, None
+
+    @staticmethod
+    def normalize(rect):
+        if isinstance(rect, tuple):
+            left, top, right, bottom = rect
+        else:
+            left, top, right, bottom = rect.left(), rect.top(), rect.right(), rect.bottom()
+        return min(left, right), min(top, bottom), max(left, right), max(top, bottom)
@@ -0,0 +1,117 @@
+from PyQt6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+from PyQt6.QtGui import QPixmap
+from PyQt6.QtCore import QRectF
+from collections import OrderedDict
+import math
+
+
+class TiledImageItem(QGraphicsItem):
+    """Draws an ImagePyramid, only the tiles under the exposed rect at the current zoom are decoded.
+
+    Tiles are kept in an LRU bounded by max_bytes, the coarsest level stays loaded so there is
+    always something to show while finer tiles come in from the worker pool.
+    """
+
+    def __init__(self, pyramid, max_bytes=192 * 1024 * 1024):
+        super().__init__()
+        self.pyramid = pyramid
+        self.max_bytes = max_bytes
+        self.tiles = OrderedDict()   # (level, col, row) -> QPixmap
+        self.current_bytes = 0
+        self.pending = {}            # (level, col, row) -> TileLoadWorker
+        self.coarsest = None
+        self.bounds = QRectF(0, 0, pyramid.width(), pyramid.height())
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+
+        pyramid.signals.sg_tile_loaded.connect(self.on_tile_loaded)
+        pyramid.signals.sg_pyramid_ready.connect(self.on_pyramid_ready)
+        if pyramid.is_built():
+            self.on_pyramid_ready(pyramid.path)
+        else:
+            pyramid.build_async()
+
+    def on_pyramid_ready(self, _):
+        if not self.pyramid.is_built():
+            return
+        self.pyramid.mark_used()
+        top = self.pyramid.level_count - 1
+        self.coarsest = QPixmap(self.pyramid.tile_path(top, 0, 0))
+        self.update()
+
+    def boundingRect(self):
+        return self.bounds
+
+    def level_for(self, lod):
+        # level whose pixels are at least as dense as the screen pixels
+        if lod <= 0:
+            return self.pyramid.level_count - 1
+        level = int(math.floor(math.log2(1 / lod))) if lod < 1 else 0
+        return max(0, min(level, self.pyramid.level_count - 1))
+
+    def paint(self, painter, option, widget=None):
+        if self.coarsest is None or self.coarsest.isNull():
+            return
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.level_for(lod)
+        exposed = option.exposedRect.intersected(self.bounds)
+
+        # coarse backdrop first, finer tiles are painted on top as soon as they are loaded
+        painter.drawPixmap(self.bounds, self.coarsest, QRectF(self.coarsest.rect()))
+        for key, target in self.tiles_in(level, exposed):
+            pixmap = self.tiles.get(key)
+            if pixmap is not None:
+                self.tiles.move_to_end(key)
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+
+        # partial repaints only expose one tile, what to load is decided by the whole visible area
+        inverted, ok = painter.worldTransform().inverted()
+        visible = inverted.mapRect(QRectF(painter.viewport())).intersected(self.bounds) if ok else exposed
+        wanted = set(key for key, _ in self.tiles_in(level, visible) if key not in self.tiles)
+        self.request_tiles(wanted)
+
+    def tiles_in(self, level, rect):
+        scale = 2 ** level
+        span = self.pyramid.tile_size * scale
+        cols, rows = self.pyramid.tile_grid(level)
+        first_col, last_col = int(rect.left() // span), min(cols - 1, int(rect.right() // span))
+        first_row, last_row = int(rect.top() // span), min(rows - 1, int(rect.bottom() // span))
+        for col in range(max(0, first_col), last_col + 1):
+            for row in range(max(0, first_row), last_row + 1):
+                target = QRectF(col * span, row * span, span, span).intersected(self.bounds)
+                yield (level, col, row), target
+
+    def request_tiles(self, wanted):
+        # tiles that scrolled away or belong to another zoom level are not worth decoding anymore
+        for key in list(self.pending):
+            if key not in wanted:
+                self.pending.pop(key).cancelled = True
+        for key in wanted:
+            if key not in self.pending:
+                self.pending[key] = self.pyramid.load_tile_async(*key)
+
+    def on_tile_loaded(self, level, col, row, image):
+        key = (level, col, row)
+        worker = self.pending.pop(key, None)
+        if worker is None or worker.cancelled or image.isNull():
+            return
+        pixmap = QPixmap.fromImage(image)
+        self.tiles[key] = pixmap
+        self.current_bytes += self.pixmap_bytes(pixmap)
+        while self.current_bytes > self.max_bytes and len(self.tiles) > 1:
+            _, evicted = self.tiles.popitem(last=False)
+            self.current_bytes -= self.pixmap_bytes(evicted)
+        span = self.pyramid.tile_size * 2 ** level
+        self.update(QRectF(col * span, row * span, span, span))
+
+    @staticmethod
+    def pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
+
+    def release(self):
+        self.pyramid.signals.sg_tile_loaded.disconnect(self.on_tile_loaded)
+        self.pyramid.signals.sg_pyramid_ready.disconnect(self.on_pyramid_ready)
+        for worker in self.pending.values():
+            worker.cancelled = True
+        self.pending.clear()
+        self.tiles.clear()
+        self.current_bytes = 0
@@ -1,4 +1,4 @@
-from PyQt6.QtWidgets import QWidget, QPushButton, QSizePolicy, QSpacerItem, QHBoxLayout, QSplitter
+from PyQt6.QtWidgets import QWidget, QPushButton, QSizePolicy, QSpacerItem, QHBoxLayout, QSplitter, QSpinBox
 from PyQt6.QtCore import pyqtSignal, QRectF, QObject, Qt
 
 
@@ -7,8 +7,13 @@ class Toolbar(QObject):
     sg_reload_button_clicked = pyqtSignal(str)
     sg_insert_button_clicked = pyqtSignal(str)
     sg_delete_button_clicked = pyqtSignal(str)
+    sg_propose_button_clicked = pyqtSignal(str)
+    sg_snap_toggled = pyqtSignal(str, bool)
+    sg_tighten_button_clicked = pyqtSignal(str)
+    sg_lint_button_clicked = pyqtSignal(str)
     sg_previous_button_clicked = pyqtSignal(str, str, int)
     sg_next_button_clicked = pyqtSignal(str, str, int)
+    sg_page_changed = pyqtSignal(str, int)
 
     def __init__(self, image_loader):
         super().__init__()
@@ -26,8 +31,22 @@ class Toolbar(QObject):
         self.btn_reload = QPushButton('Reload')
         self.btn_prvious = QPushButton('<')
         self.btn_next = QPushButton('>')
+        # pages of a multi-page tiff, hidden for single page images
+        self.page_spin = QSpinBox()
+        self.page_spin.setPrefix('Page ')
+        self.page_spin.setMinimum(1)
+        self.page_spin.hide()
         self.btn_delete = QPushButton('Delete')
         self.btn_insert = QPushButton('Insert')
+        self.btn_propose = QPushButton('Propose')
+        self.btn_propose.setToolTip('Find the glyphs of this page and add boxes for the ones not boxed yet')
+        self.btn_snap = QPushButton('Snap')
+        self.btn_snap.setCheckable(True)
+        self.btn_snap.setToolTip('Shrink drawn and resized boxes to the ink inside them')
+        self.btn_tighten = QPushButton('Tighten All')
+        self.btn_tighten.setToolTip('Shrink every box of this page to the ink inside it')
+        self.btn_lint = QPushButton('Lint')
+        self.btn_lint.setToolTip('Mark overlapping, duplicate, empty, out of page and unlabelled boxes in red')
 
         self.set_layouts()
 
@@ -35,9 +54,14 @@ class Toolbar(QObject):
         self.btn_reload.clicked.connect(self.reload_button_clicked)
         self.btn_insert.clicked.connect(self.insert_button_clicked)
         self.btn_delete.clicked.connect(self.delete_button_clicked)
+        self.btn_propose.clicked.connect(self.propose_button_clicked)
+        self.btn_snap.toggled.connect(self.snap_button_toggled)
+        self.btn_tighten.clicked.connect(self.tighten_button_clicked)
+        self.btn_lint.clicked.connect(self.lint_button_clicked)
         
         self.btn_prvious.clicked.connect(self.previous_button_clicked)
         self.btn_next.clicked.connect(self.next_button_clicked)
+        self.page_spin.valueChanged.connect(self.page_spin_changed)
         
         self.toolbar.setEnabled(False)
         
@@ -68,12 +92,17 @@ class Toolbar(QObject):
 
         self.layouts.addWidget(self.btn_insert)
         self.layouts.addWidget(self.btn_delete)
+        self.layouts.addWidget(self.btn_propose)
+        self.layouts.addWidget(self.btn_snap)
+        self.layouts.addWidget(self.btn_tighten)
+        self.layouts.addWidget(self.btn_lint)
 
         spacer2 = QSpacerItem(30, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
         self.layouts.addItem(spacer2)
         
         self.layouts.addWidget(self.btn_prvious)
         self.layouts.addWidget(self.btn_next)
+        self.layouts.addWidget(self.page_spin)
         
         spacer3 = QSpacerItem(30, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
         self.layouts.addItem(spacer3)
@@ -99,6 +128,18 @@ class Toolbar(QObject):
     
     def insert_button_clicked(self):
         self.sg_insert_button_clicked.emit('toolbar')
+
+    def propose_button_clicked(self):
+        self.sg_propose_button_clicked.emit('toolbar')
+
+    def snap_button_toggled(self, checked):
+        self.sg_snap_toggled.emit('toolbar', checked)
+
+    def tighten_button_clicked(self):
+        self.sg_tighten_button_clicked.emit('toolbar')
+
+    def lint_button_clicked(self):
+        self.sg_lint_button_clicked.emit('toolbar')
         
     def previous_button_clicked(self):
         if self.current_index - 1 > 0:
@@ -124,6 +165,17 @@ class Toolbar(QObject):
         self.sg_next_button_clicked.emit('toolbar', file_name, self.current_index)
         self.enable_disable_nav_buttons('', '', self.current_index)
         
+    def page_spin_changed(self, value):
+        self.sg_page_changed.emit('toolbar', value - 1)
+
+    def set_page_count(self, page_count, current_page):
+        # no signal here, this only mirrors the page MainWindow has just loaded
+        self.page_spin.blockSignals(True)
+        self.page_spin.setMaximum(max(1, page_count))
+        self.page_spin.setValue(current_page + 1)
+        self.page_spin.blockSignals(False)
+        self.page_spin.setVisible(page_count > 1)
+
     def enable_disable_nav_buttons(self, _, name, index):
         self.current_index = index
         if self.current_index == 0:                             # staring Position
@@ -0,0 +1,49 @@
+from PyQt6.QtCore import pyqtSignal, QObject, QRectF, QTimer
+
+
+class RectUpdateCoalescer(QObject):
+    """Sits between RectDrawer.sg_rect_updated and the sidebar during drawing and resizing.
+
+    Updates are merged per row and delivered at most max_rate times a second, flush() delivers
+    whatever is still pending right away (RectDrawer asks for it on finish_rect).
+    """
+    sg_rect_updated = pyqtSignal(str, int, QRectF)
+
+    def __init__(self, max_rate=60):
+        super().__init__()
+        self.pending = {}  # row -> (caller, rect), latest update wins
+        self.received = 0
+        self.delivered = 0
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+        self.set_max_rate(max_rate)
+
+    def set_max_rate(self, max_rate):
+        self.max_rate = max_rate
+        self.timer.setInterval(max(1, int(1000 / max_rate)))
+
+    def on_rect_updated(self, caller, index, rect):
+        self.received += 1
+        self.pending[index] = (caller, QRectF(rect))
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self, _=None):
+        self.timer.stop()
+        pending = self.pending
+        self.pending = {}
+        for index, (caller, rect) in pending.items():
+            self.delivered += 1
+            self.sg_rect_updated.emit(caller, index, rect)
+
+    def coalesced(self):
+        return self.received - self.delivered - len(self.pending)
+
+    def stats(self):
+        return {'received': self.received, 'delivered': self.delivered,
+                'coalesced': self.coalesced(), 'pending': len(self.pending)}
+
+    def reset_stats(self):
+        self.received = 0
+        self.delivered = 0
@@ -1,8 +1,7 @@
-import os.path
-
-from PyQt6.QtWidgets import QWidget, QGraphicsScene, QGraphicsView, QMainWindow, QHBoxLayout, QVBoxLayout, QMessageBox
-from PyQt6.QtCore import Qt, pyqtSignal, QEvent
-from PyQt6.QtGui import QAction, QColor
+from PyQt6.QtWidgets import QWidget, QGraphicsScene, QGraphicsView, QMainWindow, QHBoxLayout, QVBoxLayout, QMessageBox, \
+    QFileDialog, QProgressBar
+from PyQt6.QtCore import Qt, pyqtSignal, QEvent, QThreadPool, QRectF
+from PyQt6.QtGui import QAction, QColor, QPixmap, QTransform
 import sys
 
 # importing own classes
@@ -10,10 +9,20 @@ from Local_Scripts.GUI.toolbar import Toolbar
 from Local_Scripts.GUI.sidebar import Sidebar
 from Local_Scripts.Files_Handling.images_handler import ImageHandler
 from Local_Scripts.Files_Handling.box_file_handler import BoxFileHandler
+from Local_Scripts.Files_Handling.image_pyramid import ImagePyramid
+from Local_Scripts.Files_Handling.page_loader import PendingPage
+from Local_Scripts.Files_Handling.box_proposer import BoxProposalWorker
+from Local_Scripts.Files_Handling.box_lint import lint_store, offending_rows, summarise
+from Local_Scripts.Files_Handling.box_store import PLACEHOLDER_CHAR
 from Local_Scripts.GUI.rect_drawer import RectDrawer
+from Local_Scripts.GUI.update_coalescer import RectUpdateCoalescer
+from Local_Scripts.GUI.tiled_image_item import TiledImageItem
+from Local_Scripts.tracer import TRACER
 
 
 class CustomGraphicsView(QGraphicsView):
+    sg_zoomed_in = pyqtSignal(str)
+
     def __init__(self, scene, rect_drawer, sidebar, toolbar):
         super().__init__(scene)
         self.rect_drawer = rect_drawer
@@ -34,7 +43,7 @@ class CustomGraphicsView(QGraphicsView):
         key_text = event.text()
         key = event.key()
         not_allowed_list = [16777249, 16777248, 16777251]
-        if key not in not_allowed_list:
+        if key not in not_allowed_list and self.is_drawing_allowed:
             self.rect_drawer.key_pressed_emitter(key_text)
         super().keyPressEvent(event)
 
@@ -60,6 +69,7 @@ class CustomGraphicsView(QGraphicsView):
                 if new_zoom <= self.max_zoom_in:
                     self.scale(self.zoom_factor, self.zoom_factor)
                     self.current_zoom = new_zoom
+                    self.sg_zoomed_in.emit('view')
             else:  # wheel down zoom out
                 new_zoom = self.current_zoom / self.zoom_factor
                 if new_zoom >= self.max_zoom_out:
@@ -85,8 +95,9 @@ class MainWindow(QMainWindow):
         self.image_loader = ImageHandler()
         self.box_Loader = BoxFileHandler()
         self.toolbar = Toolbar(self.image_loader)
-        self.sidebar = Sidebar(self.image_loader)
-        self.rect_drawer = RectDrawer()
+        self.sidebar = Sidebar(self.image_loader, self.box_Loader.box_store)
+        self.rect_drawer = RectDrawer(self.box_Loader.box_store)
+        self.rect_update_coalescer = RectUpdateCoalescer(max_rate=60)
 
         # variables
         self.v_width = 1100
@@ -94,6 +105,10 @@ class MainWindow(QMainWindow):
         self.drawing = False
         self.sidebar_width = 0.26
         self.pixmap = None
+        self.tiled_item = None
+        self.image_item = None
+        self.proposal_pool = QThreadPool(self)
+        self.proposal_pool.setMaxThreadCount(1)
 
         self.scene = QGraphicsScene(self)
         self.view = CustomGraphicsView(self.scene, self.rect_drawer, self.sidebar, self.toolbar)
@@ -122,6 +137,11 @@ class MainWindow(QMainWindow):
         self.open_directory_action.triggered.connect(self.open_directory)
         self.exit_action.triggered.connect(self.close_application)
 
+        if TRACER.enabled:
+            self.save_trace_action = QAction('Save Performance Trace', self)
+            self.help_menu.addAction(self.save_trace_action)
+            self.save_trace_action.triggered.connect(self.save_performance_trace)
+
 
         # layouts
         self.main_layout = QWidget(self)
@@ -136,6 +156,13 @@ class MainWindow(QMainWindow):
         self.main_layout.setLayout(self.layouts)
         self.setCentralWidget(self.main_layout)
 
+        # shown while the boxes of a page are read and put into the scene
+        self.box_progress = QProgressBar()
+        self.box_progress.setMaximumWidth(220)
+        self.box_progress.setFormat('Boxes %v / %m')
+        self.box_progress.hide()
+        self.statusBar().addPermanentWidget(self.box_progress)
+
         # Other Module Connections
         self.connect_other_modules()
 
@@ -148,36 +175,61 @@ class MainWindow(QMainWindow):
         # =====================================================================================================
 
     def connect_other_modules(self):
+        # every slot is timed when BOX_EDITOR_TRACE=1, otherwise trace hands the slot back as it is
+        trace = TRACER.slot
+
         # from rect_drawer to other
-        self.rect_drawer.sg_rect_updated.connect(self.sidebar.on_rect_updated)                       # ------------------> sidebar
-        self.rect_drawer.sg_new_rect_placed.connect(self.sidebar.on_rect_placed)                     # ------------------> sidebar
-        self.rect_drawer.sg_key_pressed.connect(self.sidebar.on_key_press)                           # ------------------> sidebar
-        self.rect_drawer.sg_rect_deleted.connect(self.sidebar.handling_rect_deletion)                # ------------------> sidebar
-        self.rect_drawer.sg_rect_selection_changes.connect(self.sidebar.on_rect_selection_changes)   # ------------------> sidebar
+        self.rect_drawer.sg_rect_updated.connect(trace(self.rect_update_coalescer.on_rect_updated))         # ------------------> coalescer
+        self.rect_drawer.sg_interaction_finished.connect(trace(self.rect_update_coalescer.flush))           # ------------------> coalescer
+        self.rect_update_coalescer.sg_rect_updated.connect(trace(self.sidebar.on_rect_updated))             # ------------------> sidebar
+        self.rect_drawer.sg_rect_about_to_be_placed.connect(trace(self.sidebar.on_rect_about_to_be_placed))  # ------------------> sidebar
+        self.rect_drawer.sg_new_rect_placed.connect(trace(self.sidebar.on_rect_placed))                     # ------------------> sidebar
+        self.rect_drawer.sg_key_pressed.connect(trace(self.sidebar.on_key_press))                           # ------------------> sidebar
+        self.rect_drawer.sg_rect_about_to_be_deleted.connect(trace(self.sidebar.on_rect_about_to_be_deleted))  # ------------------> sidebar
+        self.rect_drawer.sg_rect_deleted.connect(trace(self.sidebar.handling_rect_deletion))                # ------------------> sidebar
+        self.rect_drawer.sg_rect_selection_changes.connect(trace(self.sidebar.on_rect_selection_changes))   # ------------------> sidebar
+        self.rect_drawer.sg_rects_tightened.connect(trace(self.sidebar.on_rects_tightened))                 # ------------------> sidebar
+        self.rect_drawer.sg_population_progress.connect(trace(self.show_box_progress))                     # ------------------> self
 
         # from box_loader to others                                                             From Box_loader
-        self.box_Loader.sg_bax_file_loaded.connect(self.sidebar.update_box_cords)        # ------------------> sidebar
-        self.box_Loader.sg_bax_file_loaded.connect(self.call_rect_drawer_to_draw)        # ------------------> rect_drawer
+        self.box_Loader.sg_bax_file_loaded.connect(trace(self.sidebar.update_box_cords))        # ------------------> sidebar
+        self.box_Loader.sg_bax_file_loaded.connect(trace(self.call_rect_drawer_to_draw))        # ------------------> rect_drawer
+        self.box_Loader.sg_box_rows_about_to_be_appended.connect(
+            trace(self.sidebar.on_box_rows_about_to_be_appended))                               # ------------------> sidebar
+        self.box_Loader.sg_box_rows_appended.connect(trace(self.sidebar.on_box_rows_appended))  # ------------------> sidebar
+        self.box_Loader.sg_box_rows_appended.connect(trace(self.call_rect_drawer_to_append))    # ------------------> rect_drawer
+        self.box_Loader.sg_box_file_filled.connect(trace(self.on_box_file_filled))              # ------------------> self
+        self.box_Loader.autosaver.sg_box_file_saved.connect(trace(self.on_box_file_saved))      # ------------------> self
+
+        # from image loading to others                                                          From Image_loader
+        self.image_loader.page_loader.sg_page_decoded.connect(trace(self.on_page_decoded))      # ------------------> self
+        self.view.sg_zoomed_in.connect(trace(self.image_loader.page_loader.upgrade_now))        # ------------------> page_loader
 
         # from toolbar to others                                                                From Toolbar
-        self.toolbar.sg_save_button_clicked.connect(self.toolbar_save_btn_clicked)           # ------------------> self
-        self.toolbar.sg_delete_button_clicked.connect(self.toolbar_delete_btn_clicked)       # ------------------> self
-        self.toolbar.sg_insert_button_clicked.connect(self.toolbar_insert_btn_clicked)       # ------------------> self
-        self.toolbar.sg_reload_button_clicked.connect(self.sidebar.reloding) 
-        self.toolbar.sg_previous_button_clicked.connect(self.sidebar.toolbar_navigation_buttons_handling)   # ----> sidebar
-        self.toolbar.sg_next_button_clicked.connect(self.sidebar.toolbar_navigation_buttons_handling)       # ----> sidebar
-        self.toolbar.sg_previous_button_clicked.connect(self.open_image_from_list)                         # ----> Self
-        self.toolbar.sg_next_button_clicked.connect(self.open_image_from_list)                             # ----> Self
+        self.toolbar.sg_save_button_clicked.connect(trace(self.toolbar_save_btn_clicked))           # ------------------> self
+        self.toolbar.sg_delete_button_clicked.connect(trace(self.toolbar_delete_btn_clicked))       # ------------------> self
+        self.toolbar.sg_insert_button_clicked.connect(trace(self.toolbar_insert_btn_clicked))       # ------------------> self
+        self.toolbar.sg_propose_button_clicked.connect(trace(self.toolbar_propose_btn_clicked))     # ------------------> self
+        self.toolbar.sg_snap_toggled.connect(trace(self.rect_drawer.set_snap_to_ink))               # ------------------> rect_drawer
+        self.toolbar.sg_tighten_button_clicked.connect(trace(self.toolbar_tighten_btn_clicked))     # ------------------> self
+        self.toolbar.sg_lint_button_clicked.connect(trace(self.toolbar_lint_btn_clicked))           # ------------------> self
+        self.toolbar.sg_reload_button_clicked.connect(trace(self.toolbar_reload_btn_clicked))       # ------------------> self
+        self.toolbar.sg_reload_button_clicked.connect(trace(self.sidebar.reloding))
+        self.toolbar.sg_previous_button_clicked.connect(trace(self.sidebar.toolbar_navigation_buttons_handling))   # ----> sidebar
+        self.toolbar.sg_next_button_clicked.connect(trace(self.sidebar.toolbar_navigation_buttons_handling))       # ----> sidebar
+        self.toolbar.sg_previous_button_clicked.connect(trace(self.open_image_from_list))                         # ----> Self
+        self.toolbar.sg_next_button_clicked.connect(trace(self.open_image_from_list))                             # ----> Self
+        self.toolbar.sg_page_changed.connect(trace(self.open_page))                                               # ----> Self
 
         # from Sidebar to others                                                                        From Sidebar
-        self.sidebar.sg_coordinates_change.connect(self.rect_drawer.update_on_cell_value_changes)  # ----------> rect_drawer
-        self.sidebar.sg_selection_changes.connect(self.rect_drawer.sidebar_selection_changes)      # ----------> rect_drawer
-        self.sidebar.sg_image_selection_changes.connect(self.toolbar.enable_disable_nav_buttons)   # ----------> toolbar
-        self.sidebar.sg_image_selection_changes.connect(self.open_image_from_list)                 # ----------> Self
+        self.sidebar.sg_coordinates_change.connect(trace(self.rect_drawer.update_on_cell_value_changes))  # ----------> rect_drawer
+        self.sidebar.sg_selection_changes.connect(trace(self.rect_drawer.sidebar_selection_changes))      # ----------> rect_drawer
+        self.sidebar.sg_image_selection_changes.connect(trace(self.toolbar.enable_disable_nav_buttons))   # ----------> toolbar
+        self.sidebar.sg_image_selection_changes.connect(trace(self.open_image_from_list))                 # ----------> Self
         
         # from me                                                                                 From Self
-        self.sg_image_loaded.connect(self.sidebar.show_box_cords)                          # ----------> sidebar
-        self.sg_image_loaded.connect(self.toolbar.image_loaded_event_from_main)            # ----------> toolbar
+        self.sg_image_loaded.connect(trace(self.sidebar.show_box_cords))                          # ----------> sidebar
+        self.sg_image_loaded.connect(trace(self.toolbar.image_loaded_event_from_main))            # ----------> toolbar
         
         # other connection to functions
         
@@ -187,10 +239,41 @@ class MainWindow(QMainWindow):
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                                      QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
+            self.box_Loader.autosaver.shutdown()
             sys.exit()
 
-    def call_rect_drawer_to_draw(self, list_of_tuples):
-        self.rect_drawer.draw_new_rects_of_box_file(self.scene, list_of_tuples)
+    def closeEvent(self, event):
+        self.box_Loader.autosaver.shutdown()
+        super().closeEvent(event)
+
+    def save_performance_trace(self):
+        name, _ = QFileDialog.getSaveFileName(self, 'Save Trace', 'box_editor_trace.json', 'Trace (*.json)')
+        if name:
+            trace_path, histogram_path = TRACER.dump(name)
+            print(f'Trace saved to {trace_path}, latency histogram in {histogram_path}')
+
+    def call_rect_drawer_to_draw(self, box_store):
+        if self.rect_drawer.reloading and self.box_Loader.is_loading():
+            return  # a large file being reloaded is diffed against the old boxes once all of it is read
+        visible_rect = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+        self.rect_drawer.draw_new_rects_of_box_file(self.scene, box_store, visible_rect)
+        self.view.is_drawing_allowed = True
+
+    def show_box_progress(self, _, done, total):
+        if done >= total:
+            self.box_progress.hide()
+            return
+        self.box_progress.setRange(0, total)
+        self.box_progress.setValue(done)
+        self.box_progress.show()
+
+    def call_rect_drawer_to_append(self, box_store, first, last):
+        if not self.rect_drawer.reloading:
+            self.rect_drawer.append_rects_of_box_file(self.scene, box_store, first, last)
+
+    def on_box_file_filled(self, box_store):
+        if self.rect_drawer.reloading:
+            self.call_rect_drawer_to_draw(box_store)
 
     # =========================================================================================================
     # ================================== Image Display and control ============================================
@@ -217,25 +300,80 @@ class MainWindow(QMainWindow):
             if self.pixmap:
                 self.load_image()
 
+    def open_page(self, caller, page):
+        pixmap = self.image_loader.open_page(page)
+        if pixmap:
+            self.pixmap = pixmap
+            self.load_image()
+
     def load_image(self):
         if self.pixmap and not self.pixmap.isNull():
             self.clear_everything()
             self.scene.setBackgroundBrush(QColor(Qt.GlobalColor.lightGray))
-            self.scene.addPixmap(self.pixmap)
-            self.view.fitInView(self.scene.itemsBoundingRect(), Qt.AspectRatioMode.KeepAspectRatio)
+            if isinstance(self.pixmap, ImagePyramid):
+                self.tiled_item = TiledImageItem(self.pixmap)
+                self.tiled_item.setZValue(-1)  # below the rect items the scene keeps from earlier pages
+                self.scene.addItem(self.tiled_item)
+            elif isinstance(self.pixmap, PendingPage):
+                # a white page of the right size until the decoded pixels arrive in on_page_decoded
+                placeholder = QPixmap(1, 1)
+                placeholder.fill(QColor(Qt.GlobalColor.white))
+                self.show_page_pixmap(placeholder)
+            else:
+                self.show_page_pixmap(self.pixmap)
+            # hidden items of earlier pages are still in the scene, so the page rect is fitted, not the items
+            self.view.fitInView(QRectF(0, 0, self.pixmap.width(), self.pixmap.height()),
+                                Qt.AspectRatioMode.KeepAspectRatio)
+            if isinstance(self.pixmap, PendingPage):
+                self.image_loader.page_loader.request(self.pixmap, self.view.viewport().size())
             self.change_title()
 
             # loading the boxes
+            self.rect_drawer.set_page(self.image_loader.current_image_opened, self.image_loader.current_page)
             _, height = self.image_loader.get_image_size()
-            self.box_Loader.extract_box_list(self.image_loader.current_image_opened, height)
+            page = self.image_loader.current_page if self.image_loader.is_multi_page() else None
+            self.box_Loader.extract_box_list(self.image_loader.current_image_opened, height, page)
+            if self.box_Loader.is_loading() and not self.rect_drawer.is_populating():
+                self.box_progress.setRange(0, 0)  # busy until the parsed boxes arrive
+                self.box_progress.show()
+            self.toolbar.set_page_count(self.image_loader.page_count, self.image_loader.current_page)
             self.view.set_initial_zoom()
             self.view.is_drawing_allowed = True
             self.view.current_zoom = 1.0
 
+    def show_page_pixmap(self, pixmap):
+        # one pixmap item serves every page, only its pixmap is swapped
+        if self.image_item is None:
+            self.image_item = self.scene.addPixmap(pixmap)
+            self.image_item.setZValue(-1)
+        else:
+            self.image_item.setPixmap(pixmap)
+            self.image_item.show()
+        # a preview or placeholder is stretched over the full page, boxes stay in full resolution cords
+        sx, sy = self.pixmap.width() / pixmap.width(), self.pixmap.height() / pixmap.height()
+        self.image_item.setTransform(QTransform.fromScale(sx, sy))
+        self.image_item.setTransformationMode(Qt.TransformationMode.SmoothTransformation if sx > 1 else
+                                              Qt.TransformationMode.FastTransformation)
+
+    def on_page_decoded(self, path, page, image, full):
+        pending = self.pixmap
+        if not isinstance(pending, PendingPage) or (path, page) != (pending.path, pending.page):
+            return  # a page the user has left already
+        self.show_page_pixmap(QPixmap.fromImage(image))
+        if full:
+            self.pixmap = self.image_item.pixmap()
+
     def clear_everything(self):
+        # the scene is not cleared, the pixmap item and the rect items are reused by the next page
+        if self.image_item:
+            self.image_item.hide()
+        if self.tiled_item:
+            self.tiled_item.release()
+            self.scene.removeItem(self.tiled_item)
+            self.tiled_item = None
         self.rect_drawer.clear_everything(self.scene)
-        self.scene.clear()
-        self.box_Loader.clear_list_of_tuples()
+        self.box_Loader.clear_box_store()
+        self.sidebar.clear_box_table()
 
     # =========================================================================================================
     # ================================ Events Controller and setup ============================================
@@ -246,20 +384,87 @@ class MainWindow(QMainWindow):
 
     def change_title(self):
         title = 'Box Editor    (' + self.image_loader.current_image_base_name + ")"
+        if self.image_loader.is_multi_page():
+            title += f'    page {self.image_loader.current_page + 1} of {self.image_loader.page_count}'
         self.setWindowTitle(title)
 
     # =========================================================================================================
     # ================================== Re routing signals  ==================================================
     # =========================================================================================================
     def toolbar_save_btn_clicked(self, _):
-        try:
-            name = os.path.join(self.image_loader.directory, self.image_loader.current_image_base_name)
-            name = os.path.splitext(name)[0] + '.box'
-            self.sidebar.handling_the_save_button(name)
-        except TypeError:
+        if self.box_Loader.is_loading():
+            # saving now would cut the box file down to the rows read so far
+            QMessageBox.information(self, 'Information', 'The box file is still loading, save once it is done')
+            return
+        if not self.image_loader.current_image_opened:
             print('Error: No file opened')
+            return
+        # edits are saved in the background anyway, this only skips the wait
+        if self.sidebar.handling_the_save_button():
+            self.box_Loader.autosaver.save_now()
+
+    def on_box_file_saved(self, image_name, box_path, box_count):
+        self.image_loader.record_box_saved(box_path, box_count, image_name)
+
+    def toolbar_reload_btn_clicked(self, _):
+        # back to the box file on disk, edits not written to it yet are dropped
+        if not self.image_loader.current_image_opened:
+            return
+        _, height = self.image_loader.get_image_size()
+        page = self.image_loader.current_page if self.image_loader.is_multi_page() else None
+        self.rect_drawer.prepare_reload()
+        # the old boxes stay on screen until the reloaded ones are drawn, they can not be edited meanwhile
+        self.view.is_drawing_allowed = False
+        self.box_Loader.reload_box_list(self.image_loader.current_image_opened, height, page)
+        if self.rect_drawer.reloading:
+            self.sidebar.clear_box_table()  # the store was emptied, the table follows until the reload is in
+
     def toolbar_delete_btn_clicked(self, _):
         self.rect_drawer.toolbar_delete_button_clicked(self.scene)
 
     def toolbar_insert_btn_clicked(self, _):
-        self.rect_drawer.toolbar_insert_button_clicked(self.scene)
\ No newline at end of file
+        self.rect_drawer.toolbar_insert_button_clicked(self.scene)
+
+    def toolbar_tighten_btn_clicked(self, _):
+        self.rect_drawer.tighten_all_boxes()
+
+    def toolbar_lint_btn_clicked(self, _):
+        if not self.image_loader.current_image_opened:
+            print('Error: No file opened')
+            return
+        width, height = self.image_loader.get_image_size()
+        # boxes still holding PLACEHOLDER_CHAR from a proposal are reported as unlabelled
+        report = lint_store(self.box_Loader.box_store, width, height, placeholder_chars=(PLACEHOLDER_CHAR,))
+        rows = offending_rows(report)
+        self.rect_drawer.mark_rows(rows.tolist())
+        counts = summarise(report)
+        print(f'Lint: {len(rows)} boxes with problems {counts}')
+        if len(rows):
+            details = '\n'.join(f'{check.replace("_", " ")}: {count}' for check, count in counts.items() if count)
+            QMessageBox.information(self, 'Lint', f'{len(rows)} boxes marked in red\n\n{details}')
+
+    def toolbar_propose_btn_clicked(self, _):
+        path = self.image_loader.current_image_opened
+        if not path:
+            print('Error: No file opened')
+            return
+        # the page is analysed off the UI thread, the result comes back through on_boxes_proposed
+        self.toolbar.btn_propose.setEnabled(False)
+        worker = BoxProposalWorker(path, self.image_loader.current_page)
+        worker.signals.sg_boxes_proposed.connect(TRACER.slot(self.on_boxes_proposed))
+        self.proposal_pool.start(worker)
+
+    def on_boxes_proposed(self, path, page, boxes):
+        self.toolbar.btn_propose.setEnabled(True)
+        if boxes is None or (path, page) != (self.image_loader.current_image_opened, self.image_loader.current_page):
+            return  # unreadable page, or the user moved on to another page meanwhile
+
+        # glyphs that already have a box are left alone, only the missing ones are added
+        self.rect_drawer.finish_population()
+        new_boxes = [(x, y, w, h) for x, y, w, h in zip(*(column.tolist() for column in boxes))
+                     if self.rect_drawer.spatial_index.item_at(x + w / 2, y + h / 2) is None]
+        print(f'Proposed {len(boxes[0])} boxes, {len(new_boxes)} new')
+        if not new_boxes:
+            return
+        x, y, w, h = zip(*new_boxes)
+        self.box_Loader.append_rows([PLACEHOLDER_CHAR] * len(new_boxes), x, y, w, h, page)
\ No newline at end of file
@@ -0,0 +1,120 @@
+import itertools
+import json
+import math
+import os
+import threading
+import time
+
+
+class _NoSpan():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span():
+    __slots__ = ('tracer', 'name', 'category', 'start')
+
+    def __init__(self, tracer, name, category):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.category, self.start, time.perf_counter_ns() - self.start)
+        return False
+
+
+class Tracer():
+    """Opt in hot path timing, switched on with the BOX_EDITOR_TRACE=1 environment variable.
+
+    Events go into a fixed size ring buffer and can be dumped as a Chrome / Perfetto trace or as a
+    latency histogram per handler. When tracing is off slot() hands back the slot untouched and
+    span() returns a shared no-op context manager, so the instrumented code pays almost nothing.
+    """
+
+    def __init__(self, enabled=False, capacity=100000):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.events = [None] * capacity   # (name, category, start_ns, duration_ns, thread_id)
+        self.counter = itertools.count()  # next() on itertools.count is atomic under the GIL
+        self.origin_ns = time.perf_counter_ns()
+
+    def span(self, name, category='app'):
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, category)
+
+    def slot(self, function, name=None):
+        if not self.enabled:
+            return function
+        name = name or getattr(function, '__qualname__', repr(function))
+
+        def traced_slot(*args):
+            start = time.perf_counter_ns()
+            try:
+                return function(*args)
+            finally:
+                self.record(name, 'slot', start, time.perf_counter_ns() - start)
+        return traced_slot
+
+    def record(self, name, category, start_ns, duration_ns):
+        self.events[next(self.counter) % self.capacity] = (name, category, start_ns, duration_ns,
+                                                          threading.get_ident())
+
+    def recorded_events(self):
+        return [event for event in self.events if event is not None]
+
+    def clear(self):
+        self.events = [None] * self.capacity
+        self.counter = itertools.count()
+
+    # =========================================================================================================
+    # ================================== Export  ==============================================================
+    # =========================================================================================================
+    def chrome_trace(self):
+        pid = os.getpid()
+        trace_events = [{'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                         'ts': (start - self.origin_ns) / 1000, 'dur': duration / 1000}
+                        for name, category, start, duration, tid in sorted(self.recorded_events(),
+                                                                           key=lambda e: e[2])]
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def histograms(self):
+        # power of two microsecond buckets per handler, plus the usual percentiles
+        durations = {}
+        for name, _, _, duration, _ in self.recorded_events():
+            durations.setdefault(name, []).append(duration / 1000)
+        report = {}
+        for name, values in durations.items():
+            values.sort()
+            buckets = {}
+            for value in values:
+                bucket = 2 ** max(0, math.ceil(math.log2(max(value, 1))))
+                buckets[bucket] = buckets.get(bucket, 0) + 1
+            report[name] = {'count': len(values), 'total_ms': sum(values) / 1000,
+                            'p50_us': values[len(values) // 2], 'p95_us': values[int(len(values) * 0.95)],
+                            'max_us': values[-1],
+                            'buckets_us': {f'<={bucket}': count for bucket, count in sorted(buckets.items())}}
+        return report
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+        histogram_path = os.path.splitext(path)[0] + '_histogram.json'
+        with open(histogram_path, 'w') as f:
+            json.dump(self.histograms(), f, indent=2)
+        return path, histogram_path
+
+
+TRACER = Tracer(enabled=os.environ.get('BOX_EDITOR_TRACE') == '1',
+                capacity=int(os.environ.get('BOX_EDITOR_TRACE_CAPACITY', '100000')))
@@ -0,0 +1,34 @@
+from Local_Scripts.Files_Handling.box_batch import run_batch
+import argparse
+import json
+import sys
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Validate and normalise box files without opening the editor.')
+    parser.add_argument('directory', help='directory with image / .box pairs')
+    parser.add_argument('-r', '--recursive', action='store_true', help='also walk sub directories')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--write', action='store_true', help='rewrite box files that are not normalised')
+    parser.add_argument('-o', '--output-dir', default=None, help='write every normalised file here instead')
+    parser.add_argument('--chunk-size', type=int, default=64, help='box files per worker task')
+    parser.add_argument('--report', default=None, help='write the summary json to this file')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print the summary')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+
+    def print_result(result):
+        if not args.quiet:
+            sys.stdout.write(json.dumps(result) + '\n')
+
+    summary = run_batch(args.directory, workers=args.workers, write=args.write or bool(args.output_dir),
+                        output_dir=args.output_dir, recursive=args.recursive, chunk_size=args.chunk_size,
+                        on_result=print_result)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(summary, f, indent=2)
+    sys.exit(1 if summary['errors'] else 0)
@@ -0,0 +1,222 @@
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtWidgets import QApplication, QGraphicsScene
+from PyQt6.QtGui import QImage, QColor
+from PyQt6.QtCore import QPointF
+import argparse
+import contextlib
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+from Local_Scripts.Files_Handling.box_autosave import BoxCompactionWorker, EditJournal
+from Local_Scripts.Files_Handling.box_file_handler import BoxFileHandler
+from Local_Scripts.Files_Handling.images_handler import ImageHandler
+from Local_Scripts.GUI.rect_drawer import RectDrawer
+from Local_Scripts.GUI.sidebar import Sidebar
+
+# ============================================================================================================
+# Headless timings of the load / render / edit / save hot paths on synthetic pages, results are json so two
+# commits can be compared with --compare
+# ============================================================================================================
+
+
+def make_page(directory, n_boxes, width, height, seed=0):
+    name = f'bench_{n_boxes}_{width}x{height}'
+    image_path = os.path.join(directory, name + '.png')
+    box_path = os.path.join(directory, name + '.box')
+    if not os.path.exists(image_path):
+        image = QImage(width, height, QImage.Format.Format_Grayscale8)
+        image.fill(QColor('white'))
+        image.save(image_path)
+    rng = np.random.default_rng(seed)
+    w = rng.integers(8, 40, n_boxes)
+    h = rng.integers(10, 50, n_boxes)
+    left = rng.integers(0, width - 40, n_boxes)
+    bottom = rng.integers(0, height - 50, n_boxes)
+    chars = 'abcdefghijklmnopqrstuvwxyz0123456789'
+    with open(box_path, 'w') as f:
+        f.write(''.join(f'{chars[i % len(chars)]} {l} {b} {l + ww} {b + hh} 0\n'
+                        for i, (l, b, ww, hh) in enumerate(zip(left.tolist(), bottom.tolist(), w.tolist(), h.tolist()))))
+    return image_path, box_path
+
+
+def measure(function, setup=None, repeat=3):
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        function(state)
+        times.append(time.perf_counter() - start)
+
+    # a separate traced run, tracemalloc slows everything down so it is not part of the timings
+    state = setup() if setup else None
+    tracemalloc.start()
+    function(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'min_s': min(times), 'median_s': statistics.median(times), 'python_peak_bytes': peak}
+
+
+def run_case(image_path, n_boxes, width, height, render_mode, repeat):
+    image_handler = ImageHandler()
+    image_handler.current_image_opened = image_path
+    results = {}
+
+    # the background parse and the time sliced population are turned off, the full cost is measured
+    def loaded_store():
+        loader = BoxFileHandler()
+        loader.parse_in_background = False
+        loader.extract_box_list(image_path, height)
+        return loader.box_store
+
+    def empty_scene():
+        store = loaded_store()
+        drawer = RectDrawer(store)
+        drawer.render_mode = render_mode
+        drawer.progressive_population = False
+        return QGraphicsScene(), drawer, store
+
+    def scene_with_boxes():
+        scene, drawer, store = empty_scene()
+        drawer.draw_new_rects_of_box_file(scene, store)
+        return scene, drawer, store
+
+    def empty_sidebar():
+        store = loaded_store()
+        return Sidebar(image_handler, store), store
+
+    def load_image(_):
+        image_handler.image_cache.clear()
+        image_handler.image_cache.get_pixmap(image_path)
+
+    def extract(_):
+        loader = BoxFileHandler()
+        loader.parse_in_background = False
+        loader.extract_box_list(image_path, height)
+
+    def draw(state):
+        scene, drawer, store = state
+        drawer.draw_new_rects_of_box_file(scene, store)
+
+    def fill_table(state):
+        sidebar, store = state
+        sidebar.update_box_cords(store)
+
+    def select(state):
+        _, drawer, store = state
+        for i in range(0, len(store), max(1, len(store) // 1000)):
+            _, x, y, w, h = store[i]
+            drawer.select_rect(QPointF(x + w / 2, y + h / 2))
+
+    def resize(state):
+        _, drawer, store = state
+        drawer.sidebar_selection_changes('', len(store) // 2)
+        rect = drawer.selected_rect.rect()
+        drawer.is_near_side(QPointF(rect.right(), rect.center().y()))
+        drawer.is_resizing_any_rect = True
+        for step in range(500):
+            drawer.resizing_selected_rect(QPointF(rect.right() + step % 40, rect.center().y()))
+        drawer.is_resizing_any_rect = False
+
+    def snapshot(store):
+        store.copy()
+
+    def save(store):
+        # the autosave as the editor runs it: the snapshot on the UI thread, the rest on the pool thread
+        BoxCompactionWorker(EditJournal(state_path, None, height), store.copy()).run()
+
+    state_path = os.path.join(os.path.dirname(image_path), 'bench_save.box')
+    results['load_image'] = measure(load_image, repeat=repeat)
+    results['extract_box_list'] = measure(extract, repeat=repeat)
+    results['draw_new_rects_of_box_file'] = measure(draw, empty_scene, repeat)
+    results['update_box_cords'] = measure(fill_table, empty_sidebar, repeat)
+    results['select_rect'] = measure(select, scene_with_boxes, repeat)
+    results['resize_sequence'] = measure(resize, scene_with_boxes, repeat)
+    results['autosave_snapshot'] = measure(snapshot, loaded_store, repeat)
+    results['autosave_write'] = measure(save, loaded_store, repeat)
+
+    for name, result in results.items():
+        result['boxes_per_s'] = n_boxes / result['min_s'] if result['min_s'] > 0 else None
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old_cases = {case['case']: case['results'] for case in baseline['cases']}
+    for case in current['cases']:
+        old = old_cases.get(case['case'])
+        if not old:
+            continue
+        for name, result in case['results'].items():
+            if name in old and old[name]['min_s'] > 0:
+                ratio = result['min_s'] / old[name]['min_s']
+                print(f"{case['case']:<32} {name:<28} {old[name]['min_s'] * 1000:9.2f} ms -> "
+                      f"{result['min_s'] * 1000:9.2f} ms  x{ratio:.2f}", file=sys.stderr)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark the box editor hot paths headlessly.')
+    parser.add_argument('--boxes', default='1000,10000,100000', help='comma separated box counts')
+    parser.add_argument('--image-sizes', default='1200x1600,10000x14000', help='comma separated WxH page sizes')
+    parser.add_argument('--render-mode', default='auto', choices=['auto', 'items', 'batched'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--data-dir', default=None, help='keep the synthetic pages here between runs')
+    parser.add_argument('-o', '--output', default=None, help='write the json results to this file')
+    parser.add_argument('--compare', default=None, help='json results of an earlier run to compare against')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    app = QApplication(sys.argv)
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='box_editor_bench_')
+    os.makedirs(data_dir, exist_ok=True)
+
+    report = {'revision': git_revision(), 'python': platform.python_version(), 'machine': platform.machine(),
+              'render_mode': args.render_mode, 'cases': []}
+    for size in args.image_sizes.split(','):
+        width, height = (int(v) for v in size.lower().split('x'))
+        for n_boxes in (int(v) for v in args.boxes.split(',')):
+            case = f'{n_boxes}_boxes_{width}x{height}'
+            print(f'running {case}', file=sys.stderr)
+            image_path, _ = make_page(data_dir, n_boxes, width, height)
+            # the editor prints status lines, keep stdout for the json report
+            with contextlib.redirect_stdout(sys.stderr):
+                results = run_case(image_path, n_boxes, width, height, args.render_mode, args.repeat)
+            report['cases'].append({'case': case, 'boxes': n_boxes, 'width': width, 'height': height,
+                                    'results': results})
+    if resource:
+        # ru_maxrss is kilobytes on linux
+        report['process_peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        compare(report, args.compare)
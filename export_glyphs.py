@@ -0,0 +1,32 @@
+from Local_Scripts.Files_Handling.glyph_export import run_export
+import argparse
+import json
+import sys
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Cut every box of a directory into one memory mapped glyph dataset.')
+    parser.add_argument('directory', help='directory with image / .box pairs')
+    parser.add_argument('output_dir', help='glyphs.npy, labels.npy, boxes.npy and index.json are written here')
+    parser.add_argument('-r', '--recursive', action='store_true', help='also walk sub directories')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--size', type=int, default=32, help='glyphs are resized to size x size pixels')
+    parser.add_argument('--padding', type=int, default=2, help='pixels of page kept around every box')
+    parser.add_argument('--stretch', action='store_true', help='fill the whole square instead of keeping the aspect')
+    parser.add_argument('--label-width', type=int, default=8, help='longest label kept, in characters')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print the summary')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+
+    def print_result(result):
+        if not args.quiet:
+            sys.stdout.write(json.dumps(result) + '\n')
+
+    summary = run_export(args.directory, args.output_dir, size=args.size, padding=args.padding,
+                         keep_aspect=not args.stretch, workers=args.workers, recursive=args.recursive,
+                         label_width=args.label_width, on_result=print_result)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    sys.exit(1 if summary['errors'] else 0)
@@ -0,0 +1,40 @@
+from Local_Scripts.Files_Handling.box_lint import run_lint
+from Local_Scripts.Files_Handling.box_store import PLACEHOLDER_CHAR
+import argparse
+import json
+import sys
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Check every box file of a directory for overlapping, duplicate, '
+                                                 'empty, out of page and unlabelled boxes.')
+    parser.add_argument('directory', help='directory with image / .box pairs')
+    parser.add_argument('-r', '--recursive', action='store_true', help='also walk sub directories')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--min-overlap', type=float, default=0.2,
+                        help='overlap reported from this fraction of the smaller box (default: 0.2)')
+    parser.add_argument('--placeholder', action='append', default=[PLACEHOLDER_CHAR],
+                        help=f'char counted as unlabelled, can be repeated (default: {PLACEHOLDER_CHAR})')
+    parser.add_argument('--chunk-size', type=int, default=32, help='box files per worker task')
+    parser.add_argument('--report', default=None, help='write the summary and the files with problems to this json')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print the summary')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    problems = []
+
+    def print_result(result):
+        if result['error'] or any(result[check] for check in result['examples']):
+            problems.append(result)
+        if not args.quiet:
+            sys.stdout.write(json.dumps(result) + '\n')
+
+    summary = run_lint(args.directory, workers=args.workers, recursive=args.recursive, chunk_size=args.chunk_size,
+                       min_overlap=args.min_overlap, placeholder_chars=args.placeholder, on_result=print_result)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'summary': summary, 'files': sorted(problems, key=lambda result: result['path'])}, f, indent=1)
+    sys.exit(1 if summary['errors'] else 0)
@@ -0,0 +1,36 @@
+from Local_Scripts.Files_Handling.box_proposer import run_proposals
+from Local_Scripts.Files_Handling.box_store import PLACEHOLDER_CHAR
+import argparse
+import json
+import sys
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Propose glyph boxes for pages that have no box file yet.')
+    parser.add_argument('directory', help='directory with page images')
+    parser.add_argument('-r', '--recursive', action='store_true', help='also walk sub directories')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--overwrite', action='store_true', help='replace box files that already exist')
+    parser.add_argument('--char', default=PLACEHOLDER_CHAR,
+                        help=f'placeholder char written for every proposed box (default: {PLACEHOLDER_CHAR})')
+    parser.add_argument('--chunk-size', type=int, default=4, help='pages per worker task')
+    parser.add_argument('--report', default=None, help='write the summary json to this file')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print the summary')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+
+    def print_result(result):
+        if not args.quiet:
+            sys.stdout.write(json.dumps(result) + '\n')
+
+    summary = run_proposals(args.directory, workers=args.workers, overwrite=args.overwrite,
+                            recursive=args.recursive, chunk_size=args.chunk_size, char=args.char,
+                            on_result=print_result)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(summary, f, indent=2)
+    sys.exit(1 if summary['errors'] else 0)